@@ -0,0 +1,103 @@
+import hashlib
+from datetime import date, timedelta
+from flask import Blueprint, abort, current_app, jsonify, request
+from flask_login import current_user, login_required
+from extensions import db
+from models import Appointment, Doctor, ROLE_PATIENT
+import schedules
+import slots
+from replicas import read_only
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+MAX_SLOT_RANGE_DAYS = 31
+
+
+# ------------------ CONDITIONAL RESPONSES ------------------
+# `no-cache` makes the browser revalidate every time, sending If-None-Match, so the
+# booking page always sees fresh slots but only downloads them when they changed.
+def _json(payload, etag=None):
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    return response.make_conditional(request)
+
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    return response
+
+
+# ------------------ SPECIALIZATIONS / DOCTORS ------------------
+@api.route('/specializations')
+@login_required
+@read_only
+def specializations():
+    names = [row[0] for row in db.session.query(Doctor.specialization).distinct().order_by(Doctor.specialization)]
+    return _json({'specializations': names})
+
+
+@api.route('/specializations/<path:specialization>/doctors')
+@login_required
+@read_only
+def doctors_by_specialization(specialization):
+    doctors = Doctor.query.filter_by(specialization=specialization).order_by(Doctor.name, Doctor.id).all()
+    return _json({
+        'specialization': specialization,
+        'doctors': [{'id': d.id, 'name': d.name, 'specialization': d.specialization} for d in doctors],
+    })
+
+
+# ------------------ FREE SLOTS ------------------
+def _slot_range():
+    try:
+        start = date.fromisoformat(request.args['from'])
+        end = date.fromisoformat(request.args.get('to') or request.args['from'])
+    except (KeyError, ValueError):
+        abort(400, "'from' (and optional 'to') must be YYYY-MM-DD dates")
+    if end < start or (end - start).days >= MAX_SLOT_RANGE_DAYS:
+        abort(400, f"Date range must be ascending and at most {MAX_SLOT_RANGE_DAYS} days")
+    return start, end
+
+
+def _reschedule_id():
+    reschedule_id = request.args.get('reschedule_id', type=int)
+    if not reschedule_id:
+        return None
+    owner = db.session.query(Appointment.patient_id).filter(Appointment.id == reschedule_id).scalar()
+    if current_user.role != ROLE_PATIENT or owner != current_user.profile_id:
+        abort(404)
+    return reschedule_id
+
+
+def slots_etag(doctor_id, version, start, end, reschedule_id):
+    key = f"{start}:{end}:{reschedule_id or ''}:{current_app.config.get('SLOT_MINUTES')}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return f"d{doctor_id}-v{version}-{digest}"
+
+
+@api.route('/doctors/<int:doctor_id>/slots')
+@login_required
+@read_only
+def doctor_slots(doctor_id):
+    start, end = _slot_range()
+    reschedule_id = _reschedule_id()
+
+    etag = slots_etag(doctor_id, schedules.get_version(doctor_id), start, end, reschedule_id)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+
+    if db.session.get(Doctor, doctor_id) is None:
+        abort(404)
+    free = slots.free_slots(doctor_id, start, end, exclude_appointment_id=reschedule_id)
+    days = {}
+    day = start
+    while day <= end:
+        days[day.isoformat()] = [slot.strftime('%H:%M') for slot in free.get(day, [])]
+        day += timedelta(days=1)
+    return _json({'doctor_id': doctor_id, 'from': start.isoformat(), 'to': end.isoformat(), 'slots': days}, etag)
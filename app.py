@@ -1,15 +1,87 @@
+import os
 from flask import Flask
 from extensions import db, bcrypt, login_manager
 from routes import main
-from models import User
+from api import api
+import user_cache
+from user_cache import init_user_cache
+from commands import register_commands
+from helpers import init_lazy_load_guard
+from metrics import init_metrics
+from assets import init_assets
+from fragments import init_fragment_cache
+from config import config_from_env
+from database import engine_options, init_database
+from replicas import init_replica
+from warmup import init_template_cache
+from ratelimit import init_rate_limits
+from schedules import init_schedule_versions
+from slots import init_slot_table
+from reports import init_rollups
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'super-secret-key'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hms.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_POOL_SIZE'] = None
+    app.config['DB_MAX_OVERFLOW'] = None
+    app.config['DB_POOL_RECYCLE'] = None
+    app.config['DB_POOL_TIMEOUT'] = None
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = None
+    app.config['SQLITE_WAL'] = True
+    app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = 5000
+    app.config['SQLITE_MMAP_SIZE'] = 256 * 1024 * 1024
+    app.config['REPLICA_DATABASE_URI'] = None
+    app.config['REPLICA_STICKY_SECONDS'] = 5
+    app.config['SLOT_MINUTES'] = 30
+    app.config['USE_SLOT_TABLE'] = False
+    app.config['NEXT_AVAILABLE_LIMIT'] = 5
+    app.config['NEXT_AVAILABLE_HORIZON_DAYS'] = 90
+    app.config['RAISE_ON_LAZY_LOAD'] = False
+    app.config['USE_STAT_COUNTERS'] = True
+    app.config['USE_ROLLUPS'] = True
+    app.config['ARCHIVE_AFTER_DAYS'] = 365
+    app.config['COMPRESS_NOTES_MIN_SIZE'] = 1024
+    app.config['USE_FTS_SEARCH'] = True
+    app.config['PAGE_SIZE'] = 25
+    app.config['MAX_PAGE_SIZE'] = 100
+    app.config['BCRYPT_LOG_ROUNDS'] = 12
+    app.config['HASH_WORKERS'] = None
+    app.config['HASH_QUEUE_DEPTH'] = 16
+    app.config['HASH_TIMEOUT'] = 30
+    app.config['METRICS_ENABLED'] = True
+    app.config['METRICS_WINDOW'] = 1000
+    app.config['USER_CACHE_TTL'] = 30
+    app.config['USER_CACHE_SIZE'] = 10000
+    app.config['FRAGMENT_CACHE_SIZE'] = 2000
+    app.config['ASSETS_FINGERPRINT'] = True
+    app.config['COMPRESS_RESPONSES'] = True
+    app.config['COMPRESS_MIMETYPES'] = ('text/html',)
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_BROTLI_QUALITY'] = 5
+    app.config['TEMPLATE_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')
+    app.config['WARMUP_ON_START'] = True
+    app.config['RATE_LIMITS_ENABLED'] = True
+    app.config['RATE_LIMITS'] = {
+        'main.login': {'ip': (30, 60), 'user': (10, 60)},
+        'main.register_patient': {'ip': (10, 600)},
+        'main.book_appointment': {'ip': (120, 60), 'user': (30, 60)},
+    }
+    app.config['RATE_LIMIT_STORAGE'] = None
+    app.config['RATE_LIMIT_MAX_KEYS'] = 100000
+    app.config['RATE_LIMIT_PROXY_HOPS'] = 0
+    app.config.update(config_from_env())
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 
-    db.init_app(app)
+    init_database(app)
+    init_schedule_versions(app)
+    init_slot_table(app)
+    init_rollups(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
@@ -17,9 +89,23 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Blacklisted users fall back to anonymous within USER_CACHE_TTL seconds.
+        user = user_cache.load(int(user_id))
+        if user is None or user.is_blacklisted:
+            return None
+        return user
 
     app.register_blueprint(main)
+    app.register_blueprint(api)
+    register_commands(app)
+    init_lazy_load_guard(app)
+    init_metrics(app)
+    init_user_cache(app)
+    init_fragment_cache(app)
+    init_assets(app)
+    init_replica(app)
+    init_template_cache(app)
+    init_rate_limits(app)
 
     return app
 
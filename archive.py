@@ -0,0 +1,101 @@
+from datetime import date, datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import joinedload, undefer_group
+from extensions import db
+from models import Appointment, ArchivedAppointment, ArchivedTreatmentRecord, TreatmentRecord
+
+ARCHIVABLE_STATUSES = ('Completed', 'Cancelled')
+APPOINTMENT_COLUMNS = ('id', 'patient_id', 'doctor_id', 'appointment_datetime', 'status', 'created_at',
+                       'reschedule_count')
+TREATMENT_COLUMNS = ('id', 'patient_id', 'doctor_id', 'appointment_id', 'diagnosis', 'prescriptions', 'notes',
+                     'created_at')
+
+
+# ------------------ ARCHIVAL ------------------
+# Finished appointments older than ARCHIVE_AFTER_DAYS move to archived_appointment, and
+# their treatment records to archived_treatment_record, keeping their ids. Each batch is
+# one transaction of INSERT ... SELECT plus DELETE, so a row is always in exactly one of
+# the two tables. Counters and rollups already count archived rows and are not touched.
+def archive_cutoff(days=None):
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    return datetime.combine(date.today() - timedelta(days=days), time.min)
+
+
+def _candidates(cutoff, batch_size):
+    # SQLite hands out max(id) + 1 for new rows, so moving the newest row out would let
+    # its id be reused in the hot table. The newest appointment and the appointment of
+    # the newest treatment stay put until something newer exists.
+    newest_appointment = select(func.max(Appointment.id)).scalar_subquery()
+    newest_treatment = select(TreatmentRecord.appointment_id).where(
+        TreatmentRecord.id == select(func.max(TreatmentRecord.id)).scalar_subquery(),
+        TreatmentRecord.appointment_id.is_not(None)
+    )
+    return select(Appointment.id).where(
+        Appointment.status.in_(ARCHIVABLE_STATUSES),
+        Appointment.appointment_datetime < cutoff,
+        Appointment.id < newest_appointment,
+        Appointment.id.not_in(newest_treatment)
+    ).order_by(Appointment.id).limit(batch_size)
+
+
+def _move(connection, source, target, columns, where, archived_at):
+    connection.execute(insert(target).from_select(
+        list(columns) + ['archived_at'],
+        select(*[getattr(source, c) for c in columns], literal(archived_at, ArchivedAppointment.archived_at.type))
+        .where(where)
+    ))
+    return connection.execute(delete(source).where(where)).rowcount
+
+
+def archive_appointments(older_than_days=None, batch_size=1000):
+    """Move archivable appointments and their treatments; returns (appointments, treatments) moved."""
+    cutoff = archive_cutoff(older_than_days)
+    moved_appointments = moved_treatments = 0
+    while True:
+        with db.engine.begin() as connection:
+            ids = list(connection.execute(_candidates(cutoff, batch_size).with_for_update()).scalars())
+            if not ids:
+                break
+            archived_at = datetime.utcnow()
+            # The conditions are repeated so a row changed since it was picked stays hot.
+            still_archivable = (Appointment.id.in_(ids) & Appointment.status.in_(ARCHIVABLE_STATUSES)
+                                & (Appointment.appointment_datetime < cutoff))
+            moving = select(Appointment.id).where(still_archivable)
+            moved_treatments += _move(connection, TreatmentRecord, ArchivedTreatmentRecord, TREATMENT_COLUMNS,
+                                      TreatmentRecord.appointment_id.in_(moving), archived_at)
+            moved_appointments += _move(connection, Appointment, ArchivedAppointment, APPOINTMENT_COLUMNS,
+                                        still_archivable, archived_at)
+    return moved_appointments, moved_treatments
+
+
+# ------------------ READS ACROSS BOTH ------------------
+def find_appointment(appointment_id):
+    """The appointment with this id (doctor loaded) from the hot table, else the archive, else None."""
+    for model in (Appointment, ArchivedAppointment):
+        appointment = db.session.get(model, appointment_id, options=[joinedload(model.doctor)])
+        if appointment is not None:
+            return appointment
+    return None
+
+
+def find_treatment(treatment_id):
+    """One treatment record with its full text and doctor, from either table, else None."""
+    for model in (TreatmentRecord, ArchivedTreatmentRecord):
+        treatment = db.session.get(model, treatment_id, options=[undefer_group('body'), joinedload(model.doctor)])
+        if treatment is not None:
+            return treatment
+    return None
+
+
+def treatments_for(appointment):
+    model = ArchivedTreatmentRecord if isinstance(appointment, ArchivedAppointment) else TreatmentRecord
+    return model.query.options(undefer_group('body')).filter_by(appointment_id=appointment.id).all()
+
+
+def appointment_history(*criteria):
+    """Hot and archived appointments matching `criteria(model)` as one subquery."""
+    return union_all(*[
+        select(*[getattr(model, c) for c in APPOINTMENT_COLUMNS]).where(*[criterion(model) for criterion in criteria])
+        for model in (Appointment, ArchivedAppointment)
+    ]).subquery()
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built and served
+    brotli = None
+
+ASSET_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg')
+# Preferred first: brotli is ~15% smaller than gzip on the Bootstrap files.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+# ------------------ MANIFEST ------------------
+# Every asset under static/ gets a content-hashed name (css/style.css ->
+# css/style.1a2b3c4d5e.css), built once at startup. url_for('static', ...) hands out the
+# hashed name, which can then be cached for a year: a changed file gets a new URL.
+def fingerprint(path, length=10):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def iter_assets(static_folder):
+    for root, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+class AssetManifest:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.urls = {}
+        self.originals = {}
+        for filename, path in iter_assets(static_folder):
+            stem, ext = os.path.splitext(filename)
+            hashed = f'{stem}.{fingerprint(path)}{ext}'
+            self.urls[filename] = hashed
+            self.originals[hashed] = filename
+
+    def variant(self, filename, accept_encodings):
+        """Pick the precompressed file to send for `filename`, if one is usable."""
+        path = os.path.join(self.static_folder, filename)
+        for encoding, suffix in ENCODINGS:
+            if accept_encodings.quality(encoding) <= 0:
+                continue
+            compressed = path + suffix
+            # Stale variants (older than the source) are ignored rather than served.
+            if os.path.exists(compressed) and os.path.getmtime(compressed) >= os.path.getmtime(path):
+                return encoding, filename + suffix
+        return None, filename
+
+
+def build_compressed(static_folder):
+    """Write .gz (and, with brotli installed, .br) next to each compressible asset."""
+    written = []
+    for filename, path in iter_assets(static_folder):
+        if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            written.append((filename + suffix, len(data), len(compressed)))
+    return written
+
+
+# ------------------ SERVING ------------------
+def _static_url_defaults(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        manifest = current_app.extensions['hms_assets']
+        values['filename'] = manifest.urls.get(values['filename'], values['filename'])
+
+
+def serve_static(filename):
+    manifest = current_app.extensions['hms_assets']
+    original = manifest.originals.get(filename)
+    if original is None:
+        # Un-hashed URLs keep Flask's default revalidating behaviour.
+        return current_app.send_static_file(filename)
+
+    encoding, path = manifest.variant(original, request.accept_encodings)
+    response = send_from_directory(
+        manifest.static_folder, path,
+        mimetype=mimetypes.guess_type(original)[0] or 'application/octet-stream',
+        max_age=IMMUTABLE_MAX_AGE
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if original.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# ------------------ HTML COMPRESSION ------------------
+def _compress_response(response):
+    config = current_app.config
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if brotli is not None and request.accept_encodings.quality('br') > 0:
+        encoding, data = 'br', brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    elif request.accept_encodings.quality('gzip') > 0:
+        encoding, data = 'gzip', gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+    else:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_assets(app):
+    if app.config.get('ASSETS_FINGERPRINT'):
+        app.extensions['hms_assets'] = AssetManifest(app.static_folder)
+        app.view_functions['static'] = serve_static
+        app.url_defaults(_static_url_defaults)
+    if app.config.get('COMPRESS_RESPONSES'):
+        app.after_request(_compress_response)
@@ -0,0 +1,46 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+# Reports bcrypt hashes/sec on this host for each cost level, single-threaded and across
+# a thread pool, to help pick BCRYPT_LOG_ROUNDS and HASH_WORKERS.
+#     python bench_bcrypt.py --costs 10 11 12 13 --seconds 2
+
+
+def measure(cost, seconds, threads):
+    salt = bcrypt.gensalt(rounds=cost)
+    password = b'benchmark-password'
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        count = 0
+        while time.perf_counter() < deadline:
+            bcrypt.hashpw(password, salt)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(f.result() for f in [pool.submit(worker) for _ in range(threads)])
+    elapsed = time.perf_counter() - started
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bcrypt hashes/sec per cost level")
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'cost':>4}  {'1 thread/s':>11}  {'ms/hash':>8}  {f'{args.threads} threads/s':>12}")
+    for cost in args.costs:
+        single = measure(cost, args.seconds, 1)
+        pooled = measure(cost, args.seconds, args.threads)
+        print(f"{cost:>4}  {single:>11.1f}  {1000 / single:>8.1f}  {pooled:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
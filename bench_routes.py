@@ -0,0 +1,291 @@
+"""Benchmark the main routes against a seeded database and write a JSON report.
+
+    python seed_data.py --scale medium --db /tmp/hms-medium.db
+    python bench_routes.py --db /tmp/hms-medium.db --out before.json
+    ... change something ...
+    python bench_routes.py --db /tmp/hms-medium.db --out after.json --compare before.json
+
+Requests go through the Flask test client as logged-in users (seed_data.py accounts),
+so the numbers cover routing, queries and rendering but not the network or the WSGI
+server. Per scenario it records latency percentiles, SQL statements and time in SQL
+(from the request metrics hooks), response size and peak Python memory. Booking
+scenarios write to the database; run them against a copy if it must stay pristine.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from sqlalchemy import func, select
+from app import create_app
+from extensions import db
+from metrics import percentile
+from migrations import upgrade
+from models import Appointment, Doctor, Patient, TreatmentRecord, User
+import slots
+
+PASSWORD = 'password'
+
+
+# ------------------ SCENARIOS ------------------
+# Each scenario is (name, role, build) where build(ctx) returns a list of request specs:
+# (method, url, form) tuples, issued in order, one client per user of that role.
+def admin_tabs(ctx):
+    return [('GET', f'/admin_dashboard?tab={tab}', None) for tab in ('doctors', 'patients', 'appointments')]
+
+
+def admin_search(ctx):
+    return [('GET', f'/admin_dashboard?tab={tab}&query=smith', None) for tab in ('doctors', 'patients')]
+
+
+def admin_reports(ctx):
+    start = ctx['today'] - timedelta(days=365)
+    return [('GET', f'/admin/reports?from={start}&to={ctx["today"]}', None),
+            ('GET', f'/admin/reports?from={ctx["today"] - timedelta(days=30)}&to={ctx["today"]}', None)]
+
+
+def patient_dashboard(ctx):
+    return [('GET', '/patient_dashboard', None)]
+
+
+def doctor_dashboard(ctx):
+    return [('GET', '/doctor_dashboard', None)]
+
+
+def book_page(ctx):
+    spec = ctx['specialization']
+    doctor_id, day = ctx['free_slot'][0], ctx['free_slot'][1].date()
+    return [('GET', '/patient/book', None),
+            ('POST', '/patient/book', {'specialization': spec}),
+            ('POST', '/patient/book', {'specialization': spec, 'next_available': '1'}),
+            ('POST', '/patient/book', {'specialization': spec, 'doctor': str(doctor_id),
+                                       'selected_date': day.isoformat()})]
+
+
+def slot_api(ctx):
+    doctor_id, start = ctx['free_slot'][0], ctx['free_slot'][1].date()
+    return [('GET', f'/api/doctors/{doctor_id}/slots?from={start}&to={start + timedelta(days=6)}', None)]
+
+
+def book_slot(ctx):
+    doctor_id, dt = ctx['free_slots'].pop()
+    return [('POST', '/patient/book', {'specialization': ctx['specialization_of'][doctor_id],
+                                       'doctor': str(doctor_id), 'selected_date': dt.strftime('%Y-%m-%d'),
+                                       'slot': dt.strftime('%Y-%m-%d %H:%M')})]
+
+
+SCENARIOS = [
+    ('admin_tabs', 'admin', admin_tabs),
+    ('admin_search', 'admin', admin_search),
+    ('admin_reports', 'admin', admin_reports),
+    ('patient_dashboard', 'patient', patient_dashboard),
+    ('doctor_dashboard', 'doctor', doctor_dashboard),
+    ('book_page', 'patient', book_page),
+    ('slot_api', 'patient', slot_api),
+    ('book_slot', 'patient', book_slot),
+]
+
+
+# ------------------ SETUP ------------------
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def row_counts():
+    return {model.__tablename__: db.session.scalar(select(func.count()).select_from(model))
+            for model in (User, Doctor, Patient, Appointment, TreatmentRecord)}
+
+
+def busiest(model, column, limit):
+    """Profile ids with the most appointments, so dashboards are measured at their heaviest."""
+    return list(db.session.scalars(
+        select(column).group_by(column).order_by(func.count().desc(), column).limit(limit)
+    ))
+
+
+def usernames(ids, model):
+    return list(db.session.scalars(
+        select(User.username).join(model, model.user_id == User.id).where(model.id.in_(ids))
+    ))
+
+
+def bookable_slots(doctor_ids, count):
+    """Distinct free slots from tomorrow on, enough for every book_slot iteration."""
+    found = []
+    start = date.today() + timedelta(days=1)
+    for doctor_id in doctor_ids:
+        for day, times in sorted(slots.free_slots(doctor_id, start, start + timedelta(days=13)).items()):
+            found.extend((doctor_id, dt) for dt in times)
+        if len(found) >= count:
+            break
+    return found[:count]
+
+
+def prepare(app, users, iterations):
+    with app.app_context():
+        # Databases seeded by an older checkout are brought up to this one's schema.
+        upgrade()
+        doctor_ids = busiest(Appointment, Appointment.doctor_id, users)
+        patient_ids = busiest(Appointment, Appointment.patient_id, users)
+        if not doctor_ids or not patient_ids:
+            sys.exit("No appointments found; seed the database with seed_data.py first.")
+        free = bookable_slots(doctor_ids, iterations * 2 + 1)
+        if not free:
+            sys.exit("No free slots in the next two weeks for the sampled doctors.")
+        specialization_of = dict(db.session.execute(select(Doctor.id, Doctor.specialization)).all())
+        return {
+            'today': date.today(),
+            'accounts': {
+                'admin': [u for u in db.session.scalars(select(User.username).where(User.role == 'admin'))][:1],
+                'doctor': usernames(doctor_ids, Doctor),
+                'patient': usernames(patient_ids, Patient),
+            },
+            'specialization': specialization_of[free[0][0]],
+            'specialization_of': specialization_of,
+            'free_slot': free[0],
+            'free_slots': free[1:][::-1],
+            'counts': row_counts(),
+            'database': db.engine.url.render_as_string(hide_password=True),
+        }
+
+
+def login(app, username, password):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        sys.exit(f"Could not log in as {username}")
+    return client
+
+
+# ------------------ MEASUREMENT ------------------
+def issue(client, method, url, form):
+    if method == 'GET':
+        return client.get(url, headers={'Accept-Encoding': 'identity'})
+    return client.post(url, data=form, headers={'Accept-Encoding': 'identity'})
+
+
+def run_scenario(app, clients, build, ctx, iterations, warmup):
+    store = app.extensions['hms_metrics']
+    latencies, sizes, statuses = [], [], {}
+    for i in range(warmup + iterations):
+        client = clients[i % len(clients)]
+        if i == warmup:
+            store.reset()
+        for method, url, form in build(ctx):
+            started = perf_counter()
+            response = issue(client, method, url, form)
+            elapsed = perf_counter() - started
+            if i >= warmup:
+                latencies.append(elapsed)
+                sizes.append(len(response.get_data()))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    endpoints = store.snapshot()
+    requests = sum(s['count'] for s in endpoints.values()) or 1
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'latency_ms': {f'p{p}': round(percentile(ordered, p) * 1000, 3) for p in (50, 95, 99)}
+        | {'mean': round(sum(ordered) / len(ordered) * 1000, 3), 'max': round(ordered[-1] * 1000, 3)},
+        'sql_per_request': round(sum(s['sql_count']['total'] for s in endpoints.values()) / requests, 2),
+        'db_ms_per_request': round(sum(s['db_time']['total'] for s in endpoints.values()) / requests * 1000, 3),
+        'render_ms_per_request': round(sum(s['render_time']['total'] for s in endpoints.values()) / requests * 1000, 3),
+        'bytes_per_request': round(sum(sizes) / len(sizes)),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def peak_memory(clients, build, ctx):
+    """Peak traced allocation (KiB) over one more pass of the scenario."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        for method, url, form in build(ctx):
+            issue(clients[0], method, url, form)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def compare(report, baseline):
+    print(f"\n{'scenario':<20}{'p50 ms':>18}{'p95 ms':>18}{'SQL/req':>16}{'bytes/req':>20}")
+    for name, result in report['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        cells = []
+        for value, before in ((result['latency_ms']['p50'], old['latency_ms']['p50']),
+                              (result['latency_ms']['p95'], old['latency_ms']['p95']),
+                              (result['sql_per_request'], old['sql_per_request']),
+                              (result['bytes_per_request'], old['bytes_per_request'])):
+            change = f"{(value - before) / before * 100:+.0f}%" if before else 'n/a'
+            cells.append(f"{value:g} ({change})")
+        print(f"{name:<20}{cells[0]:>18}{cells[1]:>18}{cells[2]:>16}{cells[3]:>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file made by seed_data.py.')
+    parser.add_argument('--url', help='Any SQLAlchemy URL instead of --db.')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--users', type=int, default=5, help='Distinct logged-in users per role.')
+    parser.add_argument('--only', action='append', choices=[s[0] for s in SCENARIOS])
+    parser.add_argument('--password', default=PASSWORD)
+    parser.add_argument('--out', help='Write the JSON report here (default: stdout).')
+    parser.add_argument('--compare', help='Earlier JSON report to print deltas against.')
+    args = parser.parse_args()
+
+    if not (args.db or args.url):
+        parser.error('pass --db or --url')
+    url = args.url or f'sqlite:///{os.path.abspath(args.db)}'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'WTF_CSRF_ENABLED': False, 'METRICS_ENABLED': True,
+                      'RATE_LIMITS_ENABLED': False})
+    ctx = prepare(app, args.users, args.iterations + args.warmup)
+    passwords = {'admin': 'admin123', 'doctor': args.password, 'patient': args.password}
+    clients = {role: [login(app, name, passwords[role]) for name in names]
+               for role, names in ctx['accounts'].items()}
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': ctx['database'],
+            'rows': ctx['counts'],
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+        },
+        'scenarios': {},
+    }
+    for name, role, build in SCENARIOS:
+        if args.only and name not in args.only:
+            continue
+        result = run_scenario(app, clients[role], build, ctx, args.iterations, args.warmup)
+        if name != 'book_slot':
+            result['peak_kib'] = peak_memory(clients[role], build, ctx)
+        report['scenarios'][name] = result
+        print(f"{name:<20} p50 {result['latency_ms']['p50']:>8.2f} ms  p95 {result['latency_ms']['p95']:>8.2f} ms  "
+              f"{result['sql_per_request']:>6} SQL/req", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Measure gunicorn cold start: time until each worker serves its first response.
+
+    python seed_data.py --scale small
+    python bench_startup.py --db /tmp/hms-small.db --out startup.json
+
+Each variant starts `gunicorn -c gunicorn.conf.py wsgi:app` on a free port and keeps
+`--clients` threads requesting --path (as a logged-in patient) on fresh connections from
+the moment the process is spawned. Every request carries an id that gunicorn writes to
+its access log with the worker pid and its own request time, so per worker we get the
+moment its first response arrived (seconds since spawn), how long that first request
+took inside the worker, and the median of its later requests for comparison.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+from statistics import median
+from time import perf_counter, sleep
+from app import create_app
+from bench_routes import git_commit, login, prepare, PASSWORD
+import warmup
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BOOT_LINE = re.compile(r'Booting worker with pid: (\d+)')
+
+# name -> (preload_app, warm-up, template bytecode cache already filled)
+VARIANTS = {
+    'lazy': (False, False, False),
+    'preload': (True, False, False),
+    'warmup': (False, True, False),
+    'warmup-cached': (False, True, True),
+    'preload-warmup': (True, True, True),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(url, password):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'WTF_CSRF_ENABLED': False})
+    ctx = prepare(app, 1, 1)
+    client = login(app, ctx['accounts']['patient'][0], password)
+    return client.get_cookie('session').value
+
+
+def fill_template_cache(url, directory):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TEMPLATE_CACHE_DIR': directory})
+    warmup.compile_templates(app)
+
+
+# ------------------ ONE RUN ------------------
+def run_variant(name, url, cookie, args):
+    preload, warm, cached = VARIANTS[name]
+    scratch = tempfile.mkdtemp(prefix=f'hms-startup-{name}-')
+    cache_dir = os.path.join(scratch, 'jinja_cache')
+    if cached:
+        fill_template_cache(url, cache_dir)
+    access_log, error_log = os.path.join(scratch, 'access.log'), os.path.join(scratch, 'error.log')
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=url, HMS_TEMPLATE_CACHE_DIR=cache_dir, HMS_WARMUP='1' if warm else '0',
+               GUNICORN_PRELOAD='1' if preload else '0', GUNICORN_BIND=f'127.0.0.1:{port}')
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+
+    sent = {}
+    stop = threading.Event()
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def client():
+        while not stop.is_set():
+            with lock:
+                request_id = next(counter)
+            request = urllib.request.Request(f'http://127.0.0.1:{port}{args.path}', headers={
+                'Cookie': f'session={cookie}', 'X-Bench-Id': str(request_id), 'Connection': 'close'})
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except urllib.error.HTTPError:
+                pass
+            except OSError:
+                # Not listening yet.
+                sleep(0.005)
+                continue
+            sent[str(request_id)] = perf_counter() - started
+
+    started = perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app',
+         '--access-logfile', access_log, '--error-logfile', error_log,
+         '--access-logformat', '%(p)s %({x-bench-id}i)s %(L)s %(s)s'],
+        cwd=HERE, env=env
+    )
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        workers, served = wait_for_workers(error_log, access_log, args.per_worker, args.timeout, started)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    per_worker = []
+    for pid in workers:
+        rows = served.get(pid, [])
+        if not rows:
+            per_worker.append({'pid': pid, 'first_response_s': None})
+            continue
+        first_id, first_time = rows[0]
+        per_worker.append({
+            'pid': pid,
+            'first_response_s': round(sent.get(first_id, float('nan')), 3),
+            'first_request_ms': round(first_time * 1000, 2),
+            'steady_ms': round(median(t for _, t in rows[1:]) * 1000, 2) if len(rows) > 1 else None,
+            'requests': len(rows),
+        })
+    shutil.rmtree(scratch, ignore_errors=True)
+    answered = [w for w in per_worker if w['first_response_s'] is not None]
+    return {
+        'preload_app': preload,
+        'warmup': warm,
+        'template_cache_filled': cached,
+        'first_response_s': min((w['first_response_s'] for w in answered), default=None),
+        'all_workers_s': max((w['first_response_s'] for w in answered), default=None)
+        if len(answered) == len(per_worker) else None,
+        'first_request_ms_mean': round(sum(w['first_request_ms'] for w in answered) / len(answered), 2)
+        if answered else None,
+        'steady_ms_mean': round(sum(w['steady_ms'] for w in answered if w['steady_ms']) /
+                                max(1, sum(1 for w in answered if w['steady_ms'])), 2),
+        'workers': per_worker,
+    }
+
+
+def read_logs(error_log, access_log):
+    workers, served = [], {}
+    if os.path.exists(error_log):
+        with open(error_log) as fh:
+            workers = BOOT_LINE.findall(fh.read())
+    if os.path.exists(access_log):
+        with open(access_log) as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) == 4 and parts[3] == '200':
+                    served.setdefault(parts[0].strip('<>'), []).append((parts[1], float(parts[2])))
+    return workers, served
+
+
+def wait_for_workers(error_log, access_log, per_worker, timeout, started):
+    while True:
+        workers, served = read_logs(error_log, access_log)
+        if workers and all(len(served.get(pid, [])) >= per_worker for pid in workers):
+            return workers, served
+        if perf_counter() - started > timeout:
+            print(f"timed out; {sum(1 for pid in workers if pid in served)}/{len(workers)} workers answered",
+                  file=sys.stderr)
+            return workers, served
+        sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file made by seed_data.py.')
+    parser.add_argument('--url', help='Any SQLAlchemy URL instead of --db.')
+    parser.add_argument('--path', default='/patient_dashboard', help='Page requested as a logged-in patient.')
+    parser.add_argument('--variant', action='append', choices=list(VARIANTS))
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY (default: gunicorn.conf.py).')
+    parser.add_argument('--threads', type=int, help='GUNICORN_THREADS (default: gunicorn.conf.py).')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads.')
+    parser.add_argument('--per-worker', type=int, default=5, help='Responses to collect from every worker.')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--password', default=PASSWORD)
+    parser.add_argument('--out', help='Write the JSON report here (default: stdout).')
+    args = parser.parse_args()
+
+    if not (args.db or args.url):
+        parser.error('pass --db or --url')
+    url = args.url or f'sqlite:///{os.path.abspath(args.db)}'
+    cookie = session_cookie(url, args.password)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'cpus': os.cpu_count(),
+            'path': args.path,
+        },
+        'variants': {},
+    }
+    for name in args.variant or VARIANTS:
+        result = run_variant(name, url, cookie, args)
+        report['variants'][name] = result
+        print(f"{name:<16} first response {result['first_response_s']}s  all workers {result['all_workers_s']}s  "
+              f"first request {result['first_request_ms_mean']} ms  steady {result['steady_ms_mean']} ms",
+              file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Appointment
+
+MAX_RESCHEDULES = 2
+
+
+class SlotTaken(RuntimeError):
+    pass
+
+
+class RescheduleRefused(RuntimeError):
+    pass
+
+
+# ------------------ RESERVATIONS ------------------
+# uq_doctor_datetime is the reservation: whichever transaction writes the
+# (doctor_id, appointment_datetime) key first wins, and everyone else's flush fails
+# with IntegrityError, which is turned into SlotTaken after rolling back. Nothing is
+# checked-then-written, so there is no window between the check and the insert.
+def book_slot(patient_id, doctor_id, dt):
+    appt = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        appointment_datetime=dt,
+        status="Booked",
+        reschedule_count=0
+    )
+    db.session.add(appt)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise SlotTaken(dt)
+    return appt
+
+
+def reschedule(appt, doctor_id, dt):
+    """Move `appt` to (doctor_id, dt) and count the reschedule, all in one transaction."""
+    seen = appt.reschedule_count or 0
+    if seen >= MAX_RESCHEDULES:
+        raise RescheduleRefused(f"Maximum {MAX_RESCHEDULES} reschedules allowed. Cannot reschedule further.")
+
+    try:
+        # Claim the reschedule first: the conditional UPDATE only matches if no other
+        # request has moved or closed this appointment since we read it.
+        claimed = db.session.execute(
+            update(Appointment).where(
+                Appointment.id == appt.id,
+                Appointment.reschedule_count == seen,
+                Appointment.status.in_(("Booked", "Rescheduled"))
+            ).values(reschedule_count=seen + 1)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            raise RescheduleRefused("This appointment was changed in the meantime. Please try again.")
+
+        appt.doctor_id = doctor_id
+        appt.appointment_datetime = dt
+        appt.status = "Booked"
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise SlotTaken(dt)
+    return appt
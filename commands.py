@@ -0,0 +1,201 @@
+import time
+import click
+from flask import current_app
+from extensions import db
+from flask.cli import with_appcontext
+import assets
+import slots
+import counters
+import search
+import exports
+import migrations
+import reports
+import archive
+import replicas
+from importer import KINDS, Importer
+
+
+# ------------------ REBUILD SLOT TABLE ------------------
+@click.command('rebuild-slots')
+@with_appcontext
+def rebuild_slots_command():
+    total = slots.rebuild_slot_table()
+    click.echo(f"Rebuilt {total} doctor slots.")
+
+
+# ------------------ RECONCILE COUNTERS ------------------
+@click.command('reconcile-counters')
+@with_appcontext
+def reconcile_counters_command():
+    for name, value in counters.reconcile_counters().items():
+        click.echo(f"{name}: {value}")
+
+
+# ------------------ SEARCH INDEX ------------------
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    if search.rebuild_search_index():
+        click.echo("Search index rebuilt.")
+    else:
+        click.echo("Full-text search needs SQLite FTS5; admin search will use ILIKE.")
+
+
+# ------------------ BULK IMPORT ------------------
+# Rows go in with one multi-row INSERT per chunk, bypassing the ORM events, so counters and
+# the slot table are reconciled once at the end; the FTS index is kept by its triggers.
+# Passwords may be given as plain `password` (hashed across --workers processes) or as an
+# existing bcrypt `password_hash`. A low --rounds makes large imports fast; those hashes are
+# upgraded to BCRYPT_LOG_ROUNDS the first time each user logs in.
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per INSERT/transaction.')
+@click.option('--rounds', type=int, help='bcrypt cost for imported passwords (default BCRYPT_LOG_ROUNDS).')
+@click.option('--workers', type=int, help='Hashing processes (default: CPU count).')
+@click.option('--dry-run', is_flag=True, help='Validate only, write nothing.')
+@with_appcontext
+def import_data_command(kind, path, chunk_size, rounds, workers, dry_run):
+    with Importer(chunk_size=chunk_size, rounds=rounds, workers=workers, dry_run=dry_run) as importer:
+        result = importer.run(kind, path)
+    for line, message in sorted(result.errors):
+        click.echo(f"{result.unit} {line}: {message}", err=True)
+    verb = "Validated" if dry_run else "Imported"
+    click.echo(f"{verb} {result.inserted} {kind}, {len(result.errors)} rejected.")
+    if result.errors:
+        raise SystemExit(1)
+
+
+# ------------------ EXPORT ------------------
+@click.command('export-data')
+@click.argument('dataset', type=click.Choice(exports.DATASETS))
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='File to write (default stdout).')
+@click.option('--format', 'fmt', type=click.Choice(exports.FORMATS), default='csv', show_default=True)
+@click.option('--from', 'date_from', help='First day, YYYY-MM-DD.')
+@click.option('--to', 'date_to', help='Last day, YYYY-MM-DD (inclusive).')
+@click.option('--doctor-id', type=int)
+@click.option('--status', type=click.Choice(exports.APPOINTMENT_STATUSES))
+@click.option('--gzip', is_flag=True, help='Compress the output with gzip.')
+@with_appcontext
+def export_data_command(dataset, output, fmt, date_from, date_to, doctor_id, status, gzip):
+    try:
+        filters = exports.parse_filters(date_from, date_to, doctor_id, status)
+    except exports.ExportFilterError as e:
+        raise click.BadParameter(str(e))
+    with click.open_file(output or '-', 'wb') as out:
+        for chunk in exports.export_chunks(dataset, fmt, gzip=gzip, **filters):
+            out.write(chunk)
+
+
+# ------------------ MIGRATIONS ------------------
+def _echo_query_plans():
+    for name, index, plan, uses_index in migrations.query_plan_report():
+        mark = 'ok     ' if uses_index else 'NO INDEX'
+        click.echo(f"[{mark}] {name}" + (f" (expects {index})" if index else ""))
+        for line in plan:
+            click.echo(f"           {line}")
+
+
+@click.command('migrate')
+@click.option('--to', 'target', type=int, help='Stop after this version.')
+@click.option('--no-report', is_flag=True, help='Skip the EXPLAIN report.')
+@with_appcontext
+def migrate_command(target, no_report):
+    applied = migrations.upgrade(target)
+    for version, name in applied:
+        click.echo(f"Applied {version:04d} {name}")
+    if not applied:
+        click.echo("Database is up to date.")
+    if not no_report:
+        _echo_query_plans()
+
+
+@click.command('migration-status')
+@with_appcontext
+def migration_status_command():
+    for version, name, applied in migrations.status():
+        click.echo(f"{version:04d} {'applied' if applied else 'pending'}  {name}")
+
+
+@click.command('explain-hot-queries')
+@with_appcontext
+def explain_hot_queries_command():
+    _echo_query_plans()
+
+
+# ------------------ REPORTING ROLLUPS ------------------
+# Nightly job: rebuilds the daily rollups from the source tables, correcting anything
+# the incremental updates missed (bulk Core writes, concurrent specialization moves).
+@click.command('backfill-rollups')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help='First day (default: earliest data).')
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help='Last day (default: latest data).')
+@with_appcontext
+def backfill_rollups_command(date_from, date_to):
+    with db.engine.begin() as connection:
+        rows = reports.backfill(connection, date_from and date_from.date(), date_to and date_to.date())
+    click.echo(f"Rebuilt {rows} doctor-day rollup rows.")
+
+
+# ------------------ ARCHIVE ------------------
+# Moves Completed/Cancelled appointments older than the cutoff (and their treatments)
+# to the archive tables in batches, keeping the hot appointment table small. Safe to run
+# while the app is serving; schedule it nightly next to backfill-rollups.
+@click.command('archive-appointments')
+@click.option('--older-than', 'days', type=int, help='Age in days (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', default=1000, show_default=True, help='Appointments moved per transaction.')
+@with_appcontext
+def archive_appointments_command(days, batch_size):
+    appointments, treatments = archive.archive_appointments(days, batch_size)
+    click.echo(f"Archived {appointments} appointments and {treatments} treatment records "
+               f"older than {archive.archive_cutoff(days):%Y-%m-%d}.")
+
+
+# ------------------ READ REPLICA ------------------
+# Refreshes the local SQLite replica (REPLICA_DATABASE_URI) from the primary. With --every
+# it keeps copying until interrupted; keep the interval below REPLICA_STICKY_SECONDS so a
+# user's own writes have reached the replica by the time their reads go back to it.
+@click.command('sync-replica')
+@click.option('--every', type=float, help='Repeat every N seconds until interrupted.')
+@with_appcontext
+def sync_replica_command(every):
+    engines = db.engines
+    if replicas.REPLICA_BIND not in engines:
+        raise click.UsageError("REPLICA_DATABASE_URI is not set.")
+    while True:
+        started = time.perf_counter()
+        try:
+            replicas.sync_sqlite_replica(engines[None], engines[replicas.REPLICA_BIND])
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Replica synced in {time.perf_counter() - started:.2f}s.")
+        if not every:
+            break
+        time.sleep(every)
+
+
+# ------------------ STATIC ASSETS ------------------
+# Run at deploy time (and after editing anything under static/); stale variants are
+# skipped when serving, so forgetting it only costs compression, never correctness.
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    written = assets.build_compressed(current_app.static_folder)
+    for filename, size, compressed in written:
+        click.echo(f"{filename}: {size} -> {compressed} bytes")
+    if assets.brotli is None:
+        click.echo("brotli is not installed; only gzip variants were written.")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_slots_command)
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(migration_status_command)
+    app.cli.add_command(explain_hot_queries_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(backfill_rollups_command)
+    app.cli.add_command(archive_appointments_command)
+    app.cli.add_command(sync_replica_command)
@@ -0,0 +1,72 @@
+import os
+
+# ------------------ PROFILES ------------------
+# HMS_PROFILE picks one of these on top of the defaults in create_app(); individual
+# settings can then be overridden from the environment (see ENV_SETTINGS).
+PROFILES = {
+    'development': {},
+    'production': {
+        'DB_POOL_SIZE': 10,
+        'DB_MAX_OVERFLOW': 20,
+        'DB_POOL_RECYCLE': 1800,
+        'DB_POOL_TIMEOUT': 30,
+        'DB_STATEMENT_TIMEOUT_MS': 15000,
+    },
+    'testing': {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'RATE_LIMITS_ENABLED': False,
+    },
+}
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# env var -> (config key, parser)
+ENV_SETTINGS = {
+    'SECRET_KEY': ('SECRET_KEY', str),
+    'DATABASE_URL': ('SQLALCHEMY_DATABASE_URI', str),
+    'HMS_REPLICA_DATABASE_URL': ('REPLICA_DATABASE_URI', str),
+    'HMS_REPLICA_STICKY_SECONDS': ('REPLICA_STICKY_SECONDS', int),
+    'HMS_DB_POOL_SIZE': ('DB_POOL_SIZE', int),
+    'HMS_DB_MAX_OVERFLOW': ('DB_MAX_OVERFLOW', int),
+    'HMS_DB_POOL_RECYCLE': ('DB_POOL_RECYCLE', int),
+    'HMS_DB_POOL_TIMEOUT': ('DB_POOL_TIMEOUT', int),
+    'HMS_DB_STATEMENT_TIMEOUT_MS': ('DB_STATEMENT_TIMEOUT_MS', int),
+    'HMS_SQLITE_WAL': ('SQLITE_WAL', _flag),
+    'HMS_SQLITE_SYNCHRONOUS': ('SQLITE_SYNCHRONOUS', str),
+    'HMS_SQLITE_BUSY_TIMEOUT_MS': ('SQLITE_BUSY_TIMEOUT_MS', int),
+    'HMS_SQLITE_MMAP_SIZE': ('SQLITE_MMAP_SIZE', int),
+    'HMS_TEMPLATE_CACHE_DIR': ('TEMPLATE_CACHE_DIR', str),
+    'HMS_WARMUP': ('WARMUP_ON_START', _flag),
+    'HMS_RATE_LIMITS': ('RATE_LIMITS_ENABLED', _flag),
+    'HMS_RATE_LIMIT_STORAGE': ('RATE_LIMIT_STORAGE', str),
+    'HMS_RATE_LIMIT_PROXY_HOPS': ('RATE_LIMIT_PROXY_HOPS', int),
+}
+
+
+def normalize_database_url(url):
+    # Heroku-style URLs still use the scheme SQLAlchemy dropped in 1.4.
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def config_from_env(environ=None):
+    environ = os.environ if environ is None else environ
+    profile = environ.get('HMS_PROFILE', 'development')
+    if profile not in PROFILES:
+        raise RuntimeError(f"Unknown HMS_PROFILE '{profile}', expected one of {', '.join(PROFILES)}")
+
+    config = dict(PROFILES[profile], HMS_PROFILE=profile)
+    for name, (key, parse) in ENV_SETTINGS.items():
+        if environ.get(name):
+            config[key] = parse(environ[name])
+    for key in ('SQLALCHEMY_DATABASE_URI', 'REPLICA_DATABASE_URI'):
+        if key in config:
+            config[key] = normalize_database_url(config[key])
+    return config
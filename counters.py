@@ -0,0 +1,97 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select, update
+from extensions import db
+from models import Appointment, ArchivedAppointment, Doctor, Patient, StatCounter, APPOINTMENT_STATUSES
+
+# Archived appointments still count: archiving moves rows without touching the totals.
+TOTALS = {Doctor: 'doctors', Patient: 'patients', Appointment: 'appointments', ArchivedAppointment: 'appointments'}
+APPOINTMENT_MODELS = (Appointment, ArchivedAppointment)
+
+
+def status_key(status):
+    return f'appointments.{status}'
+
+
+COUNTER_NAMES = tuple(dict.fromkeys(TOTALS.values())) + tuple(status_key(s) for s in APPOINTMENT_STATUSES)
+
+
+# ------------------ MAINTAINED COUNTERS ------------------
+# Admin header totals live in StatCounter and are adjusted by mapper events inside the
+# flush that changes the rows, so they commit or roll back together with them. Bulk
+# Core inserts bypass these events; run `flask reconcile-counters` after them.
+def counters_enabled():
+    return has_app_context() and current_app.config.get('USE_STAT_COUNTERS', False)
+
+
+def _bump(connection, deltas):
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(StatCounter).where(StatCounter.name == name).values(value=StatCounter.value + delta)
+            )
+
+
+def _on_insert(mapper, connection, target):
+    if not counters_enabled():
+        return
+    deltas = {TOTALS[type(target)]: 1}
+    if isinstance(target, APPOINTMENT_MODELS):
+        deltas[status_key(target.status or 'Booked')] = 1
+    _bump(connection, deltas)
+
+
+def _on_delete(mapper, connection, target):
+    if not counters_enabled():
+        return
+    deltas = {TOTALS[type(target)]: -1}
+    if isinstance(target, APPOINTMENT_MODELS):
+        history = inspect(target).attrs.status.history
+        old_status = history.deleted[0] if history.deleted else target.status
+        deltas[status_key(old_status)] = -1
+    _bump(connection, deltas)
+
+
+def _on_appointment_update(mapper, connection, target):
+    if not counters_enabled():
+        return
+    history = inspect(target).attrs.status.history
+    if history.deleted and history.added and history.deleted[0] != history.added[0]:
+        _bump(connection, {status_key(history.deleted[0]): -1, status_key(history.added[0]): 1})
+
+
+for model in TOTALS:
+    event.listen(model, 'after_insert', _on_insert)
+    event.listen(model, 'after_delete', _on_delete)
+event.listen(Appointment, 'after_update', _on_appointment_update)
+
+
+def count_rows():
+    values = {name: 0 for name in COUNTER_NAMES}
+    for model, name in TOTALS.items():
+        values[name] += db.session.scalar(select(func.count()).select_from(model))
+    for model in APPOINTMENT_MODELS:
+        for status, count in db.session.query(model.status, func.count()).group_by(model.status):
+            values[status_key(status)] = values.get(status_key(status), 0) + count
+    return values
+
+
+def reconcile_counters():
+    StatCounter.__table__.create(db.engine, checkfirst=True)
+    values = count_rows()
+    existing = {c.name: c for c in StatCounter.query.all()}
+    for name, value in values.items():
+        if name in existing:
+            existing[name].value = value
+        else:
+            db.session.add(StatCounter(name=name, value=value))
+    db.session.commit()
+    return values
+
+
+def get_counters():
+    if not counters_enabled():
+        return count_rows()
+    values = dict(db.session.query(StatCounter.name, StatCounter.value))
+    if any(name not in values for name in COUNTER_NAMES):
+        values = reconcile_counters()
+    return values
@@ -0,0 +1,82 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from extensions import db
+
+
+# ------------------ ENGINE OPTIONS ------------------
+# Built from the DB_* settings unless SQLALCHEMY_ENGINE_OPTIONS is given explicitly.
+# Pool settings only apply to pooled drivers; in-memory SQLite keeps the single shared
+# connection Flask-SQLAlchemy sets up for it.
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return options
+        # sqlite3's own lock wait, in seconds; the PRAGMA below sets the same thing.
+        options['connect_args'] = {'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}
+    else:
+        options['pool_pre_ping'] = True
+        timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS')
+        if timeout_ms and url.get_backend_name() == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={int(timeout_ms)}'}
+
+    for key, option in (('DB_POOL_SIZE', 'pool_size'), ('DB_MAX_OVERFLOW', 'max_overflow'),
+                        ('DB_POOL_RECYCLE', 'pool_recycle'), ('DB_POOL_TIMEOUT', 'pool_timeout')):
+        if config.get(key) is not None:
+            options[option] = config[key]
+    return options
+
+
+# ------------------ SQLITE PRAGMAS ------------------
+# WAL lets readers carry on while one writer commits, so gunicorn workers stop failing
+# with "database is locked"; synchronous=NORMAL is durable under WAL except against
+# power loss, and busy_timeout makes a second writer wait instead of erroring.
+def _sqlite_pragmas(config):
+    pragmas = [f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}"]
+    if config.get('SQLITE_WAL', True):
+        pragmas.append("PRAGMA journal_mode = WAL")
+        pragmas.append(f"PRAGMA synchronous = {config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    if config.get('SQLITE_MMAP_SIZE'):
+        pragmas.append(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    return pragmas
+
+
+# ------------------ READ REPLICA ------------------
+# REPLICA_DATABASE_URI becomes the 'replica' bind, with engine options built for its own
+# URL. No model uses that bind key; replicas.RoutingSession picks it per request.
+def replica_bind(config):
+    url = config.get('REPLICA_DATABASE_URI')
+    if not url:
+        return None
+    return dict(engine_options(dict(config, SQLALCHEMY_DATABASE_URI=url)), url=url)
+
+
+def _set_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def _file_sqlite(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def init_database(app):
+    replica = replica_bind(app.config)
+    if replica:
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, replica=replica)
+    db.init_app(app)
+    with app.app_context():
+        engines = db.engines
+    pragmas = _sqlite_pragmas(app.config)
+    if _file_sqlite(engines[None]):
+        _set_pragmas(engines[None], pragmas)
+    # The replica file is only ever written by the backup API, never through the app.
+    if replica and _file_sqlite(engines['replica']):
+        _set_pragmas(engines['replica'], [pragmas[0], "PRAGMA query_only = ON"])
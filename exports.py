@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import (Appointment, ArchivedAppointment, ArchivedTreatmentRecord, Doctor, Patient, TreatmentRecord,
+                    APPOINTMENT_STATUSES)
+
+DATASETS = ('appointments', 'treatments')
+FORMATS = ('csv', 'ndjson')
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+BATCH_SIZE = 1000
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+# ------------------ QUERIES ------------------
+# Plain column selects rather than ORM entities: rows are tuples that are written and
+# dropped, nothing accumulates in the session identity map while a large export runs.
+def _appointments_query(appointment=Appointment, treatment=TreatmentRecord):
+    return (
+        select(
+            appointment.id,
+            appointment.appointment_datetime,
+            appointment.status,
+            appointment.reschedule_count,
+            appointment.created_at,
+            appointment.patient_id,
+            Patient.name.label('patient_name'),
+            appointment.doctor_id,
+            Doctor.name.label('doctor_name'),
+            Doctor.specialization,
+        )
+        .join(Patient, Patient.id == appointment.patient_id)
+        .join(Doctor, Doctor.id == appointment.doctor_id)
+        .order_by(appointment.id)
+    ), appointment.appointment_datetime, appointment.doctor_id, appointment.status
+
+
+def _treatments_query(appointment=Appointment, treatment=TreatmentRecord):
+    linked = aliased(appointment)
+    return (
+        select(
+            treatment.id,
+            treatment.created_at,
+            treatment.appointment_id,
+            linked.appointment_datetime,
+            linked.status.label('appointment_status'),
+            treatment.patient_id,
+            Patient.name.label('patient_name'),
+            treatment.doctor_id,
+            Doctor.name.label('doctor_name'),
+            treatment.diagnosis,
+            treatment.prescriptions,
+            treatment.notes,
+        )
+        .join(Patient, Patient.id == treatment.patient_id)
+        .join(Doctor, Doctor.id == treatment.doctor_id)
+        .outerjoin(linked, linked.id == treatment.appointment_id)
+        .order_by(treatment.id)
+    ), treatment.created_at, treatment.doctor_id, linked.status
+
+
+QUERIES = {'appointments': _appointments_query, 'treatments': _treatments_query}
+# Exports cover the whole history: the archive tables first (older rows), then the hot ones.
+SOURCES = ((ArchivedAppointment, ArchivedTreatmentRecord), (Appointment, TreatmentRecord))
+
+
+def parse_filters(date_from=None, date_to=None, doctor_id=None, status=None):
+    try:
+        filters = {
+            'date_from': date.fromisoformat(date_from) if date_from else None,
+            'date_to': date.fromisoformat(date_to) if date_to else None,
+            'doctor_id': int(doctor_id) if doctor_id else None,
+        }
+    except ValueError as e:
+        raise ExportFilterError(str(e))
+    if status and status not in APPOINTMENT_STATUSES:
+        raise ExportFilterError(f"Unknown status '{status}'")
+    filters['status'] = status or None
+    return filters
+
+
+def build_query(dataset, date_from=None, date_to=None, doctor_id=None, status=None, source=SOURCES[-1]):
+    query, when, doctor_column, status_column = QUERIES[dataset](*source)
+    if date_from:
+        query = query.where(when >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.where(when < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if doctor_id:
+        query = query.where(doctor_column == doctor_id)
+    if status:
+        query = query.where(status_column == status)
+    return query
+
+
+def export_columns(dataset):
+    # Taken from the statement, not the first row, so an empty export still has its header.
+    return list(build_query(dataset).selected_columns.keys())
+
+
+def iter_rows(dataset, batch_size=BATCH_SIZE, **filters):
+    """Yield row tuples; yield_per fetches in batches and streams on server-side cursors."""
+    for source in SOURCES:
+        query = build_query(dataset, source=source, **filters).execution_options(yield_per=batch_size)
+        result = db.session.execute(query)
+        try:
+            yield from result
+        finally:
+            result.close()
+
+
+# ------------------ ENCODERS ------------------
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def encode_csv(columns, rows, batch_size=BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(v) for v in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_ndjson(columns, rows, batch_size=BATCH_SIZE):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: _plain(v) for c, v in zip(columns, row)}, separators=(',', ':')))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(dataset, fmt='csv', gzip=False, **filters):
+    chunks = ENCODERS[fmt](export_columns(dataset), iter_rows(dataset, **filters))
+    if gzip:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+
+def export_filename(dataset, fmt, gzip=False):
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    return f"{dataset}-{stamp}.{fmt}" + ('.gz' if gzip else '')
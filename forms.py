@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, DateTimeField, DateField, TimeField
-from wtforms.validators import DataRequired, EqualTo, ValidationError
-from models import User
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, DateTimeField, DateField, TimeField, SelectMultipleField
+from wtforms.widgets import CheckboxInput, ListWidget
+from wtforms.validators import DataRequired, EqualTo, Optional, ValidationError
+from models import User, WEEKDAYS
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -59,3 +60,29 @@ class AvailabilityForm(FlaskForm):
     )
     submit = SubmitField('Add Availability')
 
+class RecurringAvailabilityForm(FlaskForm):
+    weekdays = SelectMultipleField(
+        'Days',
+        choices=list(enumerate(WEEKDAYS)),
+        coerce=int,
+        validators=[DataRequired()],
+        widget=ListWidget(prefix_label=False),
+        option_widget=CheckboxInput()
+    )
+    start_time = TimeField('Start Time', validators=[DataRequired()], format='%H:%M')
+    end_time = TimeField('End Time', validators=[DataRequired()], format='%H:%M')
+    valid_from = DateField('From', validators=[DataRequired()], format='%Y-%m-%d')
+    valid_until = DateField('Until (optional)', validators=[Optional()], format='%Y-%m-%d')
+    submit = SubmitField('Add Weekly Schedule')
+
+    def validate_end_time(self, end_time):
+        if self.start_time.data and end_time.data and end_time.data <= self.start_time.data:
+            raise ValidationError('End time must be after start time')
+
+    def validate_valid_until(self, valid_until):
+        if valid_until.data and self.valid_from.data and valid_until.data < self.valid_from.data:
+            raise ValidationError('End date must not be before start date')
+
+class RuleExceptionForm(FlaskForm):
+    date = DateField('Skip Date', validators=[DataRequired()], format='%Y-%m-%d')
+    submit = SubmitField('Skip')
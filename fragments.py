@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+# Cached HTML must not carry a session's CSRF token, so fragment templates write this
+# marker instead and each request swaps in its own token after the cache lookup.
+CSRF_MARKER = Markup('<!--csrf-token-->')
+
+
+# ------------------ FRAGMENT CACHE ------------------
+# Rendered template fragments keyed by (template, owner). Each entry remembers the
+# version it was rendered at; a lookup with a newer version re-renders and replaces it,
+# so there is nothing to invalidate. Per process and bounded like the user cache.
+class FragmentCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, html):
+        with self.lock:
+            self.entries[key] = (version, html)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def init_fragment_cache(app):
+    size = app.config.get('FRAGMENT_CACHE_SIZE', 2000)
+    if size:
+        app.extensions['hms_fragments'] = FragmentCache(size)
+
+
+def _with_csrf(html):
+    if CSRF_MARKER not in html:
+        return Markup(html)
+    token = Markup('<input name="csrf_token" type="hidden" value="%s">') % generate_csrf()
+    return Markup(html.replace(CSRF_MARKER, token))
+
+
+def render_fragment(template, owner, version, load_context):
+    """Render `template` with load_context(), or reuse the copy cached at `version`."""
+    cache = current_app.extensions.get('hms_fragments')
+    key = (template, owner)
+    html = cache.get(key, version) if cache is not None else None
+    if html is None:
+        html = render_template(template, csrf_marker=CSRF_MARKER, **load_context())
+        if cache is not None:
+            cache.put(key, version, html)
+    return _with_csrf(html)
@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+
+# ------------------ GUNICORN ------------------
+# Picked up automatically by `gunicorn wsgi:app` from the project directory. Every value
+# can be overridden from the environment (or on the command line).
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', cores * 2 + 1))
+# Threads cover requests waiting on the database or on bcrypt, which both release the GIL.
+threads = int(os.environ.get('GUNICORN_THREADS', max(2, cores)))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+
+
+def post_fork(server, worker):
+    # The master may have connected while loading the app under preload_app; the
+    # children open their own connections.
+    if preload_app:
+        import warmup
+        warmup.dispose_pools(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Runs in each worker after the app is loaded and before it accepts connections.
+    app = worker.wsgi
+    if app.config.get('WARMUP_ON_START'):
+        import warmup
+        warmup.prime_pool(app, threads)
@@ -1,6 +1,8 @@
 from functools import wraps
-from flask import flash, redirect, url_for
+from flask import current_app, flash, g, has_request_context, redirect, url_for, before_render_template, template_rendered
 from flask_login import current_user
+from sqlalchemy import event
+from extensions import db
 
 def roles_required(*roles):
     def decorator(f):
@@ -12,3 +14,38 @@ def roles_required(*roles):
             return f(*args, **kwargs)
         return decorated_function
     return decorator
+
+
+# ------------------ LAZY LOAD GUARD ------------------
+# With RAISE_ON_LAZY_LOAD on (debug/tests), any relationship lazy load that fires while a
+# template is rendering raises, so a route that forgets its joinedload/selectinload fails
+# loudly instead of quietly turning into one query per row.
+class LazyLoadError(RuntimeError):
+    pass
+
+
+def _start_render(app, template, context, **extra):
+    g._rendering = getattr(g, '_rendering', []) + [template.name or '<string>']
+
+
+def _end_render(app, template, context, **extra):
+    g._rendering = getattr(g, '_rendering', [])[:-1]
+
+
+def _check_lazy_load(orm_execute_state):
+    if not orm_execute_state.is_relationship_load or not has_request_context():
+        return
+    if not current_app.config.get('RAISE_ON_LAZY_LOAD'):
+        return
+    rendering = getattr(g, '_rendering', None)
+    if rendering:
+        raise LazyLoadError(
+            f"Lazy load of {orm_execute_state.loader_strategy_path[-1]} while rendering {rendering[-1]}"
+        )
+
+
+def init_lazy_load_guard(app):
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_end_render, app)
+    if not event.contains(db.session, 'do_orm_execute', _check_lazy_load):
+        event.listen(db.session, 'do_orm_execute', _check_lazy_load)
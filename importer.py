@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+import bcrypt as bcrypt_lib
+from flask import current_app
+from sqlalchemy import insert, select
+from werkzeug.datastructures import MultiDict
+from extensions import db
+from forms import AvailabilityForm, DoctorRegistrationForm, PatientRegistrationForm
+from models import (AvailabilityRule, Department, Doctor, DoctorAvailability, Patient, User, ROLE_DOCTOR,
+                    ROLE_PATIENT)
+import counters
+import reports
+import schedules
+import slots
+
+KINDS = ('departments', 'doctors', 'patients', 'availability')
+
+
+# ------------------ VALIDATION FORMS ------------------
+# The web forms, minus confirm_password and the per-row username query; usernames are
+# checked for a whole chunk at once in _taken_usernames().
+class ImportDoctorForm(DoctorRegistrationForm):
+    confirm_password = None
+
+    def validate_username(self, username):
+        pass
+
+
+class ImportPatientForm(PatientRegistrationForm):
+    confirm_password = None
+
+    def validate_username(self, username):
+        pass
+
+
+def _form_errors(form_class, row):
+    form = form_class(formdata=MultiDict(row), meta={'csrf': False})
+    if form.validate():
+        return form, []
+    return form, [f"{name}: {', '.join(errors)}" for name, errors in form.errors.items()]
+
+
+# ------------------ INPUT ------------------
+# Each row comes with where to find it: the CSV file line (the header is line 1; a quoted
+# field spanning lines counts them all) or the 1-based position in a JSON list.
+def is_json(path):
+    return path.lower().endswith('.json')
+
+
+def read_rows(path):
+    if is_json(path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        rows = enumerate(data if isinstance(data, list) else next(iter(data.values())), start=1)
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            rows = []
+            for row in reader:
+                rows.append((reader.line_num, row))
+    for line, row in rows:
+        yield line, {k.strip(): (str(v).strip() if v is not None else '') for k, v in row.items() if k}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _hash_one(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+
+class ImportResult:
+    def __init__(self, kind, unit='line'):
+        self.kind = kind
+        self.unit = unit
+        self.inserted = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+# ------------------ IMPORTER ------------------
+class Importer:
+    def __init__(self, chunk_size=1000, rounds=None, workers=None, dry_run=False):
+        self.chunk_size = chunk_size
+        self.rounds = rounds or current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = workers or os.cpu_count() or 1
+        self.dry_run = dry_run
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def hash_passwords(self, plain):
+        if not plain:
+            return []
+        if self.workers <= 1 or len(plain) < 8:
+            return [_hash_one(p, self.rounds) for p in plain]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(plain) // (self.workers * 4))
+        return list(self._pool.map(_hash_one, plain, repeat(self.rounds), chunksize=chunksize))
+
+    def run(self, kind, path):
+        result = ImportResult(kind, 'record' if is_json(path) else 'line')
+        handler = getattr(self, f'_import_{kind}')
+        handler(read_rows(path), result)
+        if result.inserted and not self.dry_run:
+            counters.reconcile_counters()
+            if kind == 'availability' and slots.slot_table_enabled():
+                slots.rebuild_slot_table()
+        return result
+
+    def _commit(self, statements):
+        if self.dry_run:
+            db.session.rollback()
+            return
+        try:
+            for statement, rows in statements:
+                if rows:
+                    db.session.execute(statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # ------------------ DEPARTMENTS ------------------
+    def _import_departments(self, rows, result):
+        seen = set()
+        for chunk in chunked(rows, self.chunk_size):
+            names = [row.get('name', '') for _, row in chunk]
+            existing = set(db.session.scalars(select(Department.name).where(Department.name.in_(names))))
+            batch = []
+            for line, row in chunk:
+                name = row.get('name', '')
+                if not name:
+                    result.error(line, "name: This field is required.")
+                elif name in existing or name in seen:
+                    result.error(line, f"name: Department '{name}' already exists")
+                else:
+                    seen.add(name)
+                    batch.append({'name': name, 'description': row.get('description') or None})
+            self._commit([(insert(Department), batch)])
+            result.inserted += len(batch)
+
+    # ------------------ USERS ------------------
+    def _taken_usernames(self, usernames):
+        return set(db.session.scalars(select(User.username).where(User.username.in_(usernames))))
+
+    def _import_users(self, rows, result, form_class, role, profile_model, profile_fields):
+        seen = set()
+        for chunk in chunked(rows, self.chunk_size):
+            taken = self._taken_usernames([row.get('username', '') for _, row in chunk])
+            accepted = []
+            for line, row in chunk:
+                prehashed = row.get('password_hash')
+                check_row = dict(row, password=row.get('password') or ('x' if prehashed else ''))
+                form, errors = _form_errors(form_class, check_row)
+                username = form.username.data
+                if username in taken or username in seen:
+                    errors.append("username: Username already exists")
+                if errors:
+                    result.error(line, '; '.join(errors))
+                    continue
+                seen.add(username)
+                accepted.append((row, form))
+
+            to_hash = [row['password'] for row, _ in accepted if not row.get('password_hash')]
+            hashed = iter(self.hash_passwords(to_hash))
+            users, profiles = [], {}
+            for row, form in accepted:
+                password_hash = row.get('password_hash') or next(hashed)
+                users.append({'username': form.username.data, 'password_hash': password_hash,
+                              'role': role, 'is_blacklisted': False})
+                profiles[form.username.data] = {field: (row.get(field) or None) for field in profile_fields}
+                profiles[form.username.data]['name'] = form.name.data
+
+            result.inserted += len(users)
+            if self.dry_run or not users:
+                continue
+            try:
+                created = db.session.execute(insert(User).returning(User.id, User.username), users).all()
+                profile_rows = [dict(profiles[username], user_id=user_id) for user_id, username in created]
+                db.session.execute(insert(profile_model), profile_rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _import_doctors(self, rows, result):
+        self._import_users(rows, result, ImportDoctorForm, ROLE_DOCTOR, Doctor, ('specialization',))
+
+    def _import_patients(self, rows, result):
+        self._import_users(rows, result, ImportPatientForm, ROLE_PATIENT, Patient, ('contact',))
+
+    # ------------------ AVAILABILITY ------------------
+    # Ranges are validated for the whole file first so an overlap between two rows in
+    # different chunks is still caught; the overlap rule matches doctor_add_availability:
+    # ranges that only touch also count, and so does a weekly schedule running that day.
+    def _import_availability(self, rows, result):
+        rows = list(rows)
+        usernames = {row['doctor_username'] for _, row in rows if row.get('doctor_username')}
+        doctor_ids = {}
+        for chunk in chunked(sorted(usernames), self.chunk_size):
+            doctor_ids.update(db.session.execute(
+                select(User.username, Doctor.id).join(Doctor, Doctor.user_id == User.id).where(User.username.in_(chunk))
+            ).all())
+        known_ids = set()
+        raw_ids = {int(row['doctor_id']) for _, row in rows if row.get('doctor_id', '').isdigit()}
+        for chunk in chunked(sorted(raw_ids), self.chunk_size):
+            known_ids.update(db.session.scalars(select(Doctor.id).where(Doctor.id.in_(chunk))))
+
+        ranges = defaultdict(list)
+        for line, row in rows:
+            form, errors = _form_errors(AvailabilityForm, row)
+            if row.get('doctor_username'):
+                doctor_id = doctor_ids.get(row['doctor_username'])
+            elif row.get('doctor_id', '').isdigit() and int(row['doctor_id']) in known_ids:
+                doctor_id = int(row['doctor_id'])
+            else:
+                doctor_id = None
+            if doctor_id is None:
+                errors.append("doctor: Unknown doctor")
+            if not errors and form.start_time.data >= form.end_time.data:
+                errors.append("end_time: End time must be after start time")
+            if errors:
+                result.error(line, '; '.join(errors))
+                continue
+            ranges[(doctor_id, form.date.data)].append((form.start_time.data, form.end_time.data, line))
+
+        existing = defaultdict(list)
+        keys = list(ranges)
+        for chunk in chunked(keys, self.chunk_size):
+            chunk_doctors = {d for d, _ in chunk}
+            chunk_dates = {day for _, day in chunk}
+            chunk_keys = set(chunk)
+            for a in DoctorAvailability.query.filter(
+                DoctorAvailability.doctor_id.in_(chunk_doctors),
+                DoctorAvailability.date.in_(chunk_dates)
+            ):
+                existing[(a.doctor_id, a.date)].append((a.start_time, a.end_time, "an existing availability"))
+            rules = slots.rules_active_between(
+                AvailabilityRule.query.filter(AvailabilityRule.doctor_id.in_(chunk_doctors)),
+                min(chunk_dates), max(chunk_dates)
+            ).all()
+            for window in slots.expand_rules(rules, min(chunk_dates), max(chunk_dates)):
+                if (window.doctor_id, window.date) in chunk_keys:
+                    existing[(window.doctor_id, window.date)].append(
+                        (window.start_time, window.end_time, "the weekly schedule"))
+
+        accepted = []
+        for (doctor_id, day), day_ranges in ranges.items():
+            kept = list(existing.get((doctor_id, day), []))
+            for start, end, line in sorted(day_ranges):
+                clash = next((k for k in kept if k[0] <= end and k[1] >= start), None)
+                if clash:
+                    result.error(line, f"Time range overlaps with {clash[2]}")
+                    continue
+                kept.append((start, end, f"{result.unit} {line}"))
+                accepted.append({'doctor_id': doctor_id, 'date': day, 'start_time': start, 'end_time': end})
+
+        for chunk in chunked(accepted, self.chunk_size):
+            self._commit([(insert(DoctorAvailability), chunk)])
+            result.inserted += len(chunk)
+
+        # Core inserts skip the flush hooks that bump schedule versions and rollups.
+        if accepted and not self.dry_run:
+            schedules.bump_versions(db.session.connection(), {row['doctor_id'] for row in accepted})
+            if reports.rollups_enabled():
+                spans = defaultdict(list)
+                for row in accepted:
+                    spans[row['doctor_id']].append(row['date'])
+                for doctor_id, dates in spans.items():
+                    reports.refresh_doctor_days(db.session.connection(), doctor_id, min(dates), max(dates))
+            db.session.commit()
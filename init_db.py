@@ -1,15 +1,19 @@
 from app import create_app
-from extensions import db, bcrypt
+from extensions import db
+from passwords import hash_password
 from models import User, ROLE_ADMIN, Department
+from counters import reconcile_counters
+from search import rebuild_search_index
+from migrations import upgrade
 
 app = create_app()
 
-def initialize_database():
-    with app.app_context():
-        db.create_all()
+def initialize_database(target=None):
+    with (target or app).app_context():
+        upgrade()
 
         if not User.query.filter_by(role=ROLE_ADMIN).first():
-            hashed = bcrypt.generate_password_hash('admin123').decode('utf-8')
+            hashed = hash_password('admin123')
             admin = User(username='admin', password_hash=hashed, role=ROLE_ADMIN)
             db.session.add(admin)
             db.session.commit()
@@ -21,5 +25,8 @@ def initialize_database():
             db.session.commit()
             print("Departments seeded.")
 
+        reconcile_counters()
+        rebuild_search_index()
+
 if __name__ == "__main__":
     initialize_database()
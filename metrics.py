@@ -0,0 +1,158 @@
+import math
+import threading
+from collections import deque
+from time import perf_counter
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PERCENTILES = (50, 95, 99)
+FIELDS = ('latency', 'sql_count', 'db_time', 'render_time')
+
+PROMETHEUS_HELP = {
+    'latency': ('hms_request_latency_seconds', 'Request latency per endpoint'),
+    'sql_count': ('hms_request_sql_statements', 'SQL statements executed per request'),
+    'db_time': ('hms_request_db_seconds', 'Time spent in SQL per request'),
+    'render_time': ('hms_request_render_seconds', 'Time spent rendering templates per request'),
+}
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# ------------------ METRICS STORE ------------------
+# One bounded window of recent samples per endpoint; percentiles are computed on read so
+# recording a request is an append under a lock.
+class EndpointStats:
+    def __init__(self, window):
+        self.count = 0
+        self.totals = dict.fromkeys(FIELDS, 0.0)
+        self.samples = deque(maxlen=window)
+
+    def add(self, sample):
+        self.count += 1
+        for field in FIELDS:
+            self.totals[field] += sample[field]
+        self.samples.append(sample)
+
+    def summary(self):
+        result = {'count': self.count, 'window': len(self.samples)}
+        for field in FIELDS:
+            ordered = sorted(s[field] for s in self.samples)
+            result[field] = {f'p{p}': percentile(ordered, p) for p in PERCENTILES}
+            result[field]['total'] = self.totals[field]
+        return result
+
+
+class RequestMetrics:
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, sample):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats(self.window)
+            stats.add(sample)
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: stats.summary() for endpoint, stats in sorted(self.endpoints.items())}
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+# ------------------ HOOKS ------------------
+def _current():
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+
+# The start time lives on the statement's execution context, which is dropped with the
+# statement, so one that fails (no after_cursor_execute) leaves nothing behind.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current() is not None:
+        context._metrics_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    started = getattr(context, '_metrics_started', None)
+    if current is not None and started is not None:
+        current['db_time'] += perf_counter() - started
+        current['sql_count'] += 1
+
+
+def _start_render(app, template, context, **extra):
+    current = _current()
+    if current is not None:
+        current['_render_started'].append(perf_counter())
+
+
+def _end_render(app, template, context, **extra):
+    current = _current()
+    if current is not None and current['_render_started']:
+        current['render_time'] += perf_counter() - current['_render_started'].pop()
+
+
+def _start_request():
+    if request.blueprint in ('main', 'api'):
+        g._metrics = {'started': perf_counter(), 'sql_count': 0, 'db_time': 0.0,
+                      'render_time': 0.0, '_render_started': []}
+
+
+def _finish_request(exc):
+    current = _current()
+    if current is None:
+        return
+    g._metrics = None
+    current['latency'] = perf_counter() - current['started']
+    current_app.extensions['hms_metrics'].record(
+        request.endpoint, {field: current[field] for field in FIELDS}
+    )
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    app.extensions['hms_metrics'] = RequestMetrics(app.config.get('METRICS_WINDOW', 1000))
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_end_render, app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# ------------------ EXPORT ------------------
+def snapshot():
+    store = current_app.extensions.get('hms_metrics')
+    if store is None:
+        return {'enabled': False, 'endpoints': {}}
+    return {'enabled': True, 'window': store.window, 'endpoints': store.snapshot()}
+
+
+def prometheus_text():
+    data = snapshot()['endpoints']
+    lines = []
+    for field in FIELDS:
+        name, help_text = PROMETHEUS_HELP[field]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} summary')
+        for endpoint, summary in data.items():
+            values = summary[field]
+            for p in PERCENTILES:
+                lines.append(f'{name}{{endpoint="{endpoint}",quantile="{p / 100}"}} {values[f"p{p}"]}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {values["total"]}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {summary["count"]}')
+    return '\n'.join(lines) + '\n'
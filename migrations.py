@@ -0,0 +1,159 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from extensions import db
+from models import (Appointment, ArchivedAppointment, ArchivedTreatmentRecord, Doctor, DoctorAvailability, Patient,
+                    SpecializationDailyStats, TreatmentRecord)
+import reports
+
+# ------------------ VERSION TABLE ------------------
+# Each entry in MIGRATIONS runs once per database, in order, and is recorded in
+# schema_version. Steps are written to be safe on a database that already has the
+# change (fresh databases get everything from create_all), so existing installs that
+# were patched by hand with the old one-off scripts can simply be upgraded.
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(120), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_missing_tables(connection):
+    db.metadata.create_all(bind=connection, checkfirst=True)
+
+
+def _add_reschedule_count(connection):
+    columns = {c['name'] for c in inspect(connection).get_columns('appointment')}
+    if 'reschedule_count' not in columns:
+        connection.execute(text(
+            'ALTER TABLE appointment ADD COLUMN reschedule_count INTEGER NOT NULL DEFAULT 0'
+        ))
+
+
+HOT_PATH_INDEXES = [
+    ('ix_appointment_patient_status_datetime', 'appointment', ('patient_id', 'status', 'appointment_datetime')),
+    ('ix_appointment_doctor_status', 'appointment', ('doctor_id', 'status')),
+    ('ix_doctor_availability_doctor_date', 'doctor_availability', ('doctor_id', 'date')),
+    ('ix_treatment_record_appointment_id', 'treatment_record', ('appointment_id',)),
+    ('ix_treatment_record_patient_created', 'treatment_record', ('patient_id', 'created_at')),
+    ('ix_doctor_specialization', 'doctor', ('specialization',)),
+]
+
+
+def _create_indexes(connection, concurrently):
+    for name, table, columns in HOT_PATH_INDEXES:
+        connection.execute(text(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+            f"ON {table} ({', '.join(columns)})"
+        ))
+
+
+def _create_hot_path_indexes(connection):
+    # PostgreSQL builds them CONCURRENTLY so bookings keep writing meanwhile; that has
+    # to run outside a transaction, so on a connection of its own: execution_options()
+    # changes a connection in place, and upgrade()'s later steps must stay transactional.
+    # The upgrade connection commits first so CONCURRENTLY does not wait on it. SQLite
+    # holds the write lock only while each index is built, a short pause even on large tables.
+    if connection.dialect.name != 'postgresql':
+        _create_indexes(connection, concurrently=False)
+        return
+    connection.commit()
+    with connection.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as autocommit:
+        _create_indexes(autocommit, concurrently=True)
+
+
+MIGRATIONS = [
+    (1, 'create missing tables', _create_missing_tables),
+    (2, 'appointment.reschedule_count', _add_reschedule_count),
+    (3, 'hot path indexes', _create_hot_path_indexes),
+    (4, 'schedule versions', _create_missing_tables),
+    (5, 'reporting rollups', reports.create_rollups),
+    (6, 'appointment archive', _create_missing_tables),
+]
+
+
+def applied_versions(connection):
+    schema_version.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_version.c.version)).scalars())
+
+
+def upgrade(target=None):
+    """Apply pending migrations up to `target` (default: all). Returns the (version, name) pairs applied."""
+    applied = []
+    with db.engine.connect() as connection:
+        done = applied_versions(connection)
+        connection.commit()
+        for version, name, step in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            step(connection)
+            connection.execute(schema_version.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+            connection.commit()
+            applied.append((version, name))
+    return applied
+
+
+def status():
+    with db.engine.connect() as connection:
+        done = applied_versions(connection)
+        connection.commit()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+# ------------------ QUERY PLAN REPORT ------------------
+# The hot queries in the shape the routes issue them, each with the index expected to
+# serve it. Doctor.user_id and Patient.user_id are unique, so they use the index behind
+# that constraint.
+def hot_queries():
+    return [
+        ('patient_dashboard upcoming', 'ix_appointment_patient_status_datetime',
+         select(Appointment.id).where(Appointment.patient_id == 1, Appointment.status == 'Booked')
+         .order_by(Appointment.appointment_datetime)),
+        ('doctor_dashboard upcoming', 'ix_appointment_doctor_status',
+         select(Appointment.id).where(Appointment.doctor_id == 1, Appointment.status == 'Booked')),
+        ('availability by doctor/date', 'ix_doctor_availability_doctor_date',
+         select(DoctorAvailability.id).where(DoctorAvailability.doctor_id == 1,
+                                             DoctorAvailability.date == datetime.utcnow().date())),
+        ('view_treatment', 'ix_treatment_record_appointment_id',
+         select(TreatmentRecord.id).where(TreatmentRecord.appointment_id == 1)),
+        ('patient_history', 'ix_treatment_record_patient_created',
+         select(TreatmentRecord.id).where(TreatmentRecord.patient_id == 1)
+         .order_by(TreatmentRecord.created_at.desc(), TreatmentRecord.id.desc())),
+        ('patient_dashboard past (archive)', 'ix_archived_appointment_patient_datetime',
+         select(ArchivedAppointment.id).where(ArchivedAppointment.patient_id == 1)
+         .order_by(ArchivedAppointment.appointment_datetime.desc())),
+        ('patient_history (archive)', 'ix_archived_treatment_record_patient_created',
+         select(ArchivedTreatmentRecord.id).where(ArchivedTreatmentRecord.patient_id == 1)
+         .order_by(ArchivedTreatmentRecord.created_at.desc())),
+        ('doctors by specialization', 'ix_doctor_specialization',
+         select(Doctor.id).where(Doctor.specialization == 'Cardiology')),
+        ('reports by day', 'ix_specialization_daily_stats_day',
+         select(SpecializationDailyStats.specialization).where(
+             SpecializationDailyStats.day.between(datetime.utcnow().date(), datetime.utcnow().date()))),
+        ('doctor by user_id', None, select(Doctor.id).where(Doctor.user_id == 1)),
+        ('patient by user_id', None, select(Patient.id).where(Patient.user_id == 1)),
+    ]
+
+
+def explain(connection, query):
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))]
+    return [row[0] for row in connection.execute(text(f'EXPLAIN {compiled}'))]
+
+
+def query_plan_report():
+    """Return (name, expected_index, plan_lines, uses_index) for each hot query."""
+    report = []
+    with db.engine.connect() as connection:
+        for name, index, query in hot_queries():
+            plan = explain(connection, query)
+            joined = ' '.join(plan)
+            if index:
+                uses_index = index in joined
+            else:
+                uses_index = 'USING' in joined.upper() and 'INDEX' in joined.upper()
+            report.append((name, index, plan, uses_index))
+    return report
@@ -1,6 +1,10 @@
+import base64
+import zlib
 from datetime import datetime
 
+from flask import current_app, has_app_context
 from flask_wtf import FlaskForm
+from sqlalchemy import func
 from wtforms import PasswordField, StringField, SubmitField
 from wtforms.validators import DataRequired, EqualTo, ValidationError, Optional
 from extensions import db
@@ -10,6 +14,43 @@ ROLE_ADMIN = 'admin'
 ROLE_DOCTOR = 'doctor'
 ROLE_PATIENT = 'patient'
 
+SLOT_FREE = 'free'
+SLOT_BOOKED = 'booked'
+
+APPOINTMENT_STATUSES = ('Booked', 'Completed', 'Cancelled', 'Rescheduled')
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+DIAGNOSIS_PREVIEW_LENGTH = 80
+
+
+# Text stored zlib-compressed (base64 behind a marker) once it reaches
+# COMPRESS_NOTES_MIN_SIZE characters and compressing actually saves space. Reads accept
+# either form, so rows written before or with compression off stay readable.
+class CompressedText(db.TypeDecorator):
+    impl = db.Text
+    cache_ok = True
+    marker = 'zlib:'
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        min_size = current_app.config.get('COMPRESS_NOTES_MIN_SIZE') if has_app_context() else None
+        # Plain text that happens to start with the marker is always encoded, or it
+        # would be mistaken for compressed data on the way back.
+        literal_marker = value.startswith(self.marker)
+        if literal_marker or (min_size is not None and len(value) >= min_size):
+            packed = self.marker + base64.b64encode(zlib.compress(value.encode('utf-8'), 9)).decode('ascii')
+            if literal_marker or len(packed) < len(value):
+                return packed
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.startswith(self.marker):
+            return zlib.decompress(base64.b64decode(value[len(self.marker):])).decode('utf-8')
+        return value
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -37,10 +78,13 @@ class Doctor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
     name = db.Column(db.String(120), nullable=False)
-    specialization = db.Column(db.String(120), nullable=False)
+    specialization = db.Column(db.String(120), nullable=False, index=True)
     availabilities = db.relationship('DoctorAvailability', backref='doctor', cascade='all, delete-orphan')
+    availability_rules = db.relationship('AvailabilityRule', backref='doctor', cascade='all, delete-orphan')
     appointments = db.relationship('Appointment', backref='doctor', cascade='all, delete-orphan')
     treatments = db.relationship('TreatmentRecord', back_populates='doctor', cascade='all, delete-orphan')
+    archived_appointments = db.relationship('ArchivedAppointment', backref='doctor', cascade='all, delete-orphan')
+    archived_treatments = db.relationship('ArchivedTreatmentRecord', backref='doctor', cascade='all, delete-orphan')
 
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -51,6 +95,8 @@ class Patient(db.Model):
     appointments = db.relationship('Appointment', backref='patient', cascade='all, delete-orphan')
 
     treatments = db.relationship('TreatmentRecord', back_populates='patient', cascade='all, delete-orphan')
+    archived_appointments = db.relationship('ArchivedAppointment', backref='patient', cascade='all, delete-orphan')
+    archived_treatments = db.relationship('ArchivedTreatmentRecord', backref='patient', cascade='all, delete-orphan')
 
 class Appointment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -64,7 +110,11 @@ class Appointment(db.Model):
 
     treatments = db.relationship('TreatmentRecord', back_populates='appointment', cascade='all, delete-orphan')
 
-    __table_args__ = (db.UniqueConstraint('doctor_id', 'appointment_datetime', name='uq_doctor_datetime'),)
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'appointment_datetime', name='uq_doctor_datetime'),
+        db.Index('ix_appointment_patient_status_datetime', 'patient_id', 'status', 'appointment_datetime'),
+        db.Index('ix_appointment_doctor_status', 'doctor_id', 'status'),
+    )
 
 class DoctorAvailability(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,17 +123,152 @@ class DoctorAvailability(db.Model):
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time, nullable=False)
 
+    __table_args__ = (db.Index('ix_doctor_availability_doctor_date', 'doctor_id', 'date'),)
+
+# A standing weekly schedule: `weekdays` is a bitmask (bit 0 = Monday) and the rule runs
+# from valid_from until valid_until, or indefinitely. Dates it should skip are stored as
+# AvailabilityException rows; slots are expanded from it on demand, never stored.
+class AvailabilityRule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False, index=True)
+    weekdays = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    valid_from = db.Column(db.Date, nullable=False)
+    valid_until = db.Column(db.Date, nullable=True)
+
+    exceptions = db.relationship('AvailabilityException', backref='rule', cascade='all, delete-orphan')
+
+    def runs_on(self, weekday):
+        return bool(self.weekdays & (1 << weekday))
+
+    @property
+    def weekday_names(self):
+        return [name for i, name in enumerate(WEEKDAYS) if self.runs_on(i)]
+
+class AvailabilityException(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey('availability_rule.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('rule_id', 'date', name='uq_rule_exception_date'),)
+
 class TreatmentRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=True)
-    diagnosis = db.Column(db.Text)
-    prescriptions = db.Column(db.Text)
-    notes = db.Column(db.Text)
+    # The text bodies load only when touched (or with undefer_group('body')), so lists,
+    # relationship loads and cascading deletes carry just the short columns below.
+    diagnosis = db.deferred(db.Column(db.Text), group='body')
+    prescriptions = db.deferred(db.Column(db.Text), group='body')
+    notes = db.deferred(db.Column(CompressedText), group='body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    diagnosis_preview = db.column_property(func.substr(diagnosis.columns[0], 1, DIAGNOSIS_PREVIEW_LENGTH))
 
     patient = db.relationship('Patient', back_populates='treatments')
     doctor = db.relationship('Doctor', back_populates='treatments')
     appointment = db.relationship('Appointment', back_populates='treatments')
 
+    __table_args__ = (
+        db.Index('ix_treatment_record_appointment_id', 'appointment_id'),
+        db.Index('ix_treatment_record_patient_created', 'patient_id', 'created_at'),
+    )
+
+
+class DoctorSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    availability_id = db.Column(db.Integer, db.ForeignKey('doctor_availability.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start = db.Column(db.DateTime, nullable=False)
+    state = db.Column(db.String(10), nullable=False, default=SLOT_FREE)
+    appointment_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'start', 'availability_id', name='uq_doctor_slot_start'),
+        db.Index('ix_doctor_slot_doctor_date_state', 'doctor_id', 'date', 'state'),
+    )
+
+
+class StatCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Bumped whenever a doctor's availability, rules or appointments change; the slot API
+# uses it as the ETag so an unchanged calendar is answered without recomputing slots.
+class ScheduleVersion(db.Model):
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Daily reporting rollups, one row per doctor (and per specialization) per day, kept by
+# reports.py. `rescheduled` counts appointments moved at least once; the minute columns
+# give utilization as booked_minutes / available_minutes, where booked_minutes is the
+# number of appointments not cancelled times SLOT_MINUTES (an appointment is one slot).
+class DoctorDailyStats(db.Model):
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    rescheduled = db.Column(db.Integer, nullable=False, default=0)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+    available_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_doctor_daily_stats_day', 'day'),)
+
+
+class SpecializationDailyStats(db.Model):
+    specialization = db.Column(db.String(120), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    rescheduled = db.Column(db.Integer, nullable=False, default=0)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+    available_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_specialization_daily_stats_day', 'day'),)
+
+
+# Completed and cancelled appointments older than ARCHIVE_AFTER_DAYS, moved here with
+# their treatment records by archive.py. Same columns and ids as the hot tables, so the
+# history views can page through both as one list.
+class ArchivedAppointment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    appointment_datetime = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    reschedule_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    treatments = db.relationship('ArchivedTreatmentRecord', backref='appointment', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_archived_appointment_patient_datetime', 'patient_id', 'appointment_datetime'),
+        db.Index('ix_archived_appointment_doctor_datetime', 'doctor_id', 'appointment_datetime'),
+    )
+
+
+class ArchivedTreatmentRecord(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('archived_appointment.id'), nullable=True)
+    diagnosis = db.deferred(db.Column(db.Text), group='body')
+    prescriptions = db.deferred(db.Column(db.Text), group='body')
+    notes = db.deferred(db.Column(CompressedText), group='body')
+    created_at = db.Column(db.DateTime)
+    diagnosis_preview = db.column_property(func.substr(diagnosis.columns[0], 1, DIAGNOSIS_PREVIEW_LENGTH))
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_archived_treatment_record_appointment_id', 'appointment_id'),
+        db.Index('ix_archived_treatment_record_patient_created', 'patient_id', 'created_at'),
+    )
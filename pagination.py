@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from flask import current_app, request, url_for
+from sqlalchemy import func, tuple_
+
+# ------------------ CURSORS ------------------
+# A cursor is the sort key of the first/last row on a page, so fetching the next page is
+# an indexed range scan from that key rather than an OFFSET over every earlier row.
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, time):
+        return ['t', value.isoformat()]
+    return ['v', value]
+
+
+def _decode_value(tagged):
+    tag, value = tagged
+    if tag == 'dt':
+        return datetime.fromisoformat(value)
+    if tag == 'd':
+        return date.fromisoformat(value)
+    if tag == 't':
+        return time.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return values if len(values) == size else None
+
+
+def page_size():
+    default = current_app.config.get('PAGE_SIZE', 25)
+    requested = request.args.get('per_page', type=int) or default
+    return max(1, min(requested, current_app.config.get('MAX_PAGE_SIZE', 100)))
+
+
+# ------------------ PAGE ------------------
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _url(self, cursor_arg, cursor):
+        args = request.args.to_dict()
+        args.pop('after', None)
+        args.pop('before', None)
+        args[cursor_arg] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self._url('after', self.next_cursor) if self.has_next else None
+
+    @property
+    def prev_url(self):
+        return self._url('before', self.prev_cursor) if self.has_prev else None
+
+
+def _scan(query, order_columns, cursor, scan_descending, limit):
+    key = tuple_(*order_columns)
+    if cursor is not None:
+        bound = tuple_(*cursor)
+        query = query.filter(key < bound if scan_descending else key > bound)
+    ordering = [c.desc() if scan_descending else c.asc() for c in order_columns]
+    return query.order_by(*ordering).limit(limit).all()
+
+
+def _archive_reached(archive, order_columns, rows, cursor, forward, descending, per_page):
+    """Whether rows from the archive could land on this page (newest-first lists only)."""
+    if not descending:
+        return True
+    query, archive_columns = archive
+    newest = query.with_entities(func.max(archive_columns[0])).order_by(None).scalar()
+    if newest is None:
+        return False
+    first = order_columns[0].key
+    if forward:
+        # A full page of hot rows that are all newer than anything archived is complete.
+        return len(rows) <= per_page or getattr(rows[-1], first) <= newest
+    return cursor is None or cursor[0] <= newest
+
+
+def keyset_paginate(query, order_columns, descending=False, per_page=None, after=None, before=None,
+                    archive=None):
+    """Return a Page of `query` sorted by `order_columns`, which must end in a unique column.
+
+    `archive` is an optional (query, order_columns) pair over the archive tables; its rows
+    are merged into the same ordering, and it is only queried once paging reaches them.
+    """
+    per_page = per_page or page_size()
+    forward = not before
+    cursor = decode_cursor(after if forward else before, len(order_columns))
+
+    # Walking backwards reverses the scan direction; rows are flipped back afterwards.
+    scan_descending = descending if forward else not descending
+    rows = _scan(query, order_columns, cursor, scan_descending, per_page + 1)
+    if archive is not None and _archive_reached(archive, order_columns, rows, cursor, forward, descending, per_page):
+        rows += _scan(archive[0], archive[1], cursor, scan_descending, per_page + 1)
+        rows.sort(key=lambda row: [getattr(row, c.key) for c in order_columns], reverse=scan_descending)
+        rows = rows[:per_page + 1]
+
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if not forward:
+        items.reverse()
+
+    def key_of(item):
+        return encode_cursor([getattr(item, c.key) for c in order_columns])
+
+    has_next = more if forward else cursor is not None
+    has_prev = cursor is not None if forward else more
+    return Page(
+        items,
+        next_cursor=key_of(items[-1]) if has_next and items else None,
+        prev_cursor=key_of(items[0]) if has_prev and items else None,
+    )
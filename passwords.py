@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from extensions import bcrypt
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+# ------------------ HASHING POOL ------------------
+# bcrypt releases the GIL, so hashes run on a small per-process thread pool. The pool
+# size caps how many cores hashing can take from other requests, and the semaphore caps
+# how many hashes may wait for it; past that, callers get HashingBusy straight away
+# instead of piling up behind a login storm.
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def _get_pool():
+    global _pool, _pool_pid, _slots
+    # Recreated after fork so gunicorn workers never share a preloaded pool.
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                workers = current_app.config.get('HASH_WORKERS') or default_workers()
+                depth = current_app.config.get('HASH_QUEUE_DEPTH', 16)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+                _slots = threading.BoundedSemaphore(workers + depth)
+                _pool_pid = os.getpid()
+    return _pool, _slots
+
+
+def _run(fn, *args):
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy("Password hashing queue is full")
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: slots.release())
+    try:
+        return future.result(timeout=current_app.config.get('HASH_TIMEOUT', 30))
+    except FutureTimeout:
+        # Still queued: drop it so the slot frees up; a running hash finishes on its own.
+        future.cancel()
+        raise HashingBusy("Password hashing timed out") from None
+
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+
+def hash_password(password):
+    rounds = log_rounds()
+    return _run(bcrypt.generate_password_hash, password, rounds).decode('utf-8')
+
+
+def check_password(password_hash, password):
+    return _run(bcrypt.check_password_hash, password_hash, password)
+
+
+def hash_cost(password_hash):
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != log_rounds()
@@ -0,0 +1,167 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from time import time
+from flask import Response, current_app, request, session
+
+log = logging.getLogger(__name__)
+
+
+# ------------------ TOKEN BUCKETS ------------------
+# A bucket holds up to `capacity` tokens and refills at capacity/period per second; each
+# limited request takes one. take() returns 0 when a token was taken, otherwise the
+# seconds until one is available. Both stores keep (tokens, updated_at) per key.
+def _refill(tokens, updated_at, capacity, period, now):
+    return min(capacity, tokens + (now - updated_at) * capacity / period)
+
+
+def _take(tokens, capacity, period):
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) * period / capacity
+
+
+class MemoryBuckets:
+    """Per-process buckets. Each gunicorn worker enforces the full limit on its own, so with
+    N workers a client can get up to N times the configured rate; set RATE_LIMIT_STORAGE
+    to share the buckets between workers."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self.lock:
+            tokens, updated_at = self.entries.get(key, (capacity, now))
+            tokens, wait = _take(_refill(tokens, updated_at, capacity, period, now), capacity, period)
+            self.entries[key] = (tokens, now)
+            self.entries.move_to_end(key)
+            # Dropping the least recently used key only forgets a bucket, i.e. refills it.
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteBuckets:
+    """Buckets in a small SQLite file of their own, shared by every worker on the host."""
+
+    def __init__(self, path, busy_timeout_ms=200):
+        self.path = path
+        self.busy_timeout = busy_timeout_ms / 1000
+        self.local = threading.local()
+        self.takes = 0
+        with closing(self._connect()) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = OFF')
+        return connection
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self._connect()
+        return connection
+
+    def take(self, key, capacity, period, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated_at = row or (capacity, now)
+            tokens, wait = _take(_refill(tokens, updated_at, capacity, period, now), capacity, period)
+            connection.execute('INSERT OR REPLACE INTO rate_bucket (key, tokens, updated_at) VALUES (?, ?, ?)',
+                               (key, tokens, now))
+            self.takes += 1
+            if self.takes % 1000 == 0:
+                # Rows idle for a day are full buckets again; deleting them changes nothing.
+                connection.execute('DELETE FROM rate_bucket WHERE updated_at < ?', (now - 86400,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_bucket')
+
+
+# ------------------ LIMITER ------------------
+# RATE_LIMITS maps an endpoint to {scope: (capacity, period_seconds)}. The "ip" scope keys
+# on the client address, "user" on the logged-in user id, or on the submitted username
+# for login. Only POSTs are limited: that is where the bcrypt checks and the slot
+# queries run. The check happens in before_request, so a refused request never reaches
+# the form, bcrypt or the ORM.
+def client_ip():
+    # Behind N trusted proxies the client is the Nth address from the right of X-Forwarded-For.
+    hops = current_app.config.get('RATE_LIMIT_PROXY_HOPS', 0)
+    route = request.access_route
+    if hops and len(route) >= hops:
+        return route[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def _subject(scope):
+    if scope == 'ip':
+        return client_ip()
+    if request.endpoint == 'main.login':
+        return (request.form.get('username') or '').strip().lower() or None
+    return session.get('_user_id')
+
+
+class RateLimiter:
+    def __init__(self, limits, store):
+        self.limits = limits
+        self.store = store
+
+    def check(self):
+        """Seconds to wait when the current request is over a limit, else 0."""
+        limits = self.limits.get(request.endpoint)
+        if not limits or request.method != 'POST':
+            return 0
+        now = time()
+        wait = 0
+        for scope, (capacity, period) in limits.items():
+            subject = _subject(scope)
+            if subject is None:
+                continue
+            try:
+                wait = max(wait, self.store.take(f'{request.endpoint}:{scope}:{subject}', capacity, period, now))
+            except sqlite3.Error as e:
+                # A limiter that cannot reach its store lets requests through.
+                log.warning("rate limit store unavailable: %s", e)
+        return wait
+
+
+def _limit_request():
+    wait = current_app.extensions['hms_rate_limiter'].check()
+    if wait:
+        seconds = max(1, math.ceil(wait))
+        return Response(f"Too many requests. Try again in {seconds} seconds.\n", 429,
+                        {'Retry-After': str(seconds), 'Content-Type': 'text/plain; charset=utf-8'})
+
+
+def init_rate_limits(app):
+    if not app.config.get('RATE_LIMITS_ENABLED') or not app.config.get('RATE_LIMITS'):
+        return
+    path = app.config.get('RATE_LIMIT_STORAGE')
+    if path:
+        path = os.path.join(app.instance_path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store = SQLiteBuckets(path)
+    else:
+        store = MemoryBuckets(app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    app.extensions['hms_rate_limiter'] = RateLimiter(app.config['RATE_LIMITS'], store)
+    app.before_request(_limit_request)
@@ -0,0 +1,73 @@
+import sqlite3
+from contextlib import closing
+from time import time
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = '_primary_until'
+
+
+# ------------------ ROUTING SESSION ------------------
+# db.session sends a request's queries to the replica only when the view is marked
+# read_only, the method is safe and the user has not written recently; everything else,
+# including CLI commands and background jobs, uses the primary. The first flush or DML
+# statement in a request switches it to the primary for the rest of the request and
+# marks the user sticky, so the flush listeners and any read after a write stay there.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and 'hms_replica' in g:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.hms_replica = False
+                g.hms_wrote = True
+            elif g.hms_replica:
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view=None, unless=None):
+    """Mark a view as safe to serve from the replica; `unless()` returning true keeps a request on the primary."""
+    def mark(view):
+        view.replica_reads = unless or True
+        return view
+    return mark(view) if view is not None else mark
+
+
+# ------------------ READ-YOUR-WRITES ------------------
+# A user who wrote reads from the primary for REPLICA_STICKY_SECONDS afterwards, long
+# enough for the replica to catch up, so a booking shows on the dashboard it redirects
+# to. The deadline lives in the signed session cookie and so holds across workers.
+def _route_request():
+    g.hms_replica = False
+    g.hms_wrote = False
+    if request.method not in SAFE_METHODS or session.get(STICKY_KEY, 0) > time():
+        return
+    rule = getattr(current_app.view_functions.get(request.endpoint), 'replica_reads', None)
+    g.hms_replica = rule is True or (callable(rule) and not rule())
+
+
+def _mark_writer(response):
+    if g.get('hms_wrote'):
+        session[STICKY_KEY] = time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    return response
+
+
+def init_replica(app):
+    if not app.config.get('REPLICA_DATABASE_URI'):
+        return
+    app.before_request(_route_request)
+    app.after_request(_mark_writer)
+
+
+# ------------------ SQLITE REPLICA ------------------
+# Local stand-in for a streaming replica: a second SQLite file refreshed from the primary
+# with the online backup API, which copies a consistent snapshot while the app keeps
+# writing. The app opens it with PRAGMA query_only so a misrouted write fails loudly.
+def sync_sqlite_replica(primary, replica, pages=-1):
+    """Copy the primary SQLite database over the replica file (both engines)."""
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise RuntimeError("sync-replica only copies SQLite databases; use the server's replication otherwise")
+    with closing(sqlite3.connect(primary.url.database)) as source, \
+            closing(sqlite3.connect(replica.url.database)) as target:
+        source.backup(target, pages=pages)
@@ -0,0 +1,400 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import Date, and_, case, cast, event, func, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from extensions import db
+from models import (Appointment, ArchivedAppointment, AvailabilityException, AvailabilityRule, Doctor,
+                    DoctorAvailability, DoctorDailyStats, SpecializationDailyStats)
+import schedules
+import slots
+
+STAT_COLUMNS = ('appointments', 'booked', 'completed', 'cancelled', 'rescheduled',
+                'booked_minutes', 'available_minutes')
+BOOKED_STATUSES = ('Booked', 'Rescheduled')
+
+
+def rollups_enabled():
+    return has_app_context() and current_app.config.get('USE_ROLLUPS', False)
+
+
+def _slot_minutes():
+    return int(current_app.config.get('SLOT_MINUTES', slots.DEFAULT_SLOT_MINUTES))
+
+
+def _day_of(connection, column):
+    # SQLite keeps DATETIME as text, where CAST(... AS DATE) would yield the year.
+    if connection.dialect.name == 'sqlite':
+        return func.date(column, type_=Date)
+    return cast(column, Date)
+
+
+def _minutes(start_time, end_time):
+    return (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+
+
+# ------------------ DOCTOR-DAY AGGREGATES ------------------
+# Exact figures for the given doctors over [start, end], read from the source tables.
+# Returns {(doctor_id, day): {column: value}} with only non-empty days present.
+# Appointments carry no duration: every one occupies a single slot, so booked_minutes
+# is the number of appointments not cancelled times SLOT_MINUTES. After SLOT_MINUTES
+# changes, past days keep the old figure until backfill-rollups recomputes them.
+def compute_doctor_days(connection, doctor_ids, start, end):
+    doctor_ids = list(doctor_ids)
+    result = defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0))
+    if not doctor_ids:
+        return {}
+    range_start, range_end = slots.day_bounds(start, end)
+
+    slot_minutes = _slot_minutes()
+    # Archived appointments are history like any other; an archived day adds up the same.
+    for model in (Appointment, ArchivedAppointment):
+        day = _day_of(connection, model.appointment_datetime)
+        rows = connection.execute(
+            select(
+                model.doctor_id, day, func.count(),
+                func.sum(case((model.status.in_(BOOKED_STATUSES), 1), else_=0)),
+                func.sum(case((model.status == 'Completed', 1), else_=0)),
+                func.sum(case((model.status == 'Cancelled', 1), else_=0)),
+                func.sum(case((model.reschedule_count > 0, 1), else_=0)),
+            ).where(
+                model.doctor_id.in_(doctor_ids),
+                model.appointment_datetime >= range_start,
+                model.appointment_datetime < range_end
+            ).group_by(model.doctor_id, day)
+        )
+        for doctor_id, row_day, total, booked, completed, cancelled, rescheduled in rows:
+            stats = result[(doctor_id, row_day)]
+            for column, value in (('appointments', total), ('booked', booked), ('completed', completed),
+                                  ('cancelled', cancelled), ('rescheduled', rescheduled),
+                                  ('booked_minutes', (total - cancelled) * slot_minutes)):
+                stats[column] += value
+
+    for doctor_id, row_day, start_time, end_time in connection.execute(
+        select(DoctorAvailability.doctor_id, DoctorAvailability.date,
+               DoctorAvailability.start_time, DoctorAvailability.end_time).where(
+            DoctorAvailability.doctor_id.in_(doctor_ids),
+            DoctorAvailability.date >= start,
+            DoctorAvailability.date <= end
+        )
+    ):
+        result[(doctor_id, row_day)]['available_minutes'] += _minutes(start_time, end_time)
+
+    rules = connection.execute(
+        select(AvailabilityRule.id, AvailabilityRule.doctor_id, AvailabilityRule.weekdays,
+               AvailabilityRule.start_time, AvailabilityRule.end_time,
+               AvailabilityRule.valid_from, AvailabilityRule.valid_until).where(
+            AvailabilityRule.doctor_id.in_(doctor_ids),
+            AvailabilityRule.valid_from <= end,
+            (AvailabilityRule.valid_until.is_(None)) | (AvailabilityRule.valid_until >= start)
+        )
+    ).all()
+    if rules:
+        skipped = set(connection.execute(
+            select(AvailabilityException.rule_id, AvailabilityException.date).where(
+                AvailabilityException.rule_id.in_([r.id for r in rules]),
+                AvailabilityException.date >= start,
+                AvailabilityException.date <= end
+            )
+        ).all())
+        for rule in rules:
+            minutes = _minutes(rule.start_time, rule.end_time)
+            row_day = max(start, rule.valid_from)
+            last = min(end, rule.valid_until or end)
+            while row_day <= last:
+                if rule.weekdays & (1 << row_day.weekday()) and (rule.id, row_day) not in skipped:
+                    result[(rule.doctor_id, row_day)]['available_minutes'] += minutes
+                row_day += timedelta(days=1)
+    return dict(result)
+
+
+# ------------------ WRITING ROLLUPS ------------------
+def _upsert(connection, model, rows, keys, increment):
+    """Insert `rows`, or on a key clash overwrite (or add to, with `increment`) the stats."""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        statement = insert(table).values(rows)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(index_elements=keys, set_={
+            c: (table.c[c] + excluded[c]) if increment else excluded[c] for c in STAT_COLUMNS
+        })
+        connection.execute(statement)
+        return
+    for row in rows:
+        where = and_(*(table.c[k] == row[k] for k in keys))
+        values = {c: (table.c[c] + row[c]) if increment else row[c] for c in STAT_COLUMNS}
+        if not connection.execute(update(table).where(where).values(**values)).rowcount:
+            connection.execute(table.insert().values(**row))
+
+
+def _doctor_specializations(connection, doctor_ids):
+    return dict(connection.execute(
+        select(Doctor.id, Doctor.specialization).where(Doctor.id.in_(doctor_ids))
+    ).all())
+
+
+def _stored_doctor_days(connection, doctor_ids, start=None, end=None):
+    query = select(DoctorDailyStats).where(DoctorDailyStats.doctor_id.in_(doctor_ids))
+    if start is not None:
+        query = query.where(DoctorDailyStats.day >= start, DoctorDailyStats.day <= end)
+    return {(row.doctor_id, row.day): {c: getattr(row, c) for c in STAT_COLUMNS}
+            for row in connection.execute(query)}
+
+
+def _add_specialization_deltas(connection, deltas):
+    rows = [dict(specialization=spec, day=day, **stats)
+            for (spec, day), stats in sorted(deltas.items()) if any(stats.values())]
+    _upsert(connection, SpecializationDailyStats, rows, ['specialization', 'day'], increment=True)
+
+
+def refresh_doctor_days(connection, doctor_id, start, end):
+    """Recompute one doctor's rows over [start, end] and shift the specialization totals by the difference."""
+    fresh = compute_doctor_days(connection, [doctor_id], start, end)
+    stored = _stored_doctor_days(connection, [doctor_id], start, end)
+    specialization = _doctor_specializations(connection, [doctor_id]).get(doctor_id)
+    if specialization is None:
+        return
+
+    deltas = {}
+    for key in set(fresh) | set(stored):
+        new = fresh.get(key) or dict.fromkeys(STAT_COLUMNS, 0)
+        old = stored.get(key) or dict.fromkeys(STAT_COLUMNS, 0)
+        if new != old:
+            deltas[(specialization, key[1])] = {c: new[c] - old[c] for c in STAT_COLUMNS}
+
+    gone = [key[1] for key in stored if key not in fresh]
+    if gone:
+        connection.execute(DoctorDailyStats.__table__.delete().where(
+            DoctorDailyStats.doctor_id == doctor_id, DoctorDailyStats.day.in_(gone)
+        ))
+    _upsert(connection, DoctorDailyStats,
+            [dict(doctor_id=doctor_id, day=day, **stats) for (_, day), stats in sorted(fresh.items())
+             if stats != stored.get((doctor_id, day))],
+            ['doctor_id', 'day'], increment=False)
+    _add_specialization_deltas(connection, deltas)
+
+
+def move_doctor(connection, doctor_id, old_specialization, new_specialization=None):
+    """Take a doctor's rows out of one specialization's totals and, if given, into another's."""
+    stored = _stored_doctor_days(connection, [doctor_id])
+    deltas = {}
+    for (_, day), stats in stored.items():
+        deltas[(old_specialization, day)] = {c: -v for c, v in stats.items()}
+        if new_specialization is not None:
+            deltas[(new_specialization, day)] = dict(stats)
+    _add_specialization_deltas(connection, deltas)
+    if new_specialization is None:
+        connection.execute(DoctorDailyStats.__table__.delete().where(DoctorDailyStats.doctor_id == doctor_id))
+
+
+# ------------------ INCREMENTAL UPDATES ------------------
+# Bookings, status changes, reschedules and availability edits mark the doctor-days
+# they touch; after the flush those days are recomputed from the source rows and the
+# specialization rows are shifted by the difference. Doctor rows are safe to overwrite
+# because schedules.bump_touched_schedules has already taken the doctor's
+# schedule_version row lock in this transaction; specialization rows are shared
+# between doctors, so they only ever receive increments.
+def _touched_days(session):
+    days, ranges, exception_days = defaultdict(set), defaultdict(list), defaultdict(set)
+    horizon = date.today() + timedelta(days=slots.RULE_HORIZON_DAYS)
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        attrs = inspect(obj).attrs
+        if isinstance(obj, Appointment):
+            times = [obj.appointment_datetime] + list(attrs.appointment_datetime.history.deleted)
+            for doctor_id in [obj.doctor_id] + list(attrs.doctor_id.history.deleted):
+                days[doctor_id].update(dt.date() for dt in times if dt is not None)
+        elif isinstance(obj, DoctorAvailability):
+            dates = [obj.date] + list(attrs.date.history.deleted)
+            for doctor_id in [obj.doctor_id] + list(attrs.doctor_id.history.deleted):
+                days[doctor_id].update(d for d in dates if d is not None)
+        elif isinstance(obj, AvailabilityRule):
+            untils = [obj.valid_until] + list(attrs.valid_until.history.deleted)
+            end = horizon if None in untils else max(untils)
+            ranges[obj.doctor_id].append((min([obj.valid_from] + list(attrs.valid_from.history.deleted)), end))
+        elif isinstance(obj, AvailabilityException):
+            exception_days[obj.rule_id].add(obj.date)
+    return days, ranges, exception_days
+
+
+# Runs before the flush, while a deleted doctor's rows still exist (PostgreSQL would
+# cascade them away with the doctor) and while a changed specialization is still known.
+def move_doctor_rollups(session, flush_context, instances):
+    if not rollups_enabled():
+        return
+    for obj in chain(session.dirty, session.deleted):
+        if not isinstance(obj, Doctor) or obj.id is None:
+            continue
+        history = inspect(obj).attrs.specialization.history
+        old = history.deleted[0] if history.deleted else obj.specialization
+        if obj in session.deleted:
+            move_doctor(session.connection(), obj.id, old)
+        elif history.deleted and old != obj.specialization:
+            move_doctor(session.connection(), obj.id, old, obj.specialization)
+
+
+def update_rollups(session, flush_context):
+    if not rollups_enabled():
+        return
+    days, ranges, exception_days = _touched_days(session)
+    if not (days or ranges or exception_days):
+        return
+    connection = session.connection()
+
+    if exception_days:
+        for rule_id, doctor_id in connection.execute(
+            select(AvailabilityRule.id, AvailabilityRule.doctor_id).where(AvailabilityRule.id.in_(exception_days))
+        ):
+            days[doctor_id].update(exception_days[rule_id])
+
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Doctor)}
+    for doctor_id in sorted((set(days) | set(ranges)) - deleted - {None}):
+        spans = list(ranges.get(doctor_id, []))
+        # Single days are refreshed one by one; only rule edits need long ranges.
+        spans.extend((d, d) for d in sorted(days.get(doctor_id, ())) if not any(s <= d <= e for s, e in spans))
+        for start, end in spans:
+            refresh_doctor_days(connection, doctor_id, start, end)
+
+
+# SQLAlchemy runs listeners for an event in the order they were added; the schedule
+# version bump is registered first (a no-op if create_app already did) so update_rollups
+# always finds the schedule_version lock taken, as the comment above relies on.
+def init_rollups(app):
+    schedules.init_schedule_versions(app)
+    for name, listener in (('before_flush', move_doctor_rollups), ('after_flush', update_rollups)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+# ------------------ BACKFILL ------------------
+# The nightly job (`flask backfill-rollups`) and the path for bulk Core writes, which
+# skip the flush hook. Rebuilds both tables exactly over [start, end].
+def data_range(connection):
+    appointment_spans = [connection.execute(
+        select(func.min(model.appointment_datetime), func.max(model.appointment_datetime))
+    ).one() for model in (Appointment, ArchivedAppointment)]
+    first_avail, last_avail = connection.execute(
+        select(func.min(DoctorAvailability.date), func.max(DoctorAvailability.date))
+    ).one()
+    # Open-ended weekly rules are counted up to the same horizon slots.py expands them to.
+    first_rule, last_rule, open_ended = connection.execute(
+        select(func.min(AvailabilityRule.valid_from), func.max(AvailabilityRule.valid_until),
+               func.count().filter(AvailabilityRule.valid_until.is_(None)))
+    ).one()
+    starts = [d for d in [first.date() for first, _ in appointment_spans if first] + [first_avail, first_rule] if d]
+    ends = [d for d in [last.date() for _, last in appointment_spans if last] + [last_avail, last_rule] if d]
+    if open_ended:
+        ends.append(date.today() + timedelta(days=slots.RULE_HORIZON_DAYS))
+    if not starts:
+        return None, None
+    return min(starts), max(ends)
+
+
+def backfill(connection, start=None, end=None, batch_size=200):
+    """Rebuild the rollups over [start, end] (default: all data). Returns the number of doctor-day rows."""
+    doctor_table = DoctorDailyStats.__table__
+    spec_table = SpecializationDailyStats.__table__
+    if start is None and end is None:
+        # A full rebuild also drops rows left outside the current data range.
+        connection.execute(doctor_table.delete())
+        connection.execute(spec_table.delete())
+    if start is None or end is None:
+        first, last = data_range(connection)
+        start, end = start or first, end or last
+    if start is None:
+        return 0
+    connection.execute(doctor_table.delete().where(doctor_table.c.day.between(start, end)))
+    connection.execute(spec_table.delete().where(spec_table.c.day.between(start, end)))
+
+    written = 0
+    doctor_ids = list(connection.execute(select(Doctor.id).order_by(Doctor.id)).scalars())
+    for i in range(0, len(doctor_ids), batch_size):
+        fresh = compute_doctor_days(connection, doctor_ids[i:i + batch_size], start, end)
+        rows = [dict(doctor_id=doctor_id, day=day, **stats) for (doctor_id, day), stats in sorted(fresh.items())]
+        if rows:
+            connection.execute(doctor_table.insert(), rows)
+        written += len(rows)
+
+    sums = [func.sum(doctor_table.c[c]) for c in STAT_COLUMNS]
+    rows = [dict(zip(('specialization', 'day') + STAT_COLUMNS, row)) for row in connection.execute(
+        select(Doctor.specialization, doctor_table.c.day, *sums)
+        .join(Doctor, Doctor.id == doctor_table.c.doctor_id)
+        .where(doctor_table.c.day.between(start, end))
+        .group_by(Doctor.specialization, doctor_table.c.day)
+    )]
+    if rows:
+        connection.execute(spec_table.insert(), rows)
+    return written
+
+
+def create_rollups(connection):
+    # The backfill reads every appointment table the current models have (the archive
+    # included), so bring all of them into existence first, not just the rollups.
+    db.metadata.create_all(bind=connection, checkfirst=True)
+    backfill(connection)
+
+
+# ------------------ REPORTS ------------------
+# Everything below reads only the rollup tables (plus doctor names), so the cost
+# depends on the number of days in the range, not on the number of appointments.
+def _rates(stats):
+    total = stats['appointments']
+    return dict(
+        stats,
+        cancellation_rate=stats['cancelled'] / total if total else 0.0,
+        reschedule_rate=stats['rescheduled'] / total if total else 0.0,
+        utilization=stats['booked_minutes'] / stats['available_minutes'] if stats['available_minutes'] else None,
+    )
+
+
+def specialization_summary(start, end):
+    table = SpecializationDailyStats
+    rows = db.session.query(
+        table.specialization, *[func.sum(getattr(table, c)) for c in STAT_COLUMNS]
+    ).filter(table.day.between(start, end)).group_by(table.specialization).order_by(table.specialization)
+    return [_rates(dict(zip(('specialization',) + STAT_COLUMNS, row))) for row in rows]
+
+
+def volume_by_period(start, end, monthly=None):
+    """Appointment volume per day, or per month for ranges longer than two months."""
+    if monthly is None:
+        monthly = (end - start).days > 62
+    table = SpecializationDailyStats
+    rows = db.session.query(
+        table.day, *[func.sum(getattr(table, c)) for c in STAT_COLUMNS]
+    ).filter(table.day.between(start, end)).group_by(table.day).order_by(table.day)
+    periods = {}
+    for row in rows:
+        label = row[0].strftime('%Y-%m') if monthly else row[0].isoformat()
+        totals = periods.setdefault(label, dict.fromkeys(STAT_COLUMNS, 0))
+        for column, value in zip(STAT_COLUMNS, row[1:]):
+            totals[column] += value or 0
+    return [_rates(dict(period=label, **totals)) for label, totals in periods.items()]
+
+
+def doctor_utilization(start, end, limit=20):
+    table = DoctorDailyStats
+    booked = func.sum(table.booked_minutes)
+    available = func.sum(table.available_minutes)
+    rows = db.session.query(
+        Doctor.id, Doctor.name, Doctor.specialization, *[func.sum(getattr(table, c)) for c in STAT_COLUMNS]
+    ).join(Doctor, Doctor.id == table.doctor_id).filter(
+        table.day.between(start, end)
+    ).group_by(Doctor.id, Doctor.name, Doctor.specialization).having(available > 0).order_by(
+        (booked * 1.0 / available).desc(), Doctor.id
+    ).limit(limit)
+    return [_rates(dict(zip(('id', 'name', 'specialization') + STAT_COLUMNS, row))) for row in rows]
+
+
+def report_range(start=None, end=None, default_days=30):
+    end = end or datetime.now().date()
+    start = start or end - timedelta(days=default_days - 1)
+    return start, end
@@ -1,15 +1,11 @@
+# Superseded by the versioned migrations in migrations.py (`flask migrate`); kept so
+# existing deployment notes that run this script still bring the schema up to date.
 from app import create_app
-from extensions import db
-from sqlalchemy import text
+from migrations import upgrade
 
 app = create_app()
 
 with app.app_context():
-    try:
-        db.session.execute(
-            text('ALTER TABLE appointment ADD COLUMN reschedule_count INTEGER NOT NULL DEFAULT 0;')
-        )
-        db.session.commit()
-        print("Column 'reschedule_count' added successfully to Appointment table.")
-    except Exception as e:
-        print("Error:", e)
+    for version, name in upgrade():
+        print(f"Applied migration {version:04d} {name}")
+    print("Schema is up to date.")
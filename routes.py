@@ -1,9 +1,27 @@
-from datetime import datetime, timedelta
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import date, datetime, timedelta
+from flask import Blueprint, Response, abort, current_app, jsonify, render_template, redirect, stream_with_context, url_for, flash, request
 from flask_login import login_user, logout_user, current_user, login_required
-from models import DoctorAvailability, TreatmentRecord, User, Doctor, Patient, Appointment, ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT
-from extensions import db, bcrypt
-from forms import AvailabilityForm, LoginForm, PatientRegistrationForm, DoctorRegistrationForm, AppointmentForm, TreatmentForm
+from sqlalchemy import case, func
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from models import AvailabilityException, AvailabilityRule, DoctorAvailability, TreatmentRecord, User, Doctor, Patient, Appointment, ArchivedAppointment, ArchivedTreatmentRecord, ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT, DIAGNOSIS_PREVIEW_LENGTH
+from extensions import db
+from forms import AvailabilityForm, RecurringAvailabilityForm, RuleExceptionForm, LoginForm, PatientRegistrationForm, DoctorRegistrationForm, AppointmentForm, TreatmentForm
+import slots
+import metrics
+import counters
+import search
+import exports
+import reports
+import archive
+import booking
+from booking import RescheduleRefused, SlotTaken
+from pagination import keyset_paginate, page_size
+import passwords
+import user_cache
+import fragments
+import schedules
+from passwords import HashingBusy
+from replicas import read_only
 
 main = Blueprint('main', __name__)
 
@@ -20,7 +38,22 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and bcrypt.check_password_hash(user.password_hash, form.password.data):
+        try:
+            valid = user is not None and passwords.check_password(user.password_hash, form.password.data)
+        except HashingBusy:
+            flash("The server is busy right now. Please try again in a moment.", "warning")
+            return render_template('login.html', form=form), 503
+        if valid and user.is_blacklisted:
+            flash("This account has been blocked. Please contact the hospital.", "danger")
+            return render_template('login.html', form=form), 403
+        if valid:
+            # Upgrade hashes made with an older BCRYPT_LOG_ROUNDS while we hold the plaintext.
+            if passwords.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = passwords.hash_password(form.password.data)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             login_user(user)
             flash("Login successful!", "success")
             if user.role == ROLE_ADMIN:
@@ -64,7 +97,11 @@ def dashboard_redirect():
 def register_patient():
     form = PatientRegistrationForm()
     if form.validate_on_submit():
-        hashed = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+        try:
+            hashed = passwords.hash_password(form.password.data)
+        except HashingBusy:
+            flash("The server is busy right now. Please try again in a moment.", "warning")
+            return render_template('register_patient.html', form=form), 503
         user = User(username=form.username.data,
                     password_hash=hashed,
                     role=ROLE_PATIENT)
@@ -81,6 +118,7 @@ def register_patient():
 # ------------------ ADMIN DASHBOARD ------------------
 @main.route('/admin_dashboard')
 @login_required
+@read_only
 def admin_dashboard():
     if current_user.role != ROLE_ADMIN:
         return redirect(url_for('main.index'))
@@ -88,38 +126,41 @@ def admin_dashboard():
     active_tab = request.args.get('tab', 'doctors')
     search_query = request.args.get('query', '').strip()
 
+    counts = counters.get_counters()
     doctors, patients, appointments = [], [], []
+    page = None
     add_doctor_form = None  
+    after, before = request.args.get('after'), request.args.get('before')
 
     if active_tab == 'doctors':
-        query = Doctor.query.join(User, Doctor.user_id == User.id)
+        query = Doctor.query.join(Doctor.user).options(contains_eager(Doctor.user))
         if search_query:
-            query = query.filter(
-                (Doctor.name.ilike(f"%{search_query}%")) |
-                (Doctor.specialization.ilike(f"%{search_query}%")) |
-                (User.username.ilike(f"%{search_query}%"))
-            )
-        doctors = query.all()
+            query = search.filter_doctors(query, search_query, ranked=False)
+        page = keyset_paginate(query, [Doctor.id], after=after, before=before)
+        doctors = page.items
         add_doctor_form = DoctorRegistrationForm()  
 
     elif active_tab == 'patients':
-        query = Patient.query.join(User, Patient.user_id == User.id)
+        query = Patient.query.join(Patient.user).options(contains_eager(Patient.user))
         if search_query:
-            query = query.filter(
-                (Patient.name.ilike(f"%{search_query}%")) |
-                (User.username.ilike(f"%{search_query}%")) |
-                (Patient.contact.ilike(f"%{search_query}%"))
-            )
-        patients = query.all()
+            query = search.filter_patients(query, search_query, ranked=False)
+        page = keyset_paginate(query, [Patient.id], after=after, before=before)
+        patients = page.items
 
     elif active_tab == 'appointments':
-        query = Appointment.query.join(Appointment.patient).join(Appointment.doctor)
+        query = Appointment.query.join(Appointment.patient).join(Appointment.doctor).options(
+            contains_eager(Appointment.patient), contains_eager(Appointment.doctor)
+        )
+        archived = ArchivedAppointment.query.join(ArchivedAppointment.patient).join(ArchivedAppointment.doctor).options(
+            contains_eager(ArchivedAppointment.patient), contains_eager(ArchivedAppointment.doctor)
+        )
         if search_query:
-            query = query.filter(
-                (Patient.name.ilike(f"%{search_query}%")) |
-                (Doctor.name.ilike(f"%{search_query}%"))
-            )
-        appointments = query.all()
+            query = search.filter_appointments(query, search_query)
+            archived = search.filter_appointments(archived, search_query, ArchivedAppointment)
+        page = keyset_paginate(query, [Appointment.appointment_datetime, Appointment.id],
+                               descending=True, after=after, before=before,
+                               archive=(archived, [ArchivedAppointment.appointment_datetime, ArchivedAppointment.id]))
+        appointments = page.items
 
     return render_template(
         'dashboards/admin_dashboard.html',
@@ -128,9 +169,11 @@ def admin_dashboard():
         doctors=doctors,
         patients=patients,
         appointments=appointments,
-        total_doctors=Doctor.query.count(),
-        total_patients=Patient.query.count(),
-        total_appointments=Appointment.query.count(),
+        page=page,
+        counts=counts,
+        total_doctors=counts['doctors'],
+        total_patients=counts['patients'],
+        total_appointments=counts['appointments'],
         add_doctor_form=add_doctor_form 
     )
 
@@ -150,7 +193,11 @@ def add_doctor():
             flash("Username already taken.", "danger")
             return redirect(url_for('main.admin_dashboard'))
 
-        hashed = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+        try:
+            hashed = passwords.hash_password(form.password.data)
+        except HashingBusy:
+            flash("The server is busy right now. Please try again in a moment.", "warning")
+            return render_template("forms/add_doctor.html", form=form, edit=False), 503
         user = User(username=form.username.data, password_hash=hashed, role=ROLE_DOCTOR)
         db.session.add(user)
         db.session.flush()
@@ -171,7 +218,7 @@ def edit_doctor(doctor_id):
     if current_user.role != ROLE_ADMIN:
         return redirect(url_for('main.index'))
 
-    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor = Doctor.query.options(joinedload(Doctor.user)).get_or_404(doctor_id)
 
     form = DoctorRegistrationForm()
 
@@ -186,9 +233,15 @@ def edit_doctor(doctor_id):
         doctor.user.username = form.username.data
 
         if form.password.data:
-            doctor.user.password_hash = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+            try:
+                doctor.user.password_hash = passwords.hash_password(form.password.data)
+            except HashingBusy:
+                db.session.rollback()
+                flash("The server is busy right now. Please try again in a moment.", "warning")
+                return render_template("forms/add_doctor.html", form=form, edit=True, doctor_id=doctor_id), 503
 
         db.session.commit()
+        user_cache.invalidate(doctor.user_id)
         flash("Doctor updated successfully!", "success")
         return redirect(url_for('main.admin_dashboard'))
 
@@ -202,12 +255,20 @@ def delete_doctor(doctor_id):
     if current_user.role != ROLE_ADMIN:
         return redirect(url_for('main.index'))
 
-    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor = Doctor.query.options(
+        joinedload(Doctor.user),
+        selectinload(Doctor.availabilities),
+        selectinload(Doctor.treatments),
+        selectinload(Doctor.appointments).selectinload(Appointment.treatments),
+        selectinload(Doctor.archived_treatments),
+        selectinload(Doctor.archived_appointments).selectinload(ArchivedAppointment.treatments)
+    ).get_or_404(doctor_id)
     user = doctor.user
     db.session.delete(doctor)
     if user:
         db.session.delete(user)
     db.session.commit()
+    user_cache.invalidate(doctor.user_id)
     flash("Doctor deleted successfully.", "success")
     return redirect(url_for('main.admin_dashboard'))
 
@@ -219,9 +280,10 @@ def blacklist_doctor(doctor_id):
     if current_user.role != ROLE_ADMIN:
         return redirect(url_for('main.index'))
 
-    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor = Doctor.query.options(joinedload(Doctor.user)).get_or_404(doctor_id)
     doctor.user.is_blacklisted = not doctor.user.is_blacklisted
     db.session.commit()
+    user_cache.invalidate(doctor.user_id)
     status = "blacklisted" if doctor.user.is_blacklisted else "unblocked"
     flash(f"Doctor {status} successfully.", "info")
     return redirect(url_for('main.admin_dashboard'))
@@ -230,34 +292,33 @@ def blacklist_doctor(doctor_id):
 # ------------------ ADMIN SEARCH ------------------
 @main.route('/admin/search')
 @login_required
+@read_only
 def admin_search():
     if current_user.role != ROLE_ADMIN:
         return redirect(url_for('main.index'))
 
     query = request.args.get('query', '').strip()
+    counts = counters.get_counters()
     doctors, patients = [], []
 
     if query:
         # Search doctors
-        doctors = Doctor.query.join(User, Doctor.user_id == User.id).filter(
-            (Doctor.name.ilike(f"%{query}%")) |
-            (Doctor.specialization.ilike(f"%{query}%")) |
-            (User.username.ilike(f"%{query}%"))
-        ).all()
+        doctors = search.filter_doctors(
+            Doctor.query.join(Doctor.user).options(contains_eager(Doctor.user)), query
+        ).limit(page_size()).all()
 
         # Search patients
-        patients = Patient.query.join(User, Patient.user_id == User.id).filter(
-            (Patient.name.ilike(f"%{query}%")) |
-            (User.username.ilike(f"%{query}%")) |
-            (Patient.contact.ilike(f"%{query}%"))
-        ).all()
+        patients = search.filter_patients(
+            Patient.query.join(Patient.user).options(contains_eager(Patient.user)), query
+        ).limit(page_size()).all()
 
     add_doctor_form = DoctorRegistrationForm() 
 
     return render_template('dashboards/admin_dashboard.html',
-                           total_doctors=Doctor.query.count(),
-                           total_patients=Patient.query.count(),
-                           total_appointments=Appointment.query.count(),
+                           counts=counts,
+                           total_doctors=counts['doctors'],
+                           total_patients=counts['patients'],
+                           total_appointments=counts['appointments'],
                            doctors=doctors,
                            patients=patients,
                            search_query=query,
@@ -265,33 +326,132 @@ def admin_search():
 
 
 
+# ------------------ ADMIN METRICS ------------------
+@main.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if current_user.role != ROLE_ADMIN:
+        return redirect(url_for('main.index'))
+
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
+
+
+# ------------------ ADMIN EXPORT ------------------
+@main.route('/admin/export/<dataset>')
+@login_required
+@read_only
+def admin_export(dataset):
+    if current_user.role != ROLE_ADMIN:
+        return redirect(url_for('main.index'))
+    if dataset not in exports.DATASETS:
+        abort(404)
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        abort(400, f"Unknown format '{fmt}'")
+    try:
+        filters = exports.parse_filters(
+            request.args.get('from'), request.args.get('to'),
+            request.args.get('doctor_id'), request.args.get('status'),
+        )
+    except exports.ExportFilterError as e:
+        abort(400, str(e))
+    gzip = request.args.get('gzip') == '1'
+
+    body = exports.export_chunks(dataset, fmt, gzip=gzip, **filters)
+    response = Response(stream_with_context(body), mimetype=exports.MIMETYPES[fmt])
+    if gzip:
+        response.mimetype = 'application/gzip'
+    filename = exports.export_filename(dataset, fmt, gzip)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+
+# ------------------ ADMIN REPORTS ------------------
+# Reads only the daily rollup tables, so a year-long range costs about as much as a week.
+@main.route('/admin/reports')
+@login_required
+@read_only
+def admin_reports():
+    if current_user.role != ROLE_ADMIN:
+        return redirect(url_for('main.index'))
+    # Malformed dates fall back to the default range (the last 30 days).
+    start, end = reports.report_range(
+        request.args.get('from', type=date.fromisoformat), request.args.get('to', type=date.fromisoformat)
+    )
+    if end < start:
+        start, end = end, start
+
+    return render_template(
+        'dashboards/admin_reports.html',
+        start=start,
+        end=end,
+        specializations=reports.specialization_summary(start, end),
+        volume=reports.volume_by_period(start, end),
+        monthly=(end - start).days > 62,
+        doctors=reports.doctor_utilization(start, end)
+    )
+
+
 # ------------------ DOCTOR DASHBOARD ------------------
 @main.route('/doctor_dashboard')
 @login_required
+@read_only
 def doctor_dashboard():
     if current_user.role != ROLE_DOCTOR:
         return redirect(url_for('main.index'))
 
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor_id = current_user.profile_id
+    today = datetime.now().date()
 
     availability_form = AvailabilityForm()
-    treatment_form = TreatmentForm() 
+    rule_form = RecurringAvailabilityForm()
+    exception_form = RuleExceptionForm()
+    treatment_form = TreatmentForm()
+
+    # The availability and weekly schedule tables only change with the doctor's
+    # schedule version (and the date, for the skipped-dates column).
+    def schedule_context():
+        return {
+            'availabilities': DoctorAvailability.query.filter_by(doctor_id=doctor_id).all(),
+            'rules': AvailabilityRule.query.options(selectinload(AvailabilityRule.exceptions))
+                     .filter_by(doctor_id=doctor_id).all(),
+            'exception_form': exception_form,
+            'today': today,
+        }
+    schedule_html = fragments.render_fragment(
+        'dashboards/doctor_schedule.html', doctor_id,
+        (schedules.get_version(doctor_id), today), schedule_context
+    )
 
-    upcoming = Appointment.query.filter_by(
-        doctor_id=doctor.id, status="Booked"
+    upcoming = Appointment.query.options(joinedload(Appointment.patient)).filter_by(
+        doctor_id=doctor_id, status="Booked"
     ).all()
 
-    patients = [appt.patient for appt in Appointment.query.filter_by(
-        doctor_id=doctor.id
-    ).all()]
+    # One row per patient seen by this doctor, with their last completed visit.
+    visits = archive.appointment_history(lambda model: model.doctor_id == doctor_id)
+    roster = db.session.query(
+        Patient.id, Patient.name,
+        func.max(case((visits.c.status == "Completed", visits.c.appointment_datetime))).label('last_visit')
+    ).join(visits, visits.c.patient_id == Patient.id).group_by(Patient.id, Patient.name)
+    page = keyset_paginate(
+        roster, [Patient.name, Patient.id],
+        after=request.args.get('after'), before=request.args.get('before')
+    )
+    patients = page.items
 
     return render_template(
         'dashboards/doctor_dashboard.html',
-        doctor=doctor,
+        schedule_html=schedule_html,
         availability_form=availability_form,
-        treatment_form=treatment_form,  
+        rule_form=rule_form,
+        treatment_form=treatment_form,
         upcoming=upcoming,
-        patients=patients
+        patients=patients,
+        page=page
     )
 
 
@@ -303,22 +463,24 @@ def doctor_add_availability():
     if current_user.role != ROLE_DOCTOR:
         return redirect(url_for('main.index'))
 
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor_id = current_user.profile_id
     form = AvailabilityForm()
 
     if form.validate_on_submit():
         conflict = DoctorAvailability.query.filter(
-            DoctorAvailability.doctor_id == doctor.id,
+            DoctorAvailability.doctor_id == doctor_id,
             DoctorAvailability.date == form.date.data,
             DoctorAvailability.start_time <= form.end_time.data,
             DoctorAvailability.end_time >= form.start_time.data
-        ).first()
+        ).first() or slots.overlapping_rule_window(
+            doctor_id, form.date.data, form.start_time.data, form.end_time.data
+        )
 
         if conflict:
             flash("This time range overlaps with an existing availability!", "danger")
         else:
             slot = DoctorAvailability(
-                doctor_id=doctor.id,
+                doctor_id=doctor_id,
                 date=form.date.data,
                 start_time=form.start_time.data,
                 end_time=form.end_time.data
@@ -338,9 +500,9 @@ def delete_availability(slot_id):
         return redirect(url_for('main.index'))
 
     slot = DoctorAvailability.query.get_or_404(slot_id)
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor_id = current_user.profile_id
 
-    if slot.doctor_id != doctor.id:
+    if slot.doctor_id != doctor_id:
         flash("You cannot delete this slot.", "danger")
         return redirect(url_for('main.doctor_dashboard'))
 
@@ -351,6 +513,84 @@ def delete_availability(slot_id):
     return redirect(url_for('main.doctor_dashboard'))
 
 
+# ------------------ WEEKLY SCHEDULE ------------------
+@main.route('/doctor/add_rule', methods=['POST'])
+@login_required
+def doctor_add_rule():
+    if current_user.role != ROLE_DOCTOR:
+        return redirect(url_for('main.index'))
+
+    doctor_id = current_user.profile_id
+    form = RecurringAvailabilityForm()
+
+    if form.validate_on_submit():
+        weekdays = sum(1 << day for day in form.weekdays.data)
+        conflict = slots.rule_conflict(
+            doctor_id, weekdays, form.start_time.data, form.end_time.data,
+            form.valid_from.data, form.valid_until.data
+        )
+        if conflict:
+            flash("This schedule overlaps with an existing availability!", "danger")
+        else:
+            db.session.add(AvailabilityRule(
+                doctor_id=doctor_id,
+                weekdays=weekdays,
+                start_time=form.start_time.data,
+                end_time=form.end_time.data,
+                valid_from=form.valid_from.data,
+                valid_until=form.valid_until.data
+            ))
+            db.session.commit()
+            flash("Weekly schedule added!", "success")
+    else:
+        for errors in form.errors.values():
+            flash(errors[0], "danger")
+
+    return redirect(url_for('main.doctor_dashboard'))
+
+
+@main.route('/doctor/rule/<int:rule_id>/skip', methods=['POST'])
+@login_required
+def doctor_skip_rule_date(rule_id):
+    if current_user.role != ROLE_DOCTOR:
+        return redirect(url_for('main.index'))
+
+    rule = AvailabilityRule.query.get_or_404(rule_id)
+    doctor_id = current_user.profile_id
+    if rule.doctor_id != doctor_id:
+        flash("You cannot change this schedule.", "danger")
+        return redirect(url_for('main.doctor_dashboard'))
+
+    form = RuleExceptionForm()
+    if form.validate_on_submit():
+        exists = AvailabilityException.query.filter_by(rule_id=rule.id, date=form.date.data).first()
+        if not exists:
+            db.session.add(AvailabilityException(rule_id=rule.id, date=form.date.data))
+            db.session.commit()
+        flash(f"{form.date.data} removed from the weekly schedule.", "success")
+
+    return redirect(url_for('main.doctor_dashboard'))
+
+
+@main.route('/doctor/rule/delete/<int:rule_id>', methods=['POST'])
+@login_required
+def delete_availability_rule(rule_id):
+    if current_user.role != ROLE_DOCTOR:
+        return redirect(url_for('main.index'))
+
+    rule = AvailabilityRule.query.get_or_404(rule_id)
+    doctor_id = current_user.profile_id
+    if rule.doctor_id != doctor_id:
+        flash("You cannot delete this schedule.", "danger")
+        return redirect(url_for('main.doctor_dashboard'))
+
+    db.session.delete(rule)
+    db.session.commit()
+    flash("Weekly schedule removed.", "success")
+
+    return redirect(url_for('main.doctor_dashboard'))
+
+
 
 # ------------------ UPDATE APPOINTMENT STATUS ------------------
 @main.route('/doctor/appointment/<int:appt_id>/status', methods=['POST'])
@@ -383,8 +623,8 @@ def add_treatment(appt_id):
 
     if form.validate_on_submit():
         treatment = TreatmentRecord(
-            patient_id=appt.patient.id,
-            doctor_id=appt.doctor.id,
+            patient_id=appt.patient_id,
+            doctor_id=appt.doctor_id,
             appointment_id=appt.id,
             diagnosis=form.diagnosis.data,
             prescriptions=form.prescriptions.data,
@@ -403,36 +643,75 @@ def add_treatment(appt_id):
 # ------------------ VIEW PATIENT HISTORY ------------------
 @main.route('/doctor/patient/<int:patient_id>/history')
 @login_required
+@read_only
 def patient_history(patient_id):
     if current_user.role != ROLE_DOCTOR:
         return redirect(url_for('main.index'))
 
     patient = Patient.query.get_or_404(patient_id)
-    treatments = patient.treatments  
+    page = keyset_paginate(
+        TreatmentRecord.query.options(joinedload(TreatmentRecord.doctor)).filter_by(patient_id=patient.id),
+        [TreatmentRecord.created_at, TreatmentRecord.id], descending=True,
+        after=request.args.get('after'), before=request.args.get('before'),
+        archive=(
+            ArchivedTreatmentRecord.query.options(joinedload(ArchivedTreatmentRecord.doctor))
+            .filter_by(patient_id=patient.id),
+            [ArchivedTreatmentRecord.created_at, ArchivedTreatmentRecord.id]
+        )
+    )
+
+    return render_template('dashboards/patient_history.html', patient=patient, treatments=page.items,
+                           page=page, preview_length=DIAGNOSIS_PREVIEW_LENGTH)
+
+
+# ------------------ VIEW TREATMENT (DOCTOR) ------------------
+# The full text of one record, which patient_history leaves out of its list. With
+# ?fragment=1 only the body is returned, for the history page to expand in place.
+@main.route('/doctor/treatment/<int:treatment_id>')
+@login_required
+@read_only
+def treatment_detail(treatment_id):
+    if current_user.role != ROLE_DOCTOR:
+        return redirect(url_for('main.index'))
 
-    return render_template('dashboards/patient_history.html',
-                           patient=patient, treatments=treatments)
+    treatment = archive.find_treatment(treatment_id)
+    if treatment is None:
+        abort(404)
+    if request.args.get('fragment'):
+        return render_template('dashboards/treatment_body.html', treatment=treatment)
+    return render_template('dashboards/treatment_detail.html', treatment=treatment)
 
 
 
 # ------------------ PATIENT DASHBOARD ------------------
 @main.route('/patient_dashboard', methods=['GET', 'POST'])
 @login_required
+@read_only(unless=lambda: request.args.get('action'))
 def patient_dashboard():
     if current_user.role != ROLE_PATIENT:
         return redirect(url_for('main.index'))
 
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient_id = current_user.profile_id
 
-    upcoming = Appointment.query.filter(
-        Appointment.patient_id == patient.id,
+    upcoming = Appointment.query.options(joinedload(Appointment.doctor)).filter(
+        Appointment.patient_id == patient_id,
         Appointment.status == "Booked"
     ).order_by(Appointment.appointment_datetime.asc()).all()
 
-    past = Appointment.query.filter(
-        Appointment.patient_id == patient.id,
-        Appointment.status.in_(["Cancelled", "Completed", "Rescheduled"])
-    ).order_by(Appointment.appointment_datetime.desc()).all()
+    page = keyset_paginate(
+        Appointment.query.options(joinedload(Appointment.doctor)).filter(
+            Appointment.patient_id == patient_id,
+            Appointment.status.in_(["Cancelled", "Completed", "Rescheduled"])
+        ),
+        [Appointment.appointment_datetime, Appointment.id], descending=True,
+        after=request.args.get('after'), before=request.args.get('before'),
+        archive=(
+            ArchivedAppointment.query.options(joinedload(ArchivedAppointment.doctor))
+            .filter(ArchivedAppointment.patient_id == patient_id),
+            [ArchivedAppointment.appointment_datetime, ArchivedAppointment.id]
+        )
+    )
+    past = page.items
 
     action = request.args.get("action")
     appointment_id = request.args.get("id")
@@ -440,7 +719,7 @@ def patient_dashboard():
     if action and appointment_id:
         appt = Appointment.query.get(int(appointment_id))
 
-        if not appt or appt.patient_id != patient.id:
+        if not appt or appt.patient_id != patient_id:
             flash("Invalid appointment action!", "danger")
             return redirect(url_for('main.patient_dashboard'))
 
@@ -452,37 +731,38 @@ def patient_dashboard():
             return redirect(url_for('main.patient_dashboard'))
 
         # RESCHEDULE
+        # Nothing is written here; the move and the reschedule count are committed
+        # together once a new slot is picked in book_appointment.
         if action == "reschedule":
-            if appt.reschedule_count >= 2:
+            if appt.reschedule_count >= booking.MAX_RESCHEDULES:
                 flash("You cannot reschedule this appointment more than 2 times.", "warning")
                 return redirect(url_for('main.patient_dashboard'))
-            appt.status = "Rescheduled"
-            appt.reschedule_count += 1
-            db.session.commit()
             return redirect(url_for('main.book_appointment', reschedule_id=appt.id))
 
     return render_template(
         "dashboards/patient_dashboard.html",
         upcoming_appts=upcoming,
-        past_appts=past
+        past_appts=past,
+        page=page
     )
 
 
 # ------------------ PATIENT BOOKING ------------------
 @main.route('/patient/book', methods=['GET', 'POST'])
 @login_required
+@read_only
 def book_appointment():
     if current_user.role != ROLE_PATIENT:
         return redirect(url_for('main.index'))
 
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient_id = current_user.profile_id
 
     reschedule_id = request.args.get("reschedule_id")
     reschedule_appt = None
     reschedule_count = 0
     if reschedule_id:
         reschedule_appt = Appointment.query.get(int(reschedule_id))
-        if reschedule_appt and reschedule_appt.patient_id == patient.id:
+        if reschedule_appt and reschedule_appt.patient_id == patient_id:
             reschedule_count = reschedule_appt.reschedule_count or 0
         else:
             flash("Invalid reschedule request.", "danger")
@@ -496,65 +776,73 @@ def book_appointment():
 
     doctors = []
     free_slots = []
+    next_slots = []
+    status_code = 200
 
     if selected_spec:
         doctors = Doctor.query.filter_by(specialization=selected_spec).all()
 
+    if selected_spec and request.form.get("next_available"):
+        window_from = request.form.get("window_from")
+        window_to = request.form.get("window_to")
+        start = datetime.now()
+        try:
+            if window_from:
+                start = max(start, datetime.strptime(window_from, "%Y-%m-%d"))
+            end = datetime.strptime(window_to, "%Y-%m-%d") + timedelta(days=1) if window_to else None
+        except ValueError:
+            flash("Invalid date window. Use YYYY-MM-DD dates.", "danger")
+        else:
+            next_slots = slots.next_available(
+                selected_spec,
+                limit=current_app.config.get('NEXT_AVAILABLE_LIMIT', 5),
+                start=start,
+                end=end,
+                exclude_appointment_id=reschedule_appt.id if reschedule_appt else None
+            )
+            if not next_slots:
+                flash("No free slots found for this specialization in the selected window.", "info")
+
     if selected_doctor_id and selected_date:
         doctor = Doctor.query.get_or_404(int(selected_doctor_id))
         date_obj = datetime.strptime(selected_date, "%Y-%m-%d").date()
 
-        availabilities = DoctorAvailability.query.filter_by(
-            doctor_id=doctor.id,
-            date=date_obj
-        ).all()
-
-        for a in availabilities:
-            start_dt = datetime.combine(a.date, a.start_time)
-            end_dt = datetime.combine(a.date, a.end_time)
-            slot = start_dt
-            while slot < end_dt:
-                existing_appt = Appointment.query.filter_by(
-                    doctor_id=doctor.id, appointment_datetime=slot
-                ).first()
-
-                if not existing_appt or (reschedule_appt and existing_appt.id == reschedule_appt.id):
-                    free_slots.append(slot)
-                slot += timedelta(minutes=30)
+        free_slots = slots.free_slots(
+            doctor.id, date_obj,
+            exclude_appointment_id=reschedule_appt.id if reschedule_appt else None
+        ).get(date_obj, [])
 
         slot_str = request.form.get("slot")
         if slot_str:
-            if reschedule_appt and reschedule_count >= 2:
-                flash("Maximum 2 reschedules allowed. Cannot reschedule further.", "danger")
-                return redirect(url_for('main.patient_dashboard'))
-
             dt = datetime.strptime(slot_str, "%Y-%m-%d %H:%M")
-            conflict = Appointment.query.filter_by(
-                doctor_id=doctor.id, appointment_datetime=dt
-            ).first()
-            
-            if conflict and (not reschedule_appt or conflict.id != reschedule_appt.id):
-                flash("This time slot is already booked!", "danger")
-            else:
-                if not reschedule_appt:
-                    new_appt = Appointment(
-                        patient_id=patient.id,
-                        doctor_id=doctor.id,
-                        appointment_datetime=dt,
-                        status="Booked",
-                        reschedule_count=0
-                    )
-                    db.session.add(new_appt)
-                    db.session.commit()
-                    flash(f"Appointment booked with Dr. {doctor.name} on {dt.strftime('%Y-%m-%d %H:%M')}", "success")
+            exclude_id = reschedule_appt.id if reschedule_appt else None
+            doctor_name, specialization = doctor.name, doctor.specialization
+            try:
+                if dt not in free_slots:
+                    raise SlotTaken(dt)
+                if reschedule_appt:
+                    booking.reschedule(reschedule_appt, doctor.id, dt)
+                    flash(f"Appointment rescheduled with Dr. {doctor_name} on {dt.strftime('%Y-%m-%d %H:%M')}", "success")
                 else:
-                    reschedule_appt.appointment_datetime = dt
-                    reschedule_appt.status = "Booked"
-                    reschedule_appt.reschedule_count += 1
-                    db.session.commit()
-                    flash(f"Appointment rescheduled with Dr. {doctor.name} on {dt.strftime('%Y-%m-%d %H:%M')}", "success")
-
+                    booking.book_slot(patient_id, doctor.id, dt)
+                    flash(f"Appointment booked with Dr. {doctor_name} on {dt.strftime('%Y-%m-%d %H:%M')}", "success")
                 return redirect(url_for('main.patient_dashboard'))
+            except RescheduleRefused as e:
+                flash(str(e), "danger")
+                return redirect(url_for('main.patient_dashboard'))
+            except SlotTaken:
+                flash("Sorry, that slot was just taken. Here are the nearest free slots instead.", "warning")
+                status_code = 409
+                free_slots = slots.free_slots(
+                    doctor.id, date_obj, exclude_appointment_id=exclude_id
+                ).get(date_obj, [])
+                selected_spec = selected_spec or specialization
+                next_slots = slots.next_available(
+                    specialization,
+                    limit=current_app.config.get('NEXT_AVAILABLE_LIMIT', 5),
+                    start=max(dt, datetime.now()),
+                    exclude_appointment_id=exclude_id
+                )
 
     return render_template(
         'dashboards/patient_book_slots.html',
@@ -564,28 +852,33 @@ def book_appointment():
         selected_doctor_id=int(selected_doctor_id) if selected_doctor_id else None,
         selected_date=selected_date,
         free_slots=free_slots,
+        next_slots=next_slots,
         reschedule_id=int(reschedule_id) if reschedule_id else None,
         reschedule_count=reschedule_count
-    )
+    ), status_code
 
 # ------------------ VIEW TREATMENT (PATIENT) ------------------
 @main.route('/patient/appointment/<int:appointment_id>/treatment')
 @login_required
+@read_only
 def view_treatment(appointment_id):
     if current_user.role != ROLE_PATIENT:
         return redirect(url_for('main.index'))
 
-    appt = Appointment.query.get_or_404(appointment_id)
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    appt = archive.find_appointment(appointment_id)
+    if appt is None:
+        abort(404)
+    patient_id = current_user.profile_id
 
-    if not appt or appt.patient_id != patient.id:
+    if appt.patient_id != patient_id:
         flash("You are not authorized to view this treatment.", "danger")
+        return redirect(url_for('main.patient_dashboard'))
 
     if appt.status != "Completed":
         flash("Treatment details are only available for completed appointments.", "warning")
         return redirect(url_for('main.patient_dashboard'))
 
-    treatments = TreatmentRecord.query.filter_by(appointment_id=appointment_id).all()
+    treatments = archive.treatments_for(appt)
 
     return render_template(
         'dashboards/patient_view_treatment.html',
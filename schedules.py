@@ -0,0 +1,76 @@
+from itertools import chain
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from extensions import db
+from models import (Appointment, AvailabilityException, AvailabilityRule, Doctor, DoctorAvailability,
+                    ScheduleVersion)
+
+# ------------------ SCHEDULE VERSIONS ------------------
+# One counter per doctor, bumped in the same transaction as any change to that doctor's
+# availability, weekly rules, rule exceptions or appointments. Readers only compare it,
+# so an ETag built from it is invalidated exactly when the doctor's free slots can change.
+def bump_versions(connection, doctor_ids):
+    doctor_ids = sorted(d for d in doctor_ids if d is not None)
+    if not doctor_ids:
+        return
+    table = ScheduleVersion.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        statement = insert(table).values([{'doctor_id': d, 'version': 1} for d in doctor_ids])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.doctor_id], set_={'version': table.c.version + 1}
+        ))
+        return
+    for doctor_id in doctor_ids:
+        bumped = connection.execute(
+            update(table).where(table.c.doctor_id == doctor_id).values(version=table.c.version + 1)
+        ).rowcount
+        if not bumped:
+            connection.execute(table.insert().values(doctor_id=doctor_id, version=1))
+
+
+def get_version(doctor_id):
+    version = db.session.execute(
+        select(ScheduleVersion.version).where(ScheduleVersion.doctor_id == doctor_id)
+    ).scalar()
+    return version or 0
+
+
+def _touched_doctors(session):
+    doctor_ids, rule_ids, deleted_doctors = set(), set(), set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, (DoctorAvailability, AvailabilityRule, Appointment)):
+            doctor_ids.add(obj.doctor_id)
+            doctor_ids.update(inspect(obj).attrs.doctor_id.history.deleted)
+        elif isinstance(obj, AvailabilityException):
+            rule_ids.add(obj.rule_id)
+        elif isinstance(obj, Doctor) and obj in session.deleted:
+            deleted_doctors.add(obj.id)
+    return doctor_ids, rule_ids, deleted_doctors
+
+
+# after_flush rather than before_flush so foreign keys set through relationships
+# (Appointment(doctor=...)) are populated by the time they are read.
+def bump_touched_schedules(session, flush_context):
+    doctor_ids, rule_ids, deleted_doctors = _touched_doctors(session)
+    connection = session.connection()
+    if rule_ids:
+        doctor_ids.update(connection.execute(
+            select(AvailabilityRule.doctor_id).where(AvailabilityRule.id.in_(rule_ids))
+        ).scalars())
+    if deleted_doctors:
+        connection.execute(
+            ScheduleVersion.__table__.delete().where(ScheduleVersion.doctor_id.in_(deleted_doctors))
+        )
+    bump_versions(connection, doctor_ids - deleted_doctors)
+
+
+# The slot API's ETags are only correct while this runs on every flush, so create_app
+# registers it before anything else that listens to the session.
+def init_schedule_versions(app):
+    if not event.contains(db.session, 'after_flush', bump_touched_schedules):
+        event.listen(db.session, 'after_flush', bump_touched_schedules)
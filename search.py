@@ -0,0 +1,154 @@
+import re
+from flask import current_app
+from sqlalchemy import column, false, literal_column, select, table, text
+from sqlalchemy.exc import OperationalError
+from extensions import db
+from models import Appointment, Doctor, Patient, User
+
+doctor_fts = table('doctor_fts', column('rowid'), column('rank'))
+patient_fts = table('patient_fts', column('rowid'), column('rank'))
+
+# ------------------ FTS5 INDEX ------------------
+# On SQLite, doctor_fts/patient_fts shadow the searchable columns and are kept in sync by
+# triggers, so rows written by any code path (routes, CLI imports, raw SQL) stay indexed.
+# Create or rebuild them with `flask rebuild-search-index`; until then, and on other
+# databases, search falls back to the ILIKE scan.
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS doctor_fts USING fts5(
+        name, specialization, username, tokenize = 'unicode61 remove_diacritics 2')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS patient_fts USING fts5(
+        name, username, contact, tokenize = 'unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS doctor_fts_ai AFTER INSERT ON doctor BEGIN
+        INSERT INTO doctor_fts(rowid, name, specialization, username)
+        SELECT new.id, new.name, new.specialization, (SELECT username FROM "user" WHERE id = new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctor_fts_au AFTER UPDATE ON doctor BEGIN
+        DELETE FROM doctor_fts WHERE rowid = old.id;
+        INSERT INTO doctor_fts(rowid, name, specialization, username)
+        SELECT new.id, new.name, new.specialization, (SELECT username FROM "user" WHERE id = new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctor_fts_ad AFTER DELETE ON doctor BEGIN
+        DELETE FROM doctor_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_ai AFTER INSERT ON patient BEGIN
+        INSERT INTO patient_fts(rowid, name, username, contact)
+        SELECT new.id, new.name, (SELECT username FROM "user" WHERE id = new.user_id), new.contact;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_au AFTER UPDATE ON patient BEGIN
+        DELETE FROM patient_fts WHERE rowid = old.id;
+        INSERT INTO patient_fts(rowid, name, username, contact)
+        SELECT new.id, new.name, (SELECT username FROM "user" WHERE id = new.user_id), new.contact;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_ad AFTER DELETE ON patient BEGIN
+        DELETE FROM patient_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_au AFTER UPDATE OF username ON "user" BEGIN
+        UPDATE doctor_fts SET username = new.username WHERE rowid IN (SELECT id FROM doctor WHERE user_id = new.id);
+        UPDATE patient_fts SET username = new.username WHERE rowid IN (SELECT id FROM patient WHERE user_id = new.id);
+    END""",
+]
+
+FTS_REBUILD = [
+    "DELETE FROM doctor_fts",
+    """INSERT INTO doctor_fts(rowid, name, specialization, username)
+       SELECT doctor.id, doctor.name, doctor.specialization, "user".username
+       FROM doctor JOIN "user" ON "user".id = doctor.user_id""",
+    "DELETE FROM patient_fts",
+    """INSERT INTO patient_fts(rowid, name, username, contact)
+       SELECT patient.id, patient.name, "user".username, patient.contact
+       FROM patient JOIN "user" ON "user".id = patient.user_id""",
+]
+
+
+def rebuild_search_index():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        for statement in FTS_SCHEMA + FTS_REBUILD:
+            db.session.execute(text(statement))
+    except OperationalError:
+        # SQLite built without FTS5 ("no such module: fts5"): keep the ILIKE search.
+        db.session.rollback()
+        current_app.extensions.pop('hms_fts', None)
+        return False
+    db.session.commit()
+    current_app.extensions['hms_fts'] = True
+    return True
+
+
+def fts_available():
+    if not current_app.config.get('USE_FTS_SEARCH', True):
+        return False
+    if current_app.extensions.get('hms_fts'):
+        return True
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    found = db.session.execute(
+        text("SELECT count(*) FROM sqlite_master WHERE name IN ('doctor_fts', 'patient_fts')")
+    ).scalar() == 2
+    if found:
+        current_app.extensions['hms_fts'] = True
+    return found
+
+
+def match_expression(search_text, column_name=None):
+    tokens = re.findall(r'\w+', search_text.lower())
+    prefix = f'{column_name} : ' if column_name else ''
+    return ' AND '.join(f'{prefix}"{token}"*' for token in tokens)
+
+
+# ------------------ SEARCH ------------------
+# Each helper takes a query already joined to the searched entities and returns it
+# filtered; with FTS and ranked=True the results come back ordered by bm25 rank.
+# Paginated lists pass ranked=False and keep their own stable keyset order.
+def filter_doctors(query, search_text, ranked=True):
+    if fts_available():
+        expression = match_expression(search_text)
+        if not expression:
+            # Nothing searchable (e.g. "!!!") matches nothing.
+            return query.filter(false())
+        query = query.join(doctor_fts, doctor_fts.c.rowid == Doctor.id).filter(
+            literal_column('doctor_fts').op('MATCH')(expression)
+        )
+        return query.order_by(doctor_fts.c.rank) if ranked else query
+
+    return query.filter(
+        (Doctor.name.ilike(f"%{search_text}%")) |
+        (Doctor.specialization.ilike(f"%{search_text}%")) |
+        (User.username.ilike(f"%{search_text}%"))
+    )
+
+
+def filter_patients(query, search_text, ranked=True):
+    if fts_available():
+        expression = match_expression(search_text)
+        if not expression:
+            return query.filter(false())
+        query = query.join(patient_fts, patient_fts.c.rowid == Patient.id).filter(
+            literal_column('patient_fts').op('MATCH')(expression)
+        )
+        return query.order_by(patient_fts.c.rank) if ranked else query
+
+    return query.filter(
+        (Patient.name.ilike(f"%{search_text}%")) |
+        (User.username.ilike(f"%{search_text}%")) |
+        (Patient.contact.ilike(f"%{search_text}%"))
+    )
+
+
+def filter_appointments(query, search_text, model=Appointment):
+    # `model` is Appointment or ArchivedAppointment; both are joined to Patient and Doctor.
+    if fts_available():
+        expression = match_expression(search_text, 'name')
+        if not expression:
+            return query.filter(false())
+        patient_ids = select(patient_fts.c.rowid).where(literal_column('patient_fts').op('MATCH')(expression))
+        doctor_ids = select(doctor_fts.c.rowid).where(literal_column('doctor_fts').op('MATCH')(expression))
+        return query.filter(
+            model.patient_id.in_(patient_ids) | model.doctor_id.in_(doctor_ids)
+        )
+
+    return query.filter(
+        (Patient.name.ilike(f"%{search_text}%")) |
+        (Doctor.name.ilike(f"%{search_text}%"))
+    )
@@ -0,0 +1,247 @@
+"""Fill a database with seeded synthetic doctors, patients, appointments and treatments.
+
+    python seed_data.py --scale medium --db /tmp/hms-medium.db
+
+Builds the schema, admin user and departments with init_db.initialize_database(), then
+bulk-inserts in chunks with Core statements. The same --seed gives the same data, so
+benchmark runs on different commits see identical databases. Every generated user's
+password is 'password'; usernames are doctor<N> and patient<N>.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from itertools import islice
+from sqlalchemy import func, insert, select, text
+from app import create_app
+from extensions import db
+from init_db import initialize_database
+from models import (Appointment, AvailabilityRule, Department, Doctor, DoctorAvailability, Patient,
+                    TreatmentRecord, User, ROLE_DOCTOR, ROLE_PATIENT)
+from passwords import hash_password
+import counters
+import reports
+import search
+import slots
+
+SCALES = {
+    'small': {'doctors': 50, 'patients': 2000, 'appointments': 20000},
+    'medium': {'doctors': 500, 'patients': 20000, 'appointments': 200000},
+    'large': {'doctors': 2000, 'patients': 200000, 'appointments': 2000000},
+}
+PASSWORD = 'password'
+
+FIRST_NAMES = ('Aarav', 'Maya', 'Liam', 'Priya', 'Noah', 'Sara', 'Omar', 'Lena', 'Ravi', 'Emma',
+               'Ivan', 'Zoe', 'Kenji', 'Ana', 'Yusuf', 'Mila', 'Arjun', 'Nora', 'Diego', 'Hana')
+LAST_NAMES = ('Sharma', 'Smith', 'Garcia', 'Khan', 'Chen', 'Novak', 'Okafor', 'Rossi', 'Patel', 'Silva',
+              'Kim', 'Müller', 'Haddad', 'Ivanova', 'Tanaka', 'Mensah', 'Dubois', 'Costa', 'Singh', 'Berg')
+DIAGNOSES = ('Hypertension', 'Seasonal allergies', 'Type 2 diabetes follow-up', 'Migraine', 'Eczema',
+             'Lower back pain', 'Anxiety', 'Upper respiratory infection', 'Sprained ankle', 'Asthma')
+PRESCRIPTIONS = ('Amlodipine 5mg daily', 'Cetirizine 10mg as needed', 'Metformin 500mg twice daily',
+                 'Ibuprofen 400mg as needed', 'Hydrocortisone cream 1%', 'Sertraline 50mg daily',
+                 'Salbutamol inhaler as needed', 'Rest and physiotherapy')
+NOTE_SENTENCES = ('Patient reports improvement since last visit.', 'Advised lifestyle changes.',
+                  'Follow up in four weeks.', 'Vitals within normal range.', 'Reviewed recent lab results.',
+                  'Discussed side effects of medication.', 'Referred for imaging.', 'No known drug allergies.')
+
+# Clinic hours for generated appointments: weekdays, 09:00-17:00 in 30 minute slots.
+DAY_SLOTS = [dtime(9 + i // 2, 30 * (i % 2)) for i in range(16)]
+HISTORY_DAYS = 730
+FUTURE_DAYS = 60
+
+
+def chunked_insert(model, rows, chunk_size):
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+# ------------------ GENERATORS ------------------
+def generate_users(rng, count, role, prefix, password_hash, first_user, first_profile, extra):
+    users, profiles = [], []
+    for i in range(count):
+        user_id, profile_id = first_user + i, first_profile + i
+        users.append({'id': user_id, 'username': f'{prefix}{profile_id}', 'password_hash': password_hash,
+                      'role': role, 'is_blacklisted': False})
+        profiles.append(dict({'id': profile_id, 'user_id': user_id, 'name': person_name(rng)}, **extra(rng)))
+    return users, profiles
+
+
+def weekday_slots(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            for slot in DAY_SLOTS:
+                yield datetime.combine(day, slot)
+        day += timedelta(days=1)
+
+
+def generate_appointments(rng, doctor_ids, patient_ids, total, today, first_id):
+    """Yield (appointment, treatment-or-None) pairs, unique per (doctor, time) as the schema requires."""
+    grid = list(weekday_slots(today - timedelta(days=HISTORY_DAYS), today + timedelta(days=FUTURE_DAYS)))
+    now = datetime.combine(today, dtime(0))
+    per_doctor, extra = divmod(total, len(doctor_ids))
+    appointment_id = first_id
+    for index, doctor_id in enumerate(doctor_ids):
+        count = min(len(grid), per_doctor + (1 if index < extra else 0))
+        for when in sorted(rng.sample(grid, count)):
+            roll = rng.random()
+            if when < now:
+                status = 'Completed' if roll < 0.75 else 'Cancelled' if roll < 0.9 else 'Booked'
+            else:
+                status = 'Booked' if roll < 0.9 else 'Cancelled'
+            reschedules = 0 if rng.random() < 0.9 else rng.choice((1, 1, 2))
+            patient_id = rng.choice(patient_ids)
+            appointment = {'id': appointment_id, 'patient_id': patient_id, 'doctor_id': doctor_id,
+                           'appointment_datetime': when, 'status': status, 'reschedule_count': reschedules,
+                           'created_at': when - timedelta(days=rng.randint(1, 30))}
+            treatment = None
+            if status == 'Completed':
+                treatment = {'patient_id': patient_id, 'doctor_id': doctor_id, 'appointment_id': appointment_id,
+                             'diagnosis': rng.choice(DIAGNOSES),
+                             'prescriptions': ', '.join(rng.sample(PRESCRIPTIONS, rng.randint(1, 3))),
+                             'notes': ' '.join(rng.sample(NOTE_SENTENCES, rng.randint(1, 6))),
+                             'created_at': when + timedelta(minutes=30)}
+            yield appointment, treatment
+            appointment_id += 1
+
+
+def generate_availability(rng, doctor_ids, today):
+    """Weekday rules for every doctor, plus dated Saturday mornings for a fifth of them."""
+    rules, dated = [], []
+    first_monday = today - timedelta(days=HISTORY_DAYS + today.weekday())
+    for doctor_id in doctor_ids:
+        rules.append({'doctor_id': doctor_id, 'weekdays': 0b0011111, 'start_time': dtime(9),
+                      'end_time': dtime(17), 'valid_from': first_monday, 'valid_until': None})
+        if rng.random() < 0.2:
+            saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+            for week in range(8):
+                dated.append({'doctor_id': doctor_id, 'date': saturday + timedelta(weeks=week),
+                              'start_time': dtime(9), 'end_time': dtime(13)})
+    return rules, dated
+
+
+def sync_sequences(tables):
+    # Explicit ids leave PostgreSQL's serial sequences behind the data.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))"
+        ))
+    db.session.commit()
+
+
+# ------------------ DRIVER ------------------
+def seed(app, doctors, patients, appointments, seed_value=1, chunk_size=5000, log=print):
+    rng = random.Random(seed_value)
+    today = date.today()
+    initialize_database(app)
+    with app.app_context():
+        specializations = list(db.session.scalars(select(Department.name).order_by(Department.id)))
+        password_hash = hash_password(PASSWORD)
+        started = time.perf_counter()
+
+        first_user, first_doctor, first_patient = next_id(User), next_id(Doctor), next_id(Patient)
+        users, doctor_rows = generate_users(
+            rng, doctors, ROLE_DOCTOR, 'doctor', password_hash, first_user, first_doctor,
+            lambda r: {'specialization': r.choice(specializations)}
+        )
+        patient_users, patient_rows = generate_users(
+            rng, patients, ROLE_PATIENT, 'patient', password_hash, first_user + doctors, first_patient,
+            lambda r: {'contact': f'+1-555-{r.randint(0, 9999):04d}'}
+        )
+        chunked_insert(User, users + patient_users, chunk_size)
+        chunked_insert(Doctor, doctor_rows, chunk_size)
+        chunked_insert(Patient, patient_rows, chunk_size)
+        log(f"users: {doctors} doctors, {patients} patients ({time.perf_counter() - started:.1f}s)")
+
+        doctor_ids = [row['id'] for row in doctor_rows]
+        patient_ids = [row['id'] for row in patient_rows]
+        rules, dated = generate_availability(rng, doctor_ids, today)
+        chunked_insert(AvailabilityRule, rules, chunk_size)
+        chunked_insert(DoctorAvailability, dated, chunk_size)
+
+        total = treatment_total = 0
+        pairs = generate_appointments(rng, doctor_ids, patient_ids, appointments, today, next_id(Appointment))
+        while True:
+            chunk = list(islice(pairs, chunk_size))
+            if not chunk:
+                break
+            # Treatments reference their appointment, so each chunk goes in appointments first.
+            total += chunked_insert(Appointment, (a for a, _ in chunk), chunk_size)
+            treatment_total += chunked_insert(TreatmentRecord, (t for _, t in chunk if t), chunk_size)
+        log(f"appointments: {total}, treatments: {treatment_total} ({time.perf_counter() - started:.1f}s)")
+
+        sync_sequences(['user', 'doctor', 'patient', 'appointment', 'treatment_record',
+                        'availability_rule', 'doctor_availability'])
+
+        # Core inserts bypass the ORM hooks; bring every derived table up to date.
+        counters.reconcile_counters()
+        search.rebuild_search_index()
+        if slots.slot_table_enabled():
+            slots.rebuild_slot_table()
+        with db.engine.begin() as connection:
+            reports.backfill(connection)
+        log(f"derived tables rebuilt ({time.perf_counter() - started:.1f}s)")
+    return {'doctors': doctors, 'patients': patients, 'appointments': total, 'treatments': treatment_total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--db', help='SQLite file to create (default: hms-<scale>.db in the temp dir).')
+    parser.add_argument('--url', help='Any SQLAlchemy URL instead of --db, e.g. PostgreSQL.')
+    parser.add_argument('--doctors', type=int)
+    parser.add_argument('--patients', type=int)
+    parser.add_argument('--appointments', type=int)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--force', action='store_true', help='Replace an existing --db file.')
+    args = parser.parse_args()
+
+    volumes = dict(SCALES[args.scale])
+    for name in volumes:
+        if getattr(args, name):
+            volumes[name] = getattr(args, name)
+
+    url = args.url
+    if not url:
+        path = os.path.abspath(args.db or os.path.join(os.environ.get('TMPDIR', '/tmp'), f'hms-{args.scale}.db'))
+        if os.path.exists(path):
+            if not args.force:
+                sys.exit(f"{path} exists; pass --force to replace it.")
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        url = f'sqlite:///{path}'
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'METRICS_ENABLED': False})
+    print(f"Seeding {url} with {volumes}")
+    seed(app, seed_value=args.seed, chunk_size=args.chunk_size, **volumes)
+    print(f"Log in as doctor1, patient1, ... with password '{PASSWORD}'.")
+
+
+if __name__ == '__main__':
+    main()
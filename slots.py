@@ -0,0 +1,472 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from itertools import chain, islice
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, or_, select, tuple_, update
+from extensions import db
+from models import (Appointment, AvailabilityException, AvailabilityRule, Doctor, DoctorAvailability,
+                    DoctorSlot, SLOT_BOOKED, SLOT_FREE)
+
+DEFAULT_SLOT_MINUTES = 30
+RULE_HORIZON_DAYS = 366
+
+
+def slot_length(slot_minutes=None):
+    if slot_minutes is None:
+        slot_minutes = current_app.config.get('SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+    return timedelta(minutes=int(slot_minutes))
+
+
+def day_bounds(start_date, end_date):
+    return (datetime.combine(start_date, time.min),
+            datetime.combine(end_date + timedelta(days=1), time.min))
+
+
+# ------------------ SLOT GRID ------------------
+def slot_grid(availabilities, length):
+    for a in availabilities:
+        start_dt = datetime.combine(a.date, a.start_time)
+        end_dt = datetime.combine(a.date, a.end_time)
+        slot = start_dt
+        while slot < end_dt:
+            yield slot
+            slot += length
+
+
+# ------------------ BOOKED SLOTS ------------------
+# Every appointment row holds its (doctor_id, appointment_datetime) key because of
+# uq_doctor_datetime, so any status blocks the slot except the one being rescheduled.
+def booked_datetimes(doctor_id, start_date, end_date, exclude_appointment_id=None):
+    range_start, range_end = day_bounds(start_date, end_date)
+    query = db.session.query(Appointment.appointment_datetime).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_datetime >= range_start,
+        Appointment.appointment_datetime < range_end
+    )
+    if exclude_appointment_id:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+    return {row[0] for row in query}
+
+
+# ------------------ RECURRING RULES ------------------
+# AvailabilityRule rows are expanded into RuleWindows for the dates being looked at and
+# thrown away afterwards. A RuleWindow has the same date/start_time/end_time/doctor_id
+# attributes as a DoctorAvailability row, so both go through slot_grid() unchanged.
+RuleWindow = namedtuple('RuleWindow', 'doctor_id date start_time end_time rule_id')
+
+
+def rules_active_between(query, start_date, end_date):
+    return query.filter(
+        AvailabilityRule.valid_from <= end_date,
+        or_(AvailabilityRule.valid_until.is_(None), AvailabilityRule.valid_until >= start_date)
+    )
+
+
+def _exception_dates(rule_ids, start_date, end_date):
+    if not rule_ids:
+        return set()
+    return set(db.session.query(AvailabilityException.rule_id, AvailabilityException.date).filter(
+        AvailabilityException.rule_id.in_(rule_ids),
+        AvailabilityException.date >= start_date,
+        AvailabilityException.date <= end_date
+    ))
+
+
+def expand_rules(rules, start_date, end_date):
+    """Yield RuleWindows for `rules` on each day in [start_date, end_date], in (date, start_time) order."""
+    rules = sorted(rules, key=lambda r: (r.start_time, r.id))
+    if not rules:
+        return
+    skipped = _exception_dates([r.id for r in rules], start_date, end_date)
+    day = start_date
+    while day <= end_date:
+        weekday = day.weekday()
+        for r in rules:
+            if (r.runs_on(weekday) and r.valid_from <= day
+                    and (r.valid_until is None or day <= r.valid_until)
+                    and (r.id, day) not in skipped):
+                yield RuleWindow(r.doctor_id, day, r.start_time, r.end_time, r.id)
+        day += timedelta(days=1)
+
+
+def rule_windows(doctor_id, start_date, end_date):
+    rules = rules_active_between(
+        AvailabilityRule.query.filter(AvailabilityRule.doctor_id == doctor_id), start_date, end_date
+    ).all()
+    return list(expand_rules(rules, start_date, end_date))
+
+
+def overlapping_rule_window(doctor_id, day, start_time, end_time):
+    for window in rule_windows(doctor_id, day, day):
+        if window.start_time <= end_time and window.end_time >= start_time:
+            return window
+    return None
+
+
+def rule_conflict(doctor_id, weekdays, start_time, end_time, valid_from, valid_until=None):
+    """Return an existing rule or dated availability that a new rule would overlap, or None."""
+    rules = rules_active_between(
+        AvailabilityRule.query.filter(
+            AvailabilityRule.doctor_id == doctor_id,
+            AvailabilityRule.start_time <= end_time,
+            AvailabilityRule.end_time >= start_time
+        ), valid_from, valid_until or datetime.max.date()
+    )
+    for rule in rules:
+        if rule.weekdays & weekdays:
+            return rule
+
+    dated = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date >= valid_from,
+        DoctorAvailability.start_time <= end_time,
+        DoctorAvailability.end_time >= start_time
+    )
+    if valid_until:
+        dated = dated.filter(DoctorAvailability.date <= valid_until)
+    for a in dated:
+        if weekdays & (1 << a.date.weekday()):
+            return a
+    return None
+
+
+# ------------------ FREE SLOTS ------------------
+def free_slots(doctor_id, start_date, end_date=None, slot_minutes=None, exclude_appointment_id=None):
+    """Return {date: [datetime, ...]} of bookable slots for a doctor in [start_date, end_date]."""
+    end_date = end_date or start_date
+    windows = rule_windows(doctor_id, start_date, end_date)
+
+    if slot_table_enabled() and slot_minutes is None:
+        result = materialized_free_slots(doctor_id, start_date, end_date, exclude_appointment_id)
+        length = slot_length()
+    else:
+        result = {}
+        length = slot_length(slot_minutes)
+        windows += DoctorAvailability.query.filter(
+            DoctorAvailability.doctor_id == doctor_id,
+            DoctorAvailability.date >= start_date,
+            DoctorAvailability.date <= end_date
+        ).order_by(DoctorAvailability.date, DoctorAvailability.start_time).all()
+
+    if not windows:
+        return result
+
+    booked = booked_datetimes(doctor_id, start_date, end_date, exclude_appointment_id)
+
+    for slot in slot_grid(windows, length):
+        if slot not in booked:
+            result.setdefault(slot.date(), []).append(slot)
+
+    for day in result:
+        result[day] = sorted(set(result[day]))
+    return result
+
+
+def free_slots_for_week(doctor_id, week_start, slot_minutes=None, exclude_appointment_id=None):
+    return free_slots(doctor_id, week_start, week_start + timedelta(days=6),
+                      slot_minutes=slot_minutes, exclude_appointment_id=exclude_appointment_id)
+
+
+# ------------------ NEXT AVAILABLE ------------------
+# Availability rows for the whole specialization are read in (date, start_time) order,
+# one keyset page at a time, merged with the specialization's rules expanded day by day,
+# and their slot sequences are merged through a heap. A slot is only emitted once no
+# unread window can start at or before it, so the search stops after the first `limit`
+# free slots instead of walking every doctor's calendar.
+def _availability_pages(specialization, start, end, batch_size):
+    query = DoctorAvailability.query.join(Doctor, DoctorAvailability.doctor_id == Doctor.id).filter(
+        Doctor.specialization == specialization,
+        DoctorAvailability.date >= start.date()
+    )
+    if end:
+        query = query.filter(DoctorAvailability.date <= end.date())
+    order = (DoctorAvailability.date, DoctorAvailability.start_time, DoctorAvailability.id)
+
+    last = None
+    while True:
+        page_query = query
+        if last:
+            page_query = page_query.filter(tuple_(*order) > last)
+        page = page_query.order_by(*order).limit(batch_size).all()
+        if not page:
+            return
+        yield page
+        if len(page) < batch_size:
+            return
+        last = (page[-1].date, page[-1].start_time, page[-1].id)
+
+
+def _window_pages(specialization, start, end, batch_size, include_dated=True):
+    streams = []
+    if include_dated:
+        streams.append(chain.from_iterable(_availability_pages(specialization, start, end, batch_size)))
+    last_day = end.date() if end else start.date() + timedelta(days=RULE_HORIZON_DAYS)
+    rules = rules_active_between(
+        AvailabilityRule.query.join(Doctor, AvailabilityRule.doctor_id == Doctor.id).filter(
+            Doctor.specialization == specialization
+        ), start.date(), last_day
+    ).all()
+    streams.append(expand_rules(rules, start.date(), last_day))
+
+    windows = heapq.merge(*streams, key=lambda w: (w.date, w.start_time))
+    while True:
+        page = list(islice(windows, batch_size))
+        if not page:
+            return
+        yield page
+
+
+def _booked_pairs(page, exclude_appointment_id=None):
+    query = db.session.query(Appointment.doctor_id, Appointment.appointment_datetime).filter(
+        Appointment.doctor_id.in_({a.doctor_id for a in page}),
+        Appointment.appointment_datetime >= datetime.combine(page[0].date, time.min),
+        Appointment.appointment_datetime < datetime.combine(page[-1].date + timedelta(days=1), time.min)
+    )
+    if exclude_appointment_id:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+    return set(query)
+
+
+def _first_slot(a, start, length):
+    slot = datetime.combine(a.date, a.start_time)
+    if slot < start:
+        steps = -(-(start - slot) // length)
+        slot += steps * length
+    return slot
+
+
+def iter_next_available(specialization, start=None, end=None, exclude_appointment_id=None, batch_size=200,
+                        include_dated=True):
+    start = start or datetime.now()
+    length = slot_length()
+    heap, booked, seen = [], set(), set()
+
+    def emit_until(bound):
+        while heap and (bound is None or heap[0][0] < bound):
+            slot, doctor_id, end_dt = heapq.heappop(heap)
+            if slot + length < end_dt:
+                heapq.heappush(heap, (slot + length, doctor_id, end_dt))
+            if end and slot >= end:
+                continue
+            key = (doctor_id, slot)
+            if key not in booked and key not in seen:
+                seen.add(key)
+                yield slot, doctor_id
+
+    for page in _window_pages(specialization, start, end, batch_size, include_dated):
+        booked |= _booked_pairs(page, exclude_appointment_id)
+        for a in page:
+            yield from emit_until(datetime.combine(a.date, a.start_time))
+            first = _first_slot(a, start, length)
+            end_dt = datetime.combine(a.date, a.end_time)
+            if first < end_dt:
+                heapq.heappush(heap, (first, a.doctor_id, end_dt))
+    yield from emit_until(None)
+
+
+def next_available(specialization, limit=5, start=None, end=None, exclude_appointment_id=None):
+    """Return the `limit` earliest free (datetime, Doctor) pairs across a specialization."""
+    start = start or datetime.now()
+    if end is None:
+        horizon = current_app.config.get('NEXT_AVAILABLE_HORIZON_DAYS')
+        if horizon:
+            end = start + timedelta(days=horizon)
+
+    if slot_table_enabled():
+        # The slot table only holds dated availability; rule slots are merged in live.
+        candidates = heapq.merge(
+            _materialized_next_available(specialization, limit, start, end, exclude_appointment_id),
+            iter_next_available(specialization, start, end, exclude_appointment_id, include_dated=False)
+        )
+    else:
+        candidates = iter_next_available(specialization, start, end, exclude_appointment_id)
+
+    pairs = []
+    for pair in candidates:
+        if pairs and pairs[-1] == pair:
+            continue
+        pairs.append(pair)
+        if len(pairs) >= limit:
+            break
+
+    if not pairs:
+        return []
+    doctors = {d.id: d for d in Doctor.query.filter(Doctor.id.in_({doctor_id for _, doctor_id in pairs}))}
+    return [(slot, doctors[doctor_id]) for slot, doctor_id in pairs]
+
+
+def _materialized_next_available(specialization, limit, start, end, exclude_appointment_id=None):
+    state_filter = DoctorSlot.state == SLOT_FREE
+    if exclude_appointment_id:
+        state_filter = state_filter | (DoctorSlot.appointment_id == exclude_appointment_id)
+
+    query = select(DoctorSlot.start, DoctorSlot.doctor_id).join(
+        Doctor, DoctorSlot.doctor_id == Doctor.id
+    ).where(
+        Doctor.specialization == specialization,
+        DoctorSlot.date >= start.date(),
+        DoctorSlot.start >= start,
+        state_filter
+    )
+    if end:
+        query = query.where(DoctorSlot.start < end)
+    query = query.order_by(DoctorSlot.start, DoctorSlot.doctor_id).distinct().limit(limit)
+    return [tuple(row) for row in db.session.execute(query)]
+
+
+# ------------------ MATERIALIZED SLOT TABLE ------------------
+# Optional: with USE_SLOT_TABLE on, DoctorSlot holds one row per bookable slot and
+# free_slots() becomes one range scan on ix_doctor_slot_doctor_date_state. Rows are
+# kept in sync from the session flush, so every route that touches availability or
+# appointments updates them in the same transaction. Run `flask rebuild-slots` after
+# enabling it or changing SLOT_MINUTES.
+def slot_table_enabled():
+    return has_app_context() and current_app.config.get('USE_SLOT_TABLE', False)
+
+
+def materialized_free_slots(doctor_id, start_date, end_date, exclude_appointment_id=None):
+    state_filter = DoctorSlot.state == SLOT_FREE
+    if exclude_appointment_id:
+        state_filter = state_filter | (DoctorSlot.appointment_id == exclude_appointment_id)
+
+    rows = db.session.execute(
+        select(DoctorSlot.start).where(
+            DoctorSlot.doctor_id == doctor_id,
+            DoctorSlot.date >= start_date,
+            DoctorSlot.date <= end_date,
+            state_filter
+        ).order_by(DoctorSlot.start)
+    )
+
+    result = {}
+    for (start,) in rows:
+        day_slots = result.setdefault(start.date(), [])
+        if not day_slots or day_slots[-1] != start:
+            day_slots.append(start)
+    return result
+
+
+def _booked_map(connection, doctor_id, start_date, end_date):
+    range_start, range_end = day_bounds(start_date, end_date)
+    rows = connection.execute(
+        select(Appointment.appointment_datetime, Appointment.id).where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_datetime >= range_start,
+            Appointment.appointment_datetime < range_end
+        )
+    )
+    return dict(rows.all())
+
+
+def _materialize(connection, availabilities, length):
+    rows = []
+    for a in availabilities:
+        booked = _booked_map(connection, a.doctor_id, a.date, a.date)
+        for slot in slot_grid([a], length):
+            appointment_id = booked.get(slot)
+            rows.append({
+                'doctor_id': a.doctor_id,
+                'availability_id': a.id,
+                'date': a.date,
+                'start': slot,
+                'state': SLOT_BOOKED if appointment_id else SLOT_FREE,
+                'appointment_id': appointment_id,
+            })
+    if rows:
+        connection.execute(DoctorSlot.__table__.insert(), rows)
+    return len(rows)
+
+
+def _resync(connection, doctor_id, dt):
+    appointment_id = connection.execute(
+        select(Appointment.id).where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_datetime == dt
+        )
+    ).scalar()
+    connection.execute(
+        update(DoctorSlot).where(
+            DoctorSlot.doctor_id == doctor_id,
+            DoctorSlot.date == dt.date(),
+            DoctorSlot.start == dt
+        ).values(
+            state=SLOT_BOOKED if appointment_id else SLOT_FREE,
+            appointment_id=appointment_id
+        )
+    )
+
+
+def _touched_appointment_slots(session):
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Appointment):
+            continue
+        state = inspect(obj)
+        for attr in ('doctor_id', 'appointment_datetime'):
+            history = state.attrs[attr].history
+            if history.deleted:
+                old = {'doctor_id': obj.doctor_id, 'appointment_datetime': obj.appointment_datetime}
+                old[attr] = history.deleted[0]
+                touched.add((old['doctor_id'], old['appointment_datetime']))
+        touched.add((obj.doctor_id, obj.appointment_datetime))
+    return {(d, dt) for d, dt in touched if d is not None and dt is not None}
+
+
+# Deletes run before the flush so no slot row outlives the availability or doctor it
+# points at; inserts and state changes run after it, once new rows have ids.
+def release_slot_rows(session, flush_context, instances):
+    if not slot_table_enabled():
+        return
+
+    availability_ids, doctor_ids = set(), set()
+    for obj in session.deleted:
+        if isinstance(obj, DoctorAvailability):
+            availability_ids.add(obj.id)
+        elif isinstance(obj, Doctor):
+            doctor_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, DoctorAvailability) and session.is_modified(obj):
+            availability_ids.add(obj.id)
+
+    table = DoctorSlot.__table__
+    if availability_ids:
+        session.connection().execute(table.delete().where(DoctorSlot.availability_id.in_(availability_ids)))
+    if doctor_ids:
+        session.connection().execute(table.delete().where(DoctorSlot.doctor_id.in_(doctor_ids)))
+
+
+def sync_slot_rows(session, flush_context):
+    if not slot_table_enabled():
+        return
+
+    connection = session.connection()
+    fill = [obj for obj in session.new if isinstance(obj, DoctorAvailability)]
+    fill += [obj for obj in session.dirty
+             if isinstance(obj, DoctorAvailability) and session.is_modified(obj)]
+    if fill:
+        _materialize(connection, fill, slot_length())
+
+    for doctor_id, dt in _touched_appointment_slots(session):
+        _resync(connection, doctor_id, dt)
+
+
+def init_slot_table(app):
+    # Registered whatever USE_SLOT_TABLE says; both listeners check it on every flush.
+    for name, listener in (('before_flush', release_slot_rows), ('after_flush', sync_slot_rows)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def rebuild_slot_table(batch_size=500):
+    DoctorSlot.__table__.create(db.engine, checkfirst=True)
+    connection = db.session.connection()
+    connection.execute(DoctorSlot.__table__.delete())
+
+    length = slot_length()
+    total = 0
+    query = DoctorAvailability.query.order_by(DoctorAvailability.id)
+    for a in query.yield_per(batch_size):
+        total += _materialize(connection, [a], length)
+    db.session.commit()
+    return total
@@ -0,0 +1,153 @@
+// Incremental booking page: specialization, doctor and date changes are served from
+// the /api endpoints instead of re-posting the form. The API answers with ETags and
+// `Cache-Control: no-cache`, so the browser revalidates and an unchanged calendar
+// comes back as a 304 from its own HTTP cache. Without JavaScript the inline
+// onchange submits still drive the server-rendered flow.
+(function () {
+    var form = document.getElementById('booking-form');
+    if (!form || !window.fetch) {
+        return;
+    }
+    var specSelect = document.getElementById('specialization');
+    var doctorSelect = document.getElementById('doctor');
+    var dateInput = document.getElementById('selected_date');
+    var doctorBlock = document.getElementById('doctor-block');
+    var dateBlock = document.getElementById('date-block');
+    var nextBlock = document.getElementById('next-block');
+    var results = document.getElementById('slot-results');
+    var rescheduleId = form.dataset.rescheduleId;
+    var locked = !!form.dataset.rescheduleLocked;
+    var pending = null;
+
+    specSelect.removeAttribute('onchange');
+    doctorSelect.removeAttribute('onchange');
+
+    function show(element, visible) {
+        element.classList.toggle('d-none', !visible);
+    }
+
+    function el(tag, attrs, text) {
+        var node = document.createElement(tag);
+        Object.keys(attrs || {}).forEach(function (name) {
+            node.setAttribute(name, attrs[name]);
+        });
+        if (text !== undefined) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function getJSON(url) {
+        if (pending) {
+            pending.abort();
+        }
+        pending = new AbortController();
+        return fetch(url, {credentials: 'same-origin', signal: pending.signal}).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        });
+    }
+
+    function message(text) {
+        results.replaceChildren(el('p', {'class': 'text-muted'}, text));
+    }
+
+    function hidden(name, value) {
+        return el('input', {type: 'hidden', name: name, value: value});
+    }
+
+    function renderSlots(day, times) {
+        if (!times.length) {
+            message('No free slots available on this date.');
+            return;
+        }
+        var body = el('tbody');
+        times.forEach(function (time) {
+            var slotForm = el('form', {method: 'POST', action: form.getAttribute('action') || ''});
+            slotForm.append(
+                hidden('specialization', specSelect.value),
+                hidden('doctor', doctorSelect.value),
+                hidden('selected_date', day),
+                hidden('slot', day + ' ' + time)
+            );
+            if (rescheduleId) {
+                slotForm.append(hidden('reschedule_id', rescheduleId));
+            }
+            if (locked) {
+                slotForm.append(el('button', {type: 'button', 'class': 'btn btn-secondary btn-sm', disabled: ''},
+                                   'Max Reschedules Reached'));
+            } else {
+                slotForm.append(el('button', {type: 'submit', 'class': 'btn btn-success btn-sm'}, 'Book'));
+            }
+            var row = el('tr');
+            row.append(el('td', {}, time));
+            var action = el('td');
+            action.append(slotForm);
+            row.append(action);
+            body.append(row);
+        });
+        var head = el('thead');
+        var headRow = el('tr');
+        headRow.append(el('th', {}, 'Time'), el('th', {}, 'Action'));
+        head.append(headRow);
+        var table = el('table', {'class': 'table table-bordered'});
+        table.append(head, body);
+        results.replaceChildren(el('hr'), el('h4', {}, 'Available Slots for ' + day), table);
+    }
+
+    function loadDoctors() {
+        var spec = specSelect.value;
+        doctorSelect.replaceChildren(el('option', {value: ''}, '-- Select Doctor --'));
+        results.replaceChildren();
+        show(dateBlock, false);
+        show(nextBlock, !!spec);
+        show(doctorBlock, !!spec);
+        if (!spec) {
+            return;
+        }
+        var url = form.dataset.doctorsUrl.replace('__spec__', encodeURIComponent(spec));
+        getJSON(url).then(function (data) {
+            data.doctors.forEach(function (doctor) {
+                doctorSelect.append(el('option', {value: doctor.id},
+                                       'Dr. ' + doctor.name + ' (' + doctor.specialization + ')'));
+            });
+        }).catch(function (error) {
+            if (error.name !== 'AbortError') {
+                form.submit();
+            }
+        });
+    }
+
+    function loadSlots() {
+        var doctorId = doctorSelect.value;
+        show(dateBlock, !!doctorId);
+        dateInput.required = !!doctorId;
+        if (!doctorId || !dateInput.value) {
+            results.replaceChildren();
+            return;
+        }
+        var day = dateInput.value;
+        var url = form.dataset.slotsUrl.replace(/\/0\/slots$/, '/' + doctorId + '/slots') +
+            '?from=' + encodeURIComponent(day) + '&to=' + encodeURIComponent(day);
+        if (rescheduleId) {
+            url += '&reschedule_id=' + encodeURIComponent(rescheduleId);
+        }
+        getJSON(url).then(function (data) {
+            renderSlots(day, data.slots[day] || []);
+        }).catch(function (error) {
+            if (error.name !== 'AbortError') {
+                message('Could not load slots. Please try again.');
+            }
+        });
+    }
+
+    specSelect.addEventListener('change', loadDoctors);
+    doctorSelect.addEventListener('change', loadSlots);
+    dateInput.addEventListener('change', loadSlots);
+    document.getElementById('show-slots').addEventListener('click', function (event) {
+        event.preventDefault();
+        loadSlots();
+    });
+})();
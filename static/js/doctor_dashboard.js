@@ -0,0 +1,15 @@
+// The dashboard renders one treatment modal; each "Add Treatment" button carries its
+// appointment's form action and patient name, copied in when the modal opens.
+(function () {
+    var modal = document.getElementById('treatmentModal');
+    if (!modal) {
+        return;
+    }
+    modal.addEventListener('show.bs.modal', function (event) {
+        var button = event.relatedTarget;
+        var form = modal.querySelector('form');
+        form.reset();
+        form.setAttribute('action', button.dataset.action);
+        modal.querySelector('.treatment-patient').textContent = button.dataset.patient;
+    });
+})();
@@ -0,0 +1,30 @@
+// History rows carry only a short diagnosis; "Details" fetches the full record once and
+// toggles it open below the row. Without JavaScript the link opens the detail page.
+(function () {
+    document.querySelectorAll('.treatment-toggle').forEach(function (link) {
+        link.addEventListener('click', function (event) {
+            event.preventDefault();
+            var row = link.closest('tr').nextElementSibling;
+            var cell = row.querySelector('td');
+            if (cell.dataset.loaded) {
+                row.classList.toggle('d-none');
+                return;
+            }
+            fetch(link.href + '?fragment=1', {credentials: 'same-origin'})
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.status);
+                    }
+                    return response.text();
+                })
+                .then(function (html) {
+                    cell.innerHTML = html;
+                    cell.dataset.loaded = '1';
+                    row.classList.remove('d-none');
+                })
+                .catch(function () {
+                    window.location = link.href;
+                });
+        });
+    });
+})();
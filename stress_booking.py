@@ -0,0 +1,164 @@
+"""Fire parallel bookings at one slot and check that exactly one of them wins.
+
+    python stress_booking.py --clients 20
+
+Runs against a throwaway SQLite database in a temp directory, through the real
+book_appointment route, and exits non-zero if any scenario ends with more or fewer
+than one winner.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from app import create_app
+from extensions import db
+from migrations import upgrade
+from models import Appointment, Doctor, DoctorAvailability, Patient, User, ROLE_DOCTOR, ROLE_PATIENT
+from passwords import hash_password
+
+
+def seed(app, clients):
+    with app.app_context():
+        upgrade()
+        password_hash = hash_password('pw')
+        user = User(username='stress-doctor', password_hash=password_hash, role=ROLE_DOCTOR)
+        db.session.add(user)
+        db.session.flush()
+        doctor = Doctor(user_id=user.id, name='Stress', specialization='Stress Testing')
+        db.session.add(doctor)
+        db.session.flush()
+        day = datetime.now().date() + timedelta(days=1)
+        db.session.add(DoctorAvailability(doctor_id=doctor.id, date=day, start_time=time(8), end_time=time(18)))
+        for i in range(clients):
+            user = User(username=f'stress-patient-{i}', password_hash=password_hash, role=ROLE_PATIENT)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Patient(user_id=user.id, name=f'Stress Patient {i}'))
+        db.session.commit()
+        return doctor.id, day
+
+
+def logged_in_clients(app, clients):
+    result = []
+    for i in range(clients):
+        client = app.test_client()
+        client.post('/login', data={'username': f'stress-patient-{i}', 'password': 'pw'})
+        result.append(client)
+    return result
+
+
+def fire(requests):
+    """Run each (client, url, form) at the same moment; return the status codes."""
+    barrier = threading.Barrier(len(requests))
+    codes = [None] * len(requests)
+
+    def run(i, client, url, form):
+        barrier.wait()
+        codes[i] = client.post(url, data=form).status_code
+
+    threads = [threading.Thread(target=run, args=(i, *r)) for i, r in enumerate(requests)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return codes
+
+
+def slot_form(doctor_id, dt):
+    return {
+        'specialization': 'Stress Testing',
+        'doctor': str(doctor_id),
+        'selected_date': dt.strftime('%Y-%m-%d'),
+        'slot': dt.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def holders_of(app, doctor_id, dt):
+    with app.app_context():
+        return Appointment.query.filter_by(doctor_id=doctor_id, appointment_datetime=dt).count()
+
+
+# ------------------ SCENARIOS ------------------
+# Each returns the status codes of the parallel requests and how many appointments
+# ended up on the contested slot; the caller checks for exactly one winner.
+def race_same_slot(app, clients, doctor_id, day):
+    """Everyone books the same new slot."""
+    target = datetime.combine(day, time(9))
+    codes = fire([(c, '/patient/book', slot_form(doctor_id, target)) for c in clients])
+    return codes, holders_of(app, doctor_id, target)
+
+
+def race_reschedules(app, clients, doctor_id, day):
+    """Everyone holds their own appointment and reschedules onto the same slot; returns (codes, holders, appt_ids)."""
+    with app.app_context():
+        Appointment.query.delete()
+        patients = Patient.query.order_by(Patient.id).all()
+        appts = [
+            Appointment(patient_id=patient.id, doctor_id=doctor_id, status='Booked', reschedule_count=0,
+                        appointment_datetime=datetime.combine(day + timedelta(days=1 + i // 20), time(8))
+                        + timedelta(minutes=30 * (i % 20)))
+            for i, patient in enumerate(patients)
+        ]
+        db.session.add_all(appts)
+        db.session.commit()
+        appt_ids = [a.id for a in appts]
+    target = datetime.combine(day, time(10))
+    codes = fire([(c, f'/patient/book?reschedule_id={appt_id}', slot_form(doctor_id, target))
+                  for c, appt_id in zip(clients, appt_ids)])
+    return codes, holders_of(app, doctor_id, target), appt_ids
+
+
+def race_double_reschedule(app, client, appt_id, doctor_id, day):
+    """One patient double-submits a reschedule to different slots; returns (reschedule_count, new time, targets)."""
+    times = [datetime.combine(day, time(15)) + timedelta(minutes=30 * i) for i in range(4)]
+    fire([(client, f'/patient/book?reschedule_id={appt_id}', slot_form(doctor_id, t)) for t in times])
+    with app.app_context():
+        appt = db.session.get(Appointment, appt_id)
+        return appt.reschedule_count, appt.appointment_datetime, times
+
+
+def one_winner(codes, holders):
+    return codes.count(302) == 1 and holders == 1 and all(c in (302, 409) for c in codes)
+
+
+def report(name, codes, holders):
+    ok = one_winner(codes, holders)
+    print(f"{'PASS' if ok else 'FAIL'}  {name}: {codes.count(302)} won, {codes.count(409)} got 'slot taken', "
+          f"other={[c for c in codes if c not in (302, 409)]}, rows holding slot={holders}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hms-stress-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'stress.db')}",
+        'WTF_CSRF_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'METRICS_ENABLED': False,
+        'RATE_LIMITS_ENABLED': False,
+    })
+    doctor_id, day = seed(app, args.clients)
+    clients = logged_in_clients(app, args.clients)
+    results = [report('parallel bookings of one slot', *race_same_slot(app, clients, doctor_id, day))]
+
+    codes, holders, appt_ids = race_reschedules(app, clients, doctor_id, day)
+    results.append(report('parallel reschedules onto one slot', codes, holders))
+
+    # Pick a patient whose appointment lost the race above, so it has not been moved yet.
+    loser = codes.index(409) if 409 in codes else 0
+    count, moved_to, times = race_double_reschedule(app, clients[loser], appt_ids[loser], doctor_id, day)
+    ok = count == 1 and moved_to in times
+    print(f"{'PASS' if ok else 'FAIL'}  double-submitted reschedule: reschedule_count={count}, now at {moved_to:%H:%M}")
+    results.append(ok)
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select  # noqa: E402
+from app import create_app  # noqa: E402
+from config import PROFILES  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Appointment, Doctor, Patient, TreatmentRecord, User  # noqa: E402
+import archive  # noqa: E402
+import seed_data  # noqa: E402
+
+
+def make_app(url, **config):
+    """An app on the testing profile; the URL is passed explicitly so DATABASE_URL never leaks in."""
+    return create_app(dict(PROFILES['testing'], SQLALCHEMY_DATABASE_URI=url, TEMPLATE_CACHE_DIR=None, **config))
+
+
+def login(client, username, password=seed_data.PASSWORD):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, f"could not log in as {username}"
+    return client
+
+
+@pytest.fixture(scope='session')
+def seeded_app(tmp_path_factory):
+    """A small seeded database with the older appointments moved to the archive."""
+    app = make_app(f"sqlite:///{tmp_path_factory.mktemp('db') / 'hms.db'}")
+    seed_data.seed(app, 4, 20, 400, log=lambda *a: None)
+    with app.app_context():
+        archive.archive_appointments(older_than_days=30)
+    return app
+
+
+@pytest.fixture(scope='session')
+def accounts(seeded_app):
+    """Usernames and ids for a patient with a treatment on a hot appointment, and their doctor."""
+    with seeded_app.app_context():
+        treatment = db.session.get(TreatmentRecord, db.session.scalar(select(func.max(TreatmentRecord.id))))
+        doctor_user = db.session.scalar(select(User.username).join(Doctor, Doctor.user_id == User.id)
+                                        .where(Doctor.id == treatment.doctor_id))
+        patient_user = db.session.scalar(select(User.username).join(Patient, Patient.user_id == User.id)
+                                         .where(Patient.id == treatment.patient_id))
+        appointment = db.session.get(Appointment, treatment.appointment_id)
+        return {
+            'admin': 'admin', 'doctor': doctor_user, 'patient': patient_user,
+            'doctor_id': treatment.doctor_id, 'patient_id': treatment.patient_id,
+            'specialization': db.session.get(Doctor, treatment.doctor_id).specialization,
+            'treatment_id': treatment.id, 'appointment_id': appointment.id,
+            'appointment_day': appointment.appointment_datetime.date(),
+        }
+
+
+@pytest.fixture
+def client_for(seeded_app, accounts):
+    def make(role):
+        password = 'admin123' if role == 'admin' else seed_data.PASSWORD
+        return login(seeded_app.test_client(), accounts[role], password)
+    return make
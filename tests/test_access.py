@@ -0,0 +1,15 @@
+from conftest import login
+from extensions import db
+from models import Patient, User
+
+
+def test_patient_cannot_view_another_patients_treatment(seeded_app, accounts, client_for):
+    url = f"/patient/appointment/{accounts['appointment_id']}/treatment"
+    assert client_for('patient').get(url).status_code == 200
+
+    with seeded_app.app_context():
+        other = db.session.scalar(db.select(User.username).join(Patient, Patient.user_id == User.id)
+                                  .where(Patient.id != accounts['patient_id']).limit(1))
+    response = login(seeded_app.test_client(), other).get(url)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/patient_dashboard')
@@ -0,0 +1,36 @@
+import pytest
+from conftest import make_app
+import stress_booking
+
+CLIENTS = 8
+
+
+@pytest.fixture
+def race(tmp_path):
+    # A file database, so each thread's request gets its own connection and the
+    # unique constraint settles the race, as in production.
+    app = make_app(f"sqlite:///{tmp_path / 'race.db'}", METRICS_ENABLED=False)
+    doctor_id, day = stress_booking.seed(app, CLIENTS)
+    return app, stress_booking.logged_in_clients(app, CLIENTS), doctor_id, day
+
+
+def test_parallel_bookings_of_one_slot_have_one_winner(race):
+    app, clients, doctor_id, day = race
+    codes, holders = stress_booking.race_same_slot(app, clients, doctor_id, day)
+    assert stress_booking.one_winner(codes, holders), codes
+
+
+def test_parallel_reschedules_onto_one_slot_have_one_winner(race):
+    app, clients, doctor_id, day = race
+    codes, holders, _ = stress_booking.race_reschedules(app, clients, doctor_id, day)
+    assert stress_booking.one_winner(codes, holders), codes
+
+
+def test_double_submitted_reschedule_moves_once(race):
+    app, clients, doctor_id, day = race
+    codes, _, appt_ids = stress_booking.race_reschedules(app, clients, doctor_id, day)
+    loser = codes.index(409)
+    count, moved_to, targets = stress_booking.race_double_reschedule(app, clients[loser], appt_ids[loser],
+                                                                     doctor_id, day)
+    assert count == 1
+    assert moved_to in targets
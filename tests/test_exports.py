@@ -0,0 +1,24 @@
+import csv
+import io
+import exports
+
+
+def export_text(app, dataset, fmt='csv', **filters):
+    with app.app_context():
+        return b''.join(exports.export_chunks(dataset, fmt, **filters)).decode('utf-8')
+
+
+def test_empty_csv_export_keeps_its_header(seeded_app):
+    for dataset in exports.DATASETS:
+        text = export_text(seeded_app, dataset, doctor_id=10 ** 9)
+        assert list(csv.reader(io.StringIO(text))) == [exports.export_columns(dataset)]
+
+
+def test_csv_export_covers_archive_and_hot_rows(seeded_app, accounts):
+    rows = list(csv.DictReader(io.StringIO(export_text(seeded_app, 'appointments', doctor_id=accounts['doctor_id']))))
+    assert rows and {row['doctor_id'] for row in rows} == {str(accounts['doctor_id'])}
+    assert str(accounts['appointment_id']) in {row['id'] for row in rows}
+
+
+def test_empty_ndjson_export_is_empty(seeded_app):
+    assert export_text(seeded_app, 'treatments', 'ndjson', doctor_id=10 ** 9) == ''
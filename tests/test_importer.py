@@ -0,0 +1,58 @@
+import json
+from datetime import time, timedelta
+from conftest import make_app
+from extensions import db
+from importer import Importer
+from models import AvailabilityException, AvailabilityRule, DoctorDailyStats
+import stress_booking
+
+
+def run_import(tmp_path, kind, filename, content, app=None):
+    app = app or make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    path = tmp_path / filename
+    path.write_text(content, encoding='utf-8')
+    with app.app_context():
+        db.create_all()
+        with Importer(workers=1) as importer:
+            return importer.run(kind, str(path))
+
+
+def test_csv_errors_report_file_lines(tmp_path):
+    result = run_import(tmp_path, 'departments', 'departments.csv',
+                        'name,description\nCardiology,"Heart,\nand vessels"\n,missing name\nCardiology,again\n')
+    assert result.inserted == 1
+    assert result.unit == 'line'
+    assert [line for line, _ in result.errors] == [4, 5]
+
+
+def test_json_errors_report_record_positions(tmp_path):
+    rows = [{'name': 'Cardiology'}, {'name': ''}]
+    result = run_import(tmp_path, 'departments', 'departments.json', json.dumps(rows))
+    assert result.unit == 'record'
+    assert [line for line, _ in result.errors] == [2]
+
+
+def test_availability_overlapping_a_weekly_schedule_is_rejected(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    doctor_id, day = stress_booking.seed(app, 1)
+    week, skipped = day + timedelta(days=7), day + timedelta(days=14)
+    with app.app_context():
+        rule = AvailabilityRule(doctor_id=doctor_id, weekdays=1 << week.weekday(), start_time=time(9),
+                                end_time=time(12), valid_from=week)
+        db.session.add(rule)
+        db.session.flush()
+        db.session.add(AvailabilityException(rule_id=rule.id, date=skipped))
+        db.session.commit()
+
+    rows = [
+        f'stress-doctor,{week},10:00,11:00',
+        f'stress-doctor,{week},13:00,14:00',
+        f'stress-doctor,{skipped},10:00,11:00',
+    ]
+    result = run_import(tmp_path, 'availability', 'availability.csv',
+                        'doctor_username,date,start_time,end_time\n' + '\n'.join(rows) + '\n', app)
+    assert result.errors == [(2, "Time range overlaps with the weekly schedule")]
+    assert result.inserted == 2
+    with app.app_context():
+        # The rule's three hours plus the imported hour, counted once.
+        assert db.session.get(DoctorDailyStats, (doctor_id, week)).available_minutes == 240
@@ -0,0 +1,58 @@
+import pytest
+from flask import render_template_string
+from extensions import db
+from helpers import LazyLoadError
+from models import Appointment
+
+# Every read view, rendered with RAISE_ON_LAZY_LOAD on: a relationship the route forgot
+# to eager-load makes the template raise instead of issuing one query per row.
+VIEWS = [
+    ('admin', '/admin_dashboard?tab=doctors'),
+    ('admin', '/admin_dashboard?tab=patients'),
+    ('admin', '/admin_dashboard?tab=appointments'),
+    ('admin', '/admin_dashboard?tab=appointments&query=a'),
+    ('admin', '/admin/search?query=a'),
+    ('admin', '/admin/reports'),
+    ('admin', '/admin/metrics'),
+    ('admin', '/admin/export/appointments'),
+    ('admin', '/admin/export/treatments?format=ndjson'),
+    ('doctor', '/doctor_dashboard'),
+    ('doctor', '/doctor/patient/{patient_id}/history'),
+    ('doctor', '/doctor/treatment/{treatment_id}'),
+    ('doctor', '/doctor/treatment/{treatment_id}?fragment=1'),
+    ('patient', '/patient_dashboard'),
+    ('patient', '/patient/book'),
+    ('patient', '/patient/appointment/{appointment_id}/treatment'),
+    ('patient', '/api/specializations'),
+    ('patient', '/api/specializations/{specialization}/doctors'),
+    ('patient', '/api/doctors/{doctor_id}/slots?from={appointment_day}'),
+]
+
+
+@pytest.fixture(autouse=True)
+def raise_on_lazy_load(seeded_app):
+    seeded_app.config['RAISE_ON_LAZY_LOAD'] = True
+    yield
+    seeded_app.config['RAISE_ON_LAZY_LOAD'] = False
+
+
+@pytest.mark.parametrize('role,url', VIEWS)
+def test_view_renders_without_lazy_loads(client_for, accounts, role, url):
+    response = client_for(role).get(url.format(**accounts))
+    assert response.status_code == 200
+    response.get_data()
+
+
+def test_booking_browse_renders_without_lazy_loads(client_for, accounts):
+    response = client_for('patient').post('/patient/book', data={
+        'specialization': accounts['specialization'], 'doctor': accounts['doctor_id'],
+        'selected_date': accounts['appointment_day'].isoformat(),
+    })
+    assert response.status_code == 200
+
+
+def test_guard_raises_on_lazy_load_while_rendering(seeded_app, accounts):
+    with seeded_app.test_request_context():
+        appointment = db.session.get(Appointment, accounts['appointment_id'])
+        with pytest.raises(LazyLoadError):
+            render_template_string('{{ appointment.doctor.name }}', appointment=appointment)
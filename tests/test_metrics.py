@@ -0,0 +1,27 @@
+import pytest
+from flask import g
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from conftest import make_app
+from extensions import db
+import metrics
+
+
+def test_failing_statement_keeps_its_timer_on_its_own_context(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    failed = []
+    with app.test_request_context('/patient_dashboard'):
+        event.listen(db.engine, 'handle_error', lambda error: failed.append(error.execution_context))
+        metrics._start_request()
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        db.session.execute(text('SELECT 1'))
+        # The failed statement's start time went away with its context, uncounted.
+        assert hasattr(failed[0], '_metrics_started')
+        assert g._metrics['sql_count'] == 1
+
+
+def test_requests_are_recorded_per_endpoint(client_for):
+    client_for('patient').get('/patient_dashboard')
+    data = client_for('admin').get('/admin/metrics').get_json()
+    assert data['endpoints']['main.patient_dashboard']['sql_count']['p50'] > 0
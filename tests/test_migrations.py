@@ -0,0 +1,28 @@
+from sqlalchemy import inspect
+from conftest import make_app
+from extensions import db
+import migrations
+
+
+def assert_hot_path_indexes_keep_transactions(app):
+    """Step 3 must not leave upgrade()'s connection in autocommit for the steps after it."""
+    with app.app_context(), db.engine.connect() as connection:
+        migrations._create_missing_tables(connection)
+        connection.commit()
+        level = connection.get_isolation_level()
+        migrations._create_hot_path_indexes(connection)
+        assert 'isolation_level' not in connection.get_execution_options()
+        assert connection.get_isolation_level() == level
+        indexes = {index['name'] for index in inspect(connection).get_indexes('appointment')}
+        assert 'ix_appointment_doctor_status' in indexes
+
+
+def test_hot_path_indexes_keep_the_upgrade_connection_transactional(tmp_path):
+    assert_hot_path_indexes_keep_transactions(make_app(f"sqlite:///{tmp_path / 'hms.db'}"))
+
+
+def test_upgrade_applies_every_step_once(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    with app.app_context():
+        assert [version for version, _ in migrations.upgrade()] == [v for v, _, _ in migrations.MIGRATIONS]
+        assert migrations.upgrade() == []
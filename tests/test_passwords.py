@@ -0,0 +1,20 @@
+import time
+import pytest
+from conftest import make_app
+import passwords
+
+
+def test_slow_hash_raises_hashing_busy(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}", HASH_TIMEOUT=0.05)
+    with app.app_context():
+        with pytest.raises(passwords.HashingBusy):
+            passwords._run(time.sleep, 0.5)
+
+
+def test_hash_round_trip(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    with app.app_context():
+        password_hash = passwords.hash_password('secret')
+        assert passwords.check_password(password_hash, 'secret')
+        assert not passwords.check_password(password_hash, 'wrong')
+        assert not passwords.needs_rehash(password_hash)
@@ -0,0 +1,69 @@
+import os
+import uuid
+from datetime import datetime, time
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from conftest import make_app
+from config import normalize_database_url
+from extensions import db
+from models import Appointment
+import booking
+import migrations
+import stress_booking
+from test_migrations import assert_hot_path_indexes_keep_transactions
+
+# Runs only when DATABASE_URL points at PostgreSQL (and psycopg2 is installed). Everything
+# happens in a throwaway schema that is dropped afterwards, so the database's own tables
+# are never touched.
+DATABASE_URL = normalize_database_url(os.environ.get('DATABASE_URL', ''))
+pytestmark = pytest.mark.skipif(not DATABASE_URL.startswith('postgresql'),
+                                reason='DATABASE_URL is not a PostgreSQL URL')
+
+
+@pytest.fixture
+def pg_app():
+    pytest.importorskip('psycopg2')
+    schema = f'hms_test_{uuid.uuid4().hex[:12]}'
+    admin = create_engine(DATABASE_URL, isolation_level='AUTOCOMMIT')
+    with admin.connect() as connection:
+        connection.execute(text(f'CREATE SCHEMA {schema}'))
+    url = make_url(DATABASE_URL).update_query_dict({'options': f'-csearch_path={schema}'})
+    app = make_app(url.render_as_string(hide_password=False))
+    try:
+        yield app
+    finally:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        with admin.connect() as connection:
+            connection.execute(text(f'DROP SCHEMA {schema} CASCADE'))
+        admin.dispose()
+
+
+def test_upgrade_and_booking_round_trip(pg_app):
+    doctor_id, day = stress_booking.seed(pg_app, 2)
+    with pg_app.app_context():
+        assert {version for version, _, done in migrations.status() if done} == \
+            {version for version, _, _ in migrations.MIGRATIONS}
+        assert migrations.upgrade() == []
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('appointment')}
+        assert 'ix_appointment_doctor_status' in indexes
+
+    first, second = stress_booking.logged_in_clients(pg_app, 2)
+    slot = datetime.combine(day, time(9))
+    assert first.post('/patient/book', data=stress_booking.slot_form(doctor_id, slot)).status_code == 302
+    assert second.post('/patient/book', data=stress_booking.slot_form(doctor_id, slot)).status_code == 409
+
+    with pg_app.app_context():
+        appointment = Appointment.query.filter_by(doctor_id=doctor_id, appointment_datetime=slot).one()
+        with pytest.raises(booking.SlotTaken):
+            booking.book_slot(appointment.patient_id, doctor_id, slot)
+        moved = booking.reschedule(appointment, doctor_id, datetime.combine(day, time(10)))
+        assert moved.reschedule_count == 1
+        assert Appointment.query.filter_by(doctor_id=doctor_id).count() == 1
+
+
+def test_concurrent_indexes_leave_the_upgrade_connection_transactional(pg_app):
+    assert_hot_path_indexes_keep_transactions(pg_app)
@@ -0,0 +1,23 @@
+from conftest import make_app
+
+LIMITS = {'main.login': {'ip': (2, 60)}}
+
+
+def login_codes(app, attempts):
+    client = app.test_client()
+    return [client.post('/login', data={'username': 'nobody', 'password': 'x'}).status_code
+            for _ in range(attempts)]
+
+
+def test_memory_buckets_limit_one_process(seeded_app):
+    app = make_app(seeded_app.config['SQLALCHEMY_DATABASE_URI'], RATE_LIMITS_ENABLED=True, RATE_LIMITS=LIMITS)
+    assert login_codes(app, 3) == [200, 200, 429]
+
+
+def test_sqlite_buckets_are_shared_between_workers(seeded_app, tmp_path):
+    # Two apps stand in for two gunicorn workers on one host.
+    config = dict(RATE_LIMITS_ENABLED=True, RATE_LIMITS=LIMITS,
+                  RATE_LIMIT_STORAGE=str(tmp_path / 'ratelimit.db'))
+    first, second = (make_app(seeded_app.config['SQLALCHEMY_DATABASE_URI'], **config) for _ in range(2))
+    assert login_codes(first, 2) == [200, 200]
+    assert login_codes(second, 1) == [429]
@@ -0,0 +1,19 @@
+from datetime import datetime, time
+from conftest import make_app
+from extensions import db
+from models import DoctorDailyStats, Patient
+import booking
+import schedules
+import stress_booking
+
+
+def test_booking_bumps_schedule_and_updates_rollups(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    doctor_id, day = stress_booking.seed(app, 1)
+    with app.app_context():
+        version = schedules.get_version(doctor_id)
+        patient_id = db.session.scalar(db.select(Patient.id))
+        booking.book_slot(patient_id, doctor_id, datetime.combine(day, time(9)))
+        assert schedules.get_version(doctor_id) == version + 1
+        stats = db.session.get(DoctorDailyStats, (doctor_id, day))
+        assert (stats.booked, stats.booked_minutes, stats.available_minutes) == (1, 30, 600)
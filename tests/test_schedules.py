@@ -0,0 +1,29 @@
+from datetime import datetime, time
+from conftest import make_app
+from extensions import db
+from models import DoctorSlot, Patient, SLOT_BOOKED
+import booking
+import stress_booking
+
+
+def test_booking_invalidates_the_slot_etag(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    doctor_id, day = stress_booking.seed(app, 1)
+    client = stress_booking.logged_in_clients(app, 1)[0]
+    url = f'/api/doctors/{doctor_id}/slots?from={day}'
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/patient/book', data=stress_booking.slot_form(doctor_id, datetime.combine(day, time(9)))) \
+        .status_code == 302
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_slot_table_follows_bookings(tmp_path):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}", USE_SLOT_TABLE=True)
+    doctor_id, day = stress_booking.seed(app, 1)
+    slot = datetime.combine(day, time(9))
+    with app.app_context():
+        booking.book_slot(db.session.scalar(db.select(Patient.id)), doctor_id, slot)
+        row = DoctorSlot.query.filter_by(doctor_id=doctor_id, start=slot).one()
+        assert row.state == SLOT_BOOKED
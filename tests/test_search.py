@@ -0,0 +1,23 @@
+from models import Appointment, Doctor, Patient, User
+from conftest import make_app
+import search
+
+
+def test_query_without_words_matches_nothing(seeded_app):
+    with seeded_app.app_context():
+        assert search.fts_available()
+        doctors = Doctor.query.join(User, Doctor.user_id == User.id)
+        patients = Patient.query.join(User, Patient.user_id == User.id)
+        assert search.filter_doctors(doctors, '!!!').count() == 0
+        assert search.filter_patients(patients, '!!!').count() == 0
+        assert search.filter_appointments(Appointment.query.join(Patient).join(Doctor), '!!!').count() == 0
+
+
+def test_missing_fts5_falls_back_to_ilike(tmp_path, monkeypatch):
+    app = make_app(f"sqlite:///{tmp_path / 'hms.db'}")
+    # What a SQLite built without FTS5 reports for the first virtual table.
+    monkeypatch.setattr(search, 'FTS_SCHEMA', ['CREATE VIRTUAL TABLE doctor_fts USING no_such_module(name)'])
+    with app.app_context():
+        assert search.rebuild_search_index() is False
+        assert 'hms_fts' not in app.extensions
+        assert not search.fts_available()
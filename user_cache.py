@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from flask import current_app
+from flask_login import UserMixin
+from extensions import db
+from models import Doctor, Patient, User
+
+
+# ------------------ SESSION USER ------------------
+# What the user_loader hands to Flask-Login: the handful of fields routes read from
+# current_user, plus the doctor/patient id so they need no profile lookup either.
+class SessionUser(UserMixin):
+    def __init__(self, id, username, role, is_blacklisted, profile_id):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_blacklisted = is_blacklisted
+        self.profile_id = profile_id
+
+    @property
+    def is_active(self):
+        return not self.is_blacklisted
+
+
+# ------------------ CACHE ------------------
+# One per app, per process, bounded. Routes that change a user call invalidate() for
+# this process; other gunicorn workers pick the change up when the entry expires, so
+# USER_CACHE_TTL is the longest a blacklisted user can keep using an existing session.
+class UserCache:
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, now):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, user, now):
+        with self.lock:
+            self.entries[user_id] = (now + self.ttl, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def pop(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def init_user_cache(app):
+    ttl = app.config.get('USER_CACHE_TTL', 30)
+    if ttl:
+        app.extensions['hms_user_cache'] = UserCache(ttl, app.config.get('USER_CACHE_SIZE', 10000))
+
+
+def _fetch(user_id):
+    row = db.session.query(
+        User.id, User.username, User.role, User.is_blacklisted, Doctor.id, Patient.id
+    ).outerjoin(Doctor, Doctor.user_id == User.id).outerjoin(
+        Patient, Patient.user_id == User.id
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    user_id, username, role, is_blacklisted, doctor_id, patient_id = row
+    return SessionUser(user_id, username, role, bool(is_blacklisted), doctor_id or patient_id)
+
+
+def load(user_id):
+    cache = current_app.extensions.get('hms_user_cache')
+    if cache is None:
+        return _fetch(user_id)
+    now = monotonic()
+    user = cache.get(user_id, now)
+    if user is None:
+        user = _fetch(user_id)
+        if user is not None:
+            cache.put(user_id, user, now)
+    return user
+
+
+def invalidate(user_id):
+    cache = current_app.extensions.get('hms_user_cache')
+    if cache is not None:
+        cache.pop(user_id)
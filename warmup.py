@@ -0,0 +1,57 @@
+import os
+from contextlib import ExitStack
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+from extensions import db
+
+
+# ------------------ TEMPLATE BYTECODE CACHE ------------------
+# Compiled templates are written under TEMPLATE_CACHE_DIR, so a restarted worker loads
+# bytecode instead of parsing every template again. Entries are keyed on a checksum of
+# the template source, so an edited template is recompiled; the directory can be deleted
+# at any time.
+def init_template_cache(app):
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+# ------------------ WARM-UP ------------------
+# Run before a worker takes traffic so its first request does not pay for configuring
+# the mappers (SQLAlchemy does it on the first query, ~100ms here), compiling templates
+# or opening database connections. Under preload_app warm_app() runs once in the master
+# and the forked workers share the result; connections are opened in each worker after
+# the fork (see gunicorn.conf.py).
+def warm_app(app):
+    configure_mappers()
+    return compile_templates(app)
+
+
+def compile_templates(app):
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def prime_pool(app, connections=1):
+    """Open up to `connections` connections per engine (at most its pool_size) and return them to the pool."""
+    opened = 0
+    with app.app_context(), ExitStack() as stack:
+        for engine in db.engines.values():
+            keep = min(connections, engine.pool.size()) if isinstance(engine.pool, QueuePool) else 1
+            for _ in range(keep):
+                stack.enter_context(engine.connect()).execute(text('SELECT 1'))
+                opened += 1
+    return opened
+
+
+def dispose_pools(app):
+    # Connections opened before a fork must not be shared by the children.
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
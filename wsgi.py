@@ -0,0 +1,11 @@
+from app import create_app
+import warmup
+
+# ------------------ WSGI ENTRY POINT ------------------
+# gunicorn -c gunicorn.conf.py wsgi:app. With preload_app this module is imported once in
+# the master, so the route/model/form imports and the warm-up below happen before forking
+# and are shared by every worker.
+app = create_app()
+
+if app.config.get('WARMUP_ON_START'):
+    warmup.warm_app(app)